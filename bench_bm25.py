@@ -0,0 +1,99 @@
+import argparse
+import json
+import os
+import tempfile
+import time
+import numpy as np
+from rank_bm25 import BM25Okapi
+from langchain.schema import Document
+from bm25_index import BM25_PATH, BM25Builder, BM25Index, tokenize
+from index_versions import current_version
+
+
+def load_texts(args):
+    """Returns the chunk texts of the saved BM25 index, or random Zipf-distributed text with --synthetic."""
+    if args.synthetic:
+        rng = np.random.default_rng(0)
+        words = [f"w{i}" for i in range(args.vocab)]
+        lengths = rng.integers(50, 250, args.synthetic)
+        return [" ".join(words[j] for j in np.minimum(rng.zipf(1.2, length), args.vocab) - 1) for length in lengths]
+    with open(os.path.join(current_version(args.index), "docs.jsonl"), "rb") as f:
+        return [json.loads(line)["text"] for line in f]
+
+
+def percentile_ms(latencies, q):
+    return float(np.percentile(latencies, q)) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare latency and top-k results of the CSR BM25 index against rank_bm25, as BM25Retriever uses it.")
+    parser.add_argument("--index", default=BM25_PATH, help="BM25 index saved by store_db.py to take the chunk texts from")
+    parser.add_argument("--synthetic", type=int, default=0, help="use this many random documents instead of the saved index")
+    parser.add_argument("--vocab", type=int, default=50000, help="vocabulary size of synthetic documents")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    args = parser.parse_args()
+
+    texts = load_texts(args)
+    if not texts:
+        print(f"No chunks found in {args.index}")
+        return
+    rng = np.random.default_rng(1)
+    # queries are a few consecutive words of stored chunks, like a keyword search for something that exists
+    queries = []
+    for i in rng.integers(0, len(texts), args.queries):
+        tokens = tokenize(texts[i]) or ["nothing"]
+        start = int(rng.integers(0, len(tokens)))
+        queries.append(" ".join(tokens[start:start + int(rng.integers(2, 7))]))
+    print(f"{len(texts)} chunks, {args.queries} queries, k={args.k}\n")
+
+    start = time.perf_counter()
+    okapi = BM25Okapi([tokenize(text) for text in texts])
+    okapi_build = time.perf_counter() - start
+    expected, okapi_latencies = [], []
+    for query in queries:
+        start = time.perf_counter()
+        scores = okapi.get_scores(tokenize(query))
+        # what BM25Okapi.get_top_n does
+        top = np.argsort(scores)[::-1][:args.k]
+        okapi_latencies.append(time.perf_counter() - start)
+        expected.append((top.tolist(), scores[top]))
+
+    with tempfile.TemporaryDirectory() as path:
+        start = time.perf_counter()
+        builder = BM25Builder()
+        builder.add([str(i) for i in range(len(texts))], [Document(page_content=text) for text in texts])
+        builder.save(path)
+        build = time.perf_counter() - start
+        start = time.perf_counter()
+        index = BM25Index.load(path)
+        load = time.perf_counter() - start
+
+        latencies, identical, ties = [], 0, 0
+        for query, (rows, scores) in zip(queries, expected):
+            start = time.perf_counter()
+            results = index.search(query, args.k)
+            latencies.append(time.perf_counter() - start)
+            if [row for row, _ in results] == rows:
+                identical += 1
+            elif np.allclose([score for _, score in results], scores, rtol=1e-9, atol=1e-12):
+                # same scores, only equally scored chunks in another order
+                ties += 1
+        start = time.perf_counter()
+        index.search_batch(queries, args.k)
+        batch = (time.perf_counter() - start) / len(queries)
+
+    print(f"{'engine':<22}{'build s':>10}{'p50 ms':>10}{'p99 ms':>10}{'identical':>12}")
+    print(f"{'rank_bm25':<22}{okapi_build:>10.2f}{percentile_ms(okapi_latencies, 50):>10.2f}{percentile_ms(okapi_latencies, 99):>10.2f}{'':>12}")
+    print(f"{'csr':<22}{build:>10.2f}{percentile_ms(latencies, 50):>10.2f}{percentile_ms(latencies, 99):>10.2f}{identical / len(queries):>12.1%}")
+    print(f"{'csr batch (per query)':<22}{'':>10}{batch * 1000:>10.2f}")
+    print(f"\nLoading the saved CSR index took {load * 1000:.1f} ms")
+    if ties:
+        print(f"{ties} queries returned the same scores with equally scored chunks in another order")
+    mismatches = len(queries) - identical - ties
+    if mismatches:
+        print(f"{mismatches} queries returned different top-{args.k} scores")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+import argparse
+import tiktoken
+from langchain.schema import Document
+from bench_parsers import load_pages
+from chunking import get_text_splitter
+from html_parsers import get_parser
+from scrape_hp import extract_text, extract_title, page_metadata
+
+# (label, chunking mode, dedupe) compared by default; the first one is the baseline
+CONFIGS = [
+    ("recursive 50%", "recursive", None),
+    ("structured", "structured", None),
+    ("structured+exact", "structured", "exact"),
+    ("structured+near", "structured", "near"),
+]
+
+
+def load_documents(archive_dir, limit=None):
+    """Extracts the archived content pages into Documents, as the scraper would stream them."""
+    parser = get_parser("lxml")
+    documents = []
+    for url, is_article, html in load_pages(archive_dir, limit):
+        soup = parser.parse_content(html, is_article=is_article)
+        text = extract_text(soup, url, is_article=is_article)
+        if text:
+            documents.append(Document(page_content=text, metadata=page_metadata(url, extract_title(soup))))
+    return documents
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare chunk count, tokens and index size of the chunking modes over archived pages.")
+    parser.add_argument("--archive", default="html_archive", help="archive directory written by Scraper(archive_dir=...)")
+    parser.add_argument("--limit", type=int, default=None, help="only use the first N pages")
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--dim", type=int, default=1536, help="embedding dimensions, for the vector size estimate")
+    args = parser.parse_args()
+
+    documents = load_documents(args.archive, args.limit)
+    if not documents:
+        print(f"No archived content pages found in {args.archive}")
+        return
+    encoding = tiktoken.get_encoding("cl100k_base")
+    print(f"Chunking {len(documents)} documents ({sum(len(document.page_content) for document in documents) / (1024 * 1024):.1f} MiB of text)\n")
+
+    baseline = None
+    print(f"{'mode':<20}{'chunks':>10}{'tokens':>12}{'vectors MiB':>14}{'text MiB':>10}{'vs baseline':>13}")
+    for label, chunking, dedupe in CONFIGS:
+        chunks = get_text_splitter(chunking, dedupe, args.chunk_size).split_documents(documents)
+        tokens = sum(len(encoded) for encoded in encoding.encode_batch([chunk.page_content for chunk in chunks], disallowed_special=()))
+        vector_mib = len(chunks) * args.dim * 4 / (1024 * 1024)
+        text_mib = sum(len(chunk.page_content.encode("utf-8")) for chunk in chunks) / (1024 * 1024)
+        if baseline is None:
+            baseline = tokens
+        print(f"{label:<20}{len(chunks):>10}{tokens:>12}{vector_mib:>14.1f}{text_mib:>10.1f}{tokens / baseline:>12.0%}")
+    print("\ntokens are what embedding costs scale with; vectors MiB is float32 embeddings, before HNSW overhead")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+import argparse
+import os
+import tempfile
+import time
+from fixture_server import FixtureServer
+from scrape_hp import Scraper
+
+METHODS = ["characters", "places", "magic", "things", "creatures", "novels", "events"]
+
+
+def run_scraper(methods, workdir, **scraper_kwargs):
+    """Runs Scraper.retrieve_<method> for each method with fresh crawl state in workdir. Returns (seconds per method, scraper)."""
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        # the scraper writes hp_data/ and its crawl state relative to the working directory
+        os.makedirs("hp_data", exist_ok=True)
+        scraper = Scraper(batch_size=20, store_callback=lambda: None, **scraper_kwargs)
+        timings = {}
+        for method in methods:
+            start = time.perf_counter()
+            getattr(scraper, f"retrieve_{method}")()
+            timings[method] = time.perf_counter() - start
+        scraper.close()
+        return timings, scraper
+    finally:
+        os.chdir(cwd)
+
+
+def record(args):
+    """Crawls the live site once with an archive, which is the capture the replay server serves."""
+    archive_dir = os.path.abspath(args.archive)
+    with tempfile.TemporaryDirectory() as workdir:
+        timings, scraper = run_scraper(args.methods, workdir, archive_dir=archive_dir, concurrency=args.concurrency)
+    print(f"Recorded {scraper.documents_scraped} documents into {archive_dir} in {sum(timings.values()):.1f} seconds")
+
+
+def replay(args):
+    """Crawls the capture through the fixture server and reports crawl throughput."""
+    archive_dir = os.path.abspath(args.archive)
+    server = FixtureServer(archive_dir, latency=args.latency, jitter=args.jitter, error_rate=args.error_rate, reset_rate=args.reset_rate, seed=args.seed)
+    with server, tempfile.TemporaryDirectory() as workdir:
+        timings, scraper = run_scraper(
+            args.methods, workdir,
+            origin=server.url,
+            concurrency=args.concurrency,
+            rate_limit=args.rate_limit,
+            parser=args.parser,
+            pipeline_workers=args.pipeline_workers,
+        )
+        served = server.stats()
+    policy = scraper.policy.stats()
+    wall = sum(timings.values())
+
+    print(f"\n{'method':<14}{'seconds':>10}")
+    for method, seconds in timings.items():
+        print(f"{method:<14}{seconds:>10.2f}")
+    print(f"\nwall time:       {wall:.2f} s")
+    print(f"documents:       {scraper.documents_scraped}")
+    print(f"pages served:    {served['ok']} ({served['ok'] / wall:.1f} pages/sec)")
+    print(f"bytes served:    {served['bytes_sent'] / (1024 * 1024):.1f} MiB ({served['bytes_sent'] / (1024 * 1024) / wall:.2f} MiB/sec)")
+    print(f"requests:        {served['requests']} ({served['not_found']} not found, {served['errors']} errors, {served['resets']} resets)")
+    print(f"retries:         {policy['retries']} ({policy['backoff_seconds']} s backing off, {policy['throttled_seconds']} s throttled)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Record hp-lexicon.org pages once, then benchmark crawls against a local replay of them.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    record_parser = subparsers.add_parser("record", help="crawl the live site into an archive")
+    record_parser.add_argument("--archive", default="crawl_fixtures", help="archive directory to record into")
+    record_parser.add_argument("--methods", nargs="+", default=METHODS, choices=METHODS, help="retrieve_* methods to crawl")
+    record_parser.add_argument("--concurrency", type=int, default=8)
+    record_parser.set_defaults(func=record)
+
+    replay_parser = subparsers.add_parser("replay", help="benchmark a crawl against the recorded archive")
+    replay_parser.add_argument("--archive", default="crawl_fixtures", help="archive directory written by record (or by store_db.py)")
+    replay_parser.add_argument("--methods", nargs="+", default=METHODS, choices=METHODS, help="retrieve_* methods to crawl")
+    replay_parser.add_argument("--latency", type=float, default=0.05, help="seconds added to every response")
+    replay_parser.add_argument("--jitter", type=float, default=0.02, help="up to this many extra seconds per response")
+    replay_parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with a 503")
+    replay_parser.add_argument("--reset-rate", type=float, default=0.0, help="fraction of connections reset without a response")
+    replay_parser.add_argument("--seed", type=int, default=0, help="seed for latency jitter and injected failures")
+    replay_parser.add_argument("--concurrency", type=int, default=8)
+    replay_parser.add_argument("--rate-limit", type=float, default=1000.0, help="requests/sec allowed by the request policy")
+    replay_parser.add_argument("--parser", default="html.parser")
+    replay_parser.add_argument("--pipeline-workers", type=int, default=0)
+    replay_parser.set_defaults(func=replay)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
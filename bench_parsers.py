@@ -0,0 +1,70 @@
+import argparse
+import time
+import tracemalloc
+from html_archive import HtmlArchive
+from html_parsers import PARSERS, get_parser
+from scrape_hp import extract_text
+
+
+def load_pages(archive_dir, limit=None):
+    """Reads archived content pages into memory as (url, is_article, html)."""
+    archive = HtmlArchive(archive_dir)
+    pages = []
+    for url, kind, html in archive.iter_pages(kinds=("page", "article")):
+        pages.append((url, kind == "article", html))
+        if limit and len(pages) >= limit:
+            break
+    archive.close()
+    return pages
+
+
+def extract_all(parser, pages):
+    return [extract_text(parser.parse_content(html, is_article=is_article), url, is_article=is_article) for url, is_article, html in pages]
+
+
+def bench_backend(name, pages, repeat=3):
+    """Returns (pages/sec, peak MiB of a single page parse, extracted texts) for one parser backend."""
+    parser = get_parser(name)
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        texts = extract_all(parser, pages)
+        best = min(best, time.perf_counter() - start)
+
+    # peak memory is measured separately, tracemalloc slows parsing down a lot
+    peak = 0
+    for url, is_article, html in pages:
+        tracemalloc.start()
+        extract_text(parser.parse_content(html, is_article=is_article), url, is_article=is_article)
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    return len(pages) / best, peak / (1024 * 1024), texts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark HTML parser backends over archived pages.")
+    parser.add_argument("--archive", default="html_archive", help="archive directory written by Scraper(archive_dir=...)")
+    parser.add_argument("--limit", type=int, default=None, help="only use the first N pages")
+    parser.add_argument("--repeat", type=int, default=3, help="timing runs per backend, the best one is reported")
+    parser.add_argument("--backends", nargs="+", default=list(PARSERS), choices=list(PARSERS))
+    args = parser.parse_args()
+
+    pages = load_pages(args.archive, args.limit)
+    if not pages:
+        print(f"No archived content pages found in {args.archive}")
+        return
+    print(f"Benchmarking {len(pages)} pages ({sum(len(html) for _, _, html in pages) / (1024 * 1024):.1f} MiB of HTML)\n")
+
+    baseline = None
+    print(f"{'backend':<16}{'pages/sec':>12}{'peak MiB':>12}{'mismatches':>12}")
+    for name in args.backends:
+        pages_per_sec, peak_mib, texts = bench_backend(name, pages, args.repeat)
+        if baseline is None:
+            baseline = texts
+        mismatches = sum(1 for a, b in zip(baseline, texts) if a != b)
+        print(f"{name:<16}{pages_per_sec:>12.1f}{peak_mib:>12.2f}{mismatches:>12}")
+    print(f"\nmismatches are pages whose extracted text differs from the {args.backends[0]} backend")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+import argparse
+import time
+import numpy as np
+from compact_vectors import CompactVectorIndex, normalize_rows
+
+CHROMA_PATH = "./chroma"
+
+# (label, quantization mode, rescore)
+CONFIGS = [
+    ("int8", "int8", False),
+    ("int8+rescore", "int8", True),
+    ("float16", "float16", False),
+    ("float16+rescore", "float16", True),
+]
+
+
+def load_vectors(args):
+    """Returns the stored chunk embeddings of the Chroma collection, or clustered random vectors with --synthetic."""
+    if args.synthetic:
+        rng = np.random.default_rng(0)
+        centers = rng.normal(size=(max(1, args.synthetic // 50), args.dim))
+        return centers[rng.integers(0, len(centers), args.synthetic)] + rng.normal(scale=0.5, size=(args.synthetic, args.dim))
+    # imported here so --synthetic runs without langchain
+    from langchain_chroma import Chroma
+    records = Chroma(collection_name="harry_potter_collection", persist_directory=args.chroma).get(include=["embeddings"])
+    return np.asarray(records["embeddings"], dtype=np.float32)
+
+
+def percentile_ms(latencies, q):
+    return float(np.percentile(latencies, q)) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare memory, recall@k and latency of compact vector indexes against exact float32 search.")
+    parser.add_argument("--chroma", default=CHROMA_PATH, help="Chroma directory to read the stored embeddings from")
+    parser.add_argument("--synthetic", type=int, default=0, help="use this many random vectors instead of the Chroma collection")
+    parser.add_argument("--dim", type=int, default=1536, help="dimensions of synthetic vectors")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--rescore-factor", type=int, default=4, help="candidates re-scored exactly, as a multiple of k")
+    args = parser.parse_args()
+
+    vectors = normalize_rows(load_vectors(args))
+    if not len(vectors):
+        print(f"No embeddings found in {args.chroma}")
+        return
+    rng = np.random.default_rng(1)
+    # queries are perturbed copies of stored vectors, so each has a few close neighbours like a real question
+    queries = normalize_rows(vectors[rng.integers(0, len(vectors), args.queries)] + rng.normal(scale=0.02, size=(args.queries, vectors.shape[1])))
+    print(f"{len(vectors)} vectors of {vectors.shape[1]} dimensions, {args.queries} queries, k={args.k}\n")
+
+    exact, latencies = [], []
+    for query in queries:
+        start = time.perf_counter()
+        scores = vectors @ query
+        top = np.argpartition(-scores, args.k - 1)[:args.k]
+        latencies.append(time.perf_counter() - start)
+        exact.append(set(top.tolist()))
+
+    print(f"{'index':<18}{'MiB':>10}{'recall@' + str(args.k):>11}{'p50 ms':>10}{'p99 ms':>10}")
+    print(f"{'float32 exact':<18}{vectors.nbytes / (1024 * 1024):>10.1f}{1.0:>11.3f}{percentile_ms(latencies, 50):>10.2f}{percentile_ms(latencies, 99):>10.2f}")
+    for label, mode, rescore in CONFIGS:
+        index = CompactVectorIndex(mode, args.rescore_factor).build(range(len(vectors)), vectors)
+        hits, latencies = 0, []
+        for query, truth in zip(queries, exact):
+            start = time.perf_counter()
+            results = index.search_vector(query, args.k, rescore=rescore)
+            latencies.append(time.perf_counter() - start)
+            hits += len(truth.intersection(row for row, _ in results))
+        recall = hits / (len(queries) * args.k)
+        print(f"{label:<18}{index.compact_bytes() / (1024 * 1024):>10.1f}{recall:>11.3f}{percentile_ms(latencies, 50):>10.2f}{percentile_ms(latencies, 99):>10.2f}")
+    print("\nMiB is what stays in memory; re-scoring reads the float32 vectors of a few candidates from a memory-mapped file")
+
+
+if __name__ == "__main__":
+    main()
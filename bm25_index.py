@@ -0,0 +1,372 @@
+import hashlib
+import json
+import mmap
+import os
+import threading
+from collections import Counter
+from typing import Any, List, Optional
+import numpy as np
+from scipy.sparse import csr_matrix
+from langchain.schema import Document
+from langchain_core.retrievers import BaseRetriever
+from index_versions import current_version, load_current, new_version, publish
+from query_cache import COLLECTION_VERSION_PATH, read_collection_version
+from query_text import sanitize_query
+
+BM25_PATH = "./bm25_index"
+
+# rank_bm25's BM25Okapi defaults, which BM25Retriever uses
+BM25_K1 = 1.5
+BM25_B = 0.75
+BM25_EPSILON = 0.25
+
+# bumped when the saved files change, so an index saved by an older version is rebuilt
+FORMAT_VERSION = 3
+
+
+def tokenize(text):
+    """Same tokenization as BM25Retriever's default, so scores match the retriever this index replaces."""
+    return text.split()
+
+
+def collection_fingerprint(ids):
+    """Returns an order-independent fingerprint of a set of chunk IDs, to tell whether an index matches a collection."""
+    digest = 0
+    for id in ids:
+        digest ^= int.from_bytes(hashlib.sha256(id.encode("utf-8")).digest()[:8], "little")
+    return f"{len(ids)}:{digest:016x}"
+
+
+class BM25Builder:
+    """Mutable BM25 corpus that ingestion keeps in step with the Chroma collection, saved as a BM25Index.
+
+    Chunks are added and removed by ID as they are upserted into or deleted from the collection.
+    Safe to share between ingestion threads.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.vocab = {}  # term -> term id
+        self.docs = {}  # chunk id -> (term ids, term frequencies, length, text, metadata)
+
+    def _term_id(self, term):
+        if term not in self.vocab:
+            self.vocab[term] = len(self.vocab)
+        return self.vocab[term]
+
+    def add(self, ids, documents):
+        """Adds (or replaces) chunks given as Documents under their chunk IDs."""
+        with self.lock:
+            for id, document in zip(ids, documents):
+                tokens = tokenize(document.page_content)
+                counts = Counter(self._term_id(token) for token in tokens)
+                self.docs[id] = (list(counts), list(counts.values()), len(tokens), document.page_content, document.metadata)
+
+    def remove(self, ids):
+        with self.lock:
+            for id in ids:
+                self.docs.pop(id, None)
+
+    def __len__(self):
+        return len(self.docs)
+
+    def chunks(self):
+        """Returns the (id, text, metadata) of every chunk in the corpus."""
+        with self.lock:
+            return [(id, text, metadata) for id, (_, _, _, text, metadata) in self.docs.items()]
+
+    @classmethod
+    def from_chroma(cls, vectorstore):
+        """Builds the corpus from every chunk stored in a Chroma collection."""
+        builder = cls()
+        records = vectorstore.get(include=["documents", "metadatas"])
+        builder.add(records["ids"], [Document(page_content=text, metadata=metadata or {}) for text, metadata in zip(records["documents"], records["metadatas"])])
+        return builder
+
+    @classmethod
+    def for_collection(cls, vectorstore, path=BM25_PATH):
+        """Returns the saved corpus at path to update, or one rebuilt from the collection if missing or out of date."""
+        if index_exists(path):
+            try:
+                builder = cls.load(path)
+                if collection_fingerprint(builder.docs) == collection_fingerprint(vectorstore.get(include=[])["ids"]):
+                    return builder
+                print(f"BM25 index in {path} does not match the collection, rebuilding it")
+            except ValueError as e:
+                print(e)
+        return cls.from_chroma(vectorstore)
+
+    @classmethod
+    def load(cls, path=BM25_PATH):
+        """Loads a saved index back into a builder, so a later ingestion run can update it."""
+        index = BM25Index.load(path)
+        builder = cls()
+        builder.vocab = {term: i for i, term in enumerate(index.vocab)}
+        with open(os.path.join(index.path, "docs.jsonl"), "rb") as f:
+            for row, (id, line) in enumerate(zip(index.ids, f)):
+                start, end = index.doc_indptr[row], index.doc_indptr[row + 1]
+                record = json.loads(line)
+                builder.docs[id] = (index.doc_terms[start:end].tolist(), index.doc_tfs[start:end].tolist(), int(index.doc_len[row]), record["text"], record["metadata"])
+        return builder
+
+    def save(self, path=BM25_PATH):
+        """Writes the index to a new version directory under path as numpy arrays plus a JSON-lines document file.
+
+        The new version becomes current only once it is complete, see index_versions.publish.
+        """
+        with self.lock:
+            ids = list(self.docs)
+            # drop terms no remaining chunk uses, renumbering the rest
+            used = sorted({term for terms, _, _, _, _ in self.docs.values() for term in terms})
+            remap = {term: i for i, term in enumerate(used)}
+            terms_by_id = {i: term for term, i in self.vocab.items()}
+            vocab = [terms_by_id[term] for term in used]
+
+            doc_indptr = np.zeros(len(ids) + 1, dtype=np.int64)
+            doc_terms, doc_tfs, doc_len = [], [], np.zeros(len(ids), dtype=np.int32)
+            for row, id in enumerate(ids):
+                terms, tfs, length, _, _ = self.docs[id]
+                doc_terms.extend(remap[term] for term in terms)
+                doc_tfs.extend(tfs)
+                doc_indptr[row + 1] = len(doc_terms)
+                doc_len[row] = length
+            doc_terms = np.array(doc_terms, dtype=np.int32)
+            doc_tfs = np.array(doc_tfs, dtype=np.int32)
+
+            # the inverted index: a terms x rows CSR matrix holding each posting's BM25 weight
+            rows = np.repeat(np.arange(len(ids), dtype=np.int32), np.diff(doc_indptr))
+            order = np.argsort(doc_terms, kind="stable")
+            index_dtype = np.int32 if len(doc_terms) < 2 ** 31 else np.int64
+            term_indptr = np.zeros(len(vocab) + 1, dtype=index_dtype)
+            np.cumsum(np.bincount(doc_terms, minlength=len(vocab)), out=term_indptr[1:])
+            term_docs = rows[order].astype(index_dtype)
+            weights = bm25_weights(term_indptr, term_docs, doc_tfs[order], doc_len)
+
+            os.makedirs(path, exist_ok=True)
+            version = new_version(path)
+            arrays = {
+                "doc_indptr": doc_indptr, "doc_terms": doc_terms, "doc_tfs": doc_tfs, "doc_len": doc_len,
+                "term_indptr": term_indptr, "term_docs": term_docs, "weights": weights,
+            }
+            for name, array in arrays.items():
+                np.save(os.path.join(version, f"{name}.npy"), array)
+            offsets = np.zeros(len(ids) + 1, dtype=np.int64)
+            with open(os.path.join(version, "docs.jsonl"), "wb") as f:
+                for row, id in enumerate(ids):
+                    f.write(json.dumps({"text": self.docs[id][3], "metadata": self.docs[id][4]}).encode("utf-8") + b"\n")
+                    offsets[row + 1] = f.tell()
+            np.save(os.path.join(version, "doc_offsets.npy"), offsets)
+
+            # the category of every row, for searching only some categories, and the page titles in each,
+            # which QueryRouter matches against queries
+            metadatas = [self.docs[id][4] or {} for id in ids]
+            categories = sorted({metadata.get("category") for metadata in metadatas if metadata.get("category")})
+            category_ids = {category: i for i, category in enumerate(categories)}
+            np.save(os.path.join(version, "doc_category.npy"), np.array([category_ids.get(metadata.get("category"), -1) for metadata in metadatas], dtype=np.int16))
+            titles = {}
+            for metadata in metadatas:
+                if metadata.get("title") and metadata.get("category"):
+                    titles.setdefault(sanitize_query(metadata["title"]), set()).add(metadata["category"])
+            with open(os.path.join(version, "meta.json"), "w") as f:
+                json.dump({
+                    "format": FORMAT_VERSION, "fingerprint": collection_fingerprint(ids), "ids": ids, "vocab": vocab,
+                    "categories": categories, "titles": {title: sorted(found) for title, found in titles.items()},
+                }, f)
+            publish(path, version)
+
+
+def bm25_weights(term_indptr, term_docs, term_tfs, doc_len, k1=BM25_K1, b=BM25_B, epsilon=BM25_EPSILON):
+    """Returns the BM25 weight of every posting of an inverted index, as rank_bm25's BM25Okapi computes it.
+
+    A query's score for a row is then the sum of the weights of its terms' postings in that row.
+    """
+    corpus_size = len(doc_len)
+    if not corpus_size:
+        return np.zeros(0)
+    df = np.diff(term_indptr).astype(np.float64)
+    idf = np.log(corpus_size - df + 0.5) - np.log(df + 0.5)
+    # like BM25Okapi, terms in more than half the corpus get a small positive idf instead of a negative one
+    idf = np.where(idf < 0, epsilon * idf.mean(), idf) if len(idf) else idf
+    # same operation order as BM25Okapi.get_scores, so scores match it up to rounding
+    avgdl = int(doc_len.sum()) / corpus_size
+    norm = k1 * (1 - b + b * doc_len / avgdl)
+    tfs = term_tfs.astype(np.float64)
+    return np.repeat(idf, np.diff(term_indptr)) * (tfs * (k1 + 1) / (tfs + norm[term_docs]))
+
+
+class BM25Index:
+    """Read-only BM25 index loaded from disk, scoring like rank_bm25's BM25Okapi (k1=1.5, b=0.75, epsilon=0.25).
+
+    The inverted index is a SciPy CSR matrix of precomputed posting weights, terms x rows, so a batch of
+    queries is scored with one sparse matrix product and only the rows matching some query term are ranked.
+    Arrays and the documents file are memory-mapped and document texts are only parsed for the results,
+    so loading takes milliseconds regardless of corpus size. A search limited to some categories multiplies
+    only their columns, sliced out of the matrix the first time each category is searched.
+    """
+
+    def __init__(self):
+        self.path = None
+        self.fingerprint = None
+        self.ids = []
+        self.vocab = []
+        self.term_ids = {}
+        self.matrix = None
+        self.docs = b""  # docs.jsonl, memory-mapped
+        self.categories = []
+        self.titles = {}  # sanitized page title -> categories of the pages with that title
+        self.lock = threading.Lock()
+        self.partitions = {}  # category id -> (its rows, its columns of matrix)
+
+    @classmethod
+    def load(cls, path=BM25_PATH):
+        """Loads the current version of the index saved at path."""
+        return load_current(path, cls._load_version)
+
+    @classmethod
+    def _load_version(cls, path):
+        index = cls()
+        index.path = path
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+        if meta.get("format") != FORMAT_VERSION:
+            raise ValueError(f"BM25 index in {path} has an old format, rebuild it with store_db.py --rebuild-index")
+        index.fingerprint, index.ids, index.vocab = meta["fingerprint"], meta["ids"], meta["vocab"]
+        index.term_ids = {term: i for i, term in enumerate(index.vocab)}
+        index.categories, index.titles = meta["categories"], meta["titles"]
+        for name in ("doc_indptr", "doc_terms", "doc_tfs", "doc_len", "doc_offsets", "doc_category"):
+            setattr(index, name, np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r"))
+        arrays = [np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r") for name in ("weights", "term_docs", "term_indptr")]
+        index.matrix = csr_matrix(tuple(arrays), shape=(len(index.vocab), len(index.ids)), copy=False)
+        with open(os.path.join(path, "docs.jsonl"), "rb") as f:
+            # an empty file can't be mapped
+            if os.fstat(f.fileno()).st_size:
+                index.docs = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return index
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _query_matrix(self, queries):
+        """Returns a queries x terms CSR matrix of query term counts; repeated terms count once per occurrence, like BM25Okapi."""
+        rows, terms = [], []
+        for i, query in enumerate(queries):
+            for token in tokenize(query):
+                term = self.term_ids.get(token)
+                if term is not None:
+                    rows.append(i)
+                    terms.append(term)
+        return csr_matrix((np.ones(len(rows)), (rows, terms)), shape=(len(queries), len(self.vocab)))
+
+    def get_scores(self, query):
+        """Returns the BM25 score of every chunk for a query string."""
+        return (self._query_matrix([query]) @ self.matrix).toarray()[0]
+
+    def _category_ids(self, categories):
+        return [self.categories.index(category) for category in categories if category in self.categories]
+
+    def _partition(self, category_id):
+        """Returns the rows of a category and the matrix of their columns, building them on first use."""
+        with self.lock:
+            if category_id not in self.partitions:
+                rows = np.flatnonzero(np.asarray(self.doc_category) == category_id)
+                self.partitions[category_id] = (rows, self.matrix[:, rows].tocsr())
+            return self.partitions[category_id]
+
+    def _top_k(self, rows, scores, k, fill=True):
+        if len(rows) > k:
+            # keep every row tied with the k-th score, so ties are broken the same way however argpartition split them
+            threshold = scores[np.argpartition(-scores, k - 1)[k - 1]]
+            keep = scores >= threshold
+            rows, scores = rows[keep], scores[keep]
+        # best first, ties to the later row like BM25Okapi.get_top_n
+        order = np.lexsort((-rows, -scores))[:k]
+        results = [(int(rows[i]), float(scores[i])) for i in order]
+        # a search limited to some categories returns only chunks matching a query term
+        if len(results) < k and fill:
+            # like BM25Retriever, fill up with rows matching no query term, from the last row down
+            matched = set(rows.tolist())
+            for row in range(len(self.ids) - 1, -1, -1):
+                if len(results) == k:
+                    break
+                if row not in matched:
+                    results.append((row, 0.0))
+        return results
+
+    def search_batch(self, queries, k=5, categories=None):
+        """Returns the (row, score) of the k best chunks for each query, best first, scoring all queries at once.
+
+        With categories, only chunks whose category metadata is one of them are scored, and only those matching
+        a query term are returned.
+        """
+        if not self.ids:
+            return [[] for _ in queries]
+        query_matrix = self._query_matrix(queries)
+        if categories is None:
+            partitions = [(None, self.matrix)]
+        else:
+            partitions = [self._partition(category_id) for category_id in self._category_ids(categories)]
+        # each partition's scores, with its columns mapped back to rows
+        scored = [(rows, (query_matrix @ matrix).tocsr()) for rows, matrix in partitions]
+        results = []
+        for i in range(len(queries)):
+            found_rows, found_scores = [np.zeros(0, dtype=np.int64)], [np.zeros(0)]
+            for rows, scores in scored:
+                start, end = scores.indptr[i], scores.indptr[i + 1]
+                columns = scores.indices[start:end].astype(np.int64)
+                found_rows.append(columns if rows is None else rows[columns])
+                found_scores.append(scores.data[start:end])
+            results.append(self._top_k(np.concatenate(found_rows), np.concatenate(found_scores), k, fill=categories is None))
+        return results
+
+    def best_scores(self, query, categories):
+        """Returns the best score of query over all chunks and over the chunks of categories, 0.0 if none matches."""
+        scores = (self._query_matrix([query]) @ self.matrix).tocsr()
+        if not scores.nnz:
+            return 0.0, 0.0
+        in_categories = np.isin(self.doc_category[scores.indices], self._category_ids(categories))
+        return float(scores.data.max()), float(scores.data[in_categories].max()) if in_categories.any() else 0.0
+
+    def search(self, query, k=5, categories=None):
+        """Returns the (row, score) of the k best chunks for a query, best first."""
+        return self.search_batch([query], k, categories)[0]
+
+    def document(self, row):
+        """Returns (text, metadata) of a row, read from the memory-mapped documents file."""
+        record = json.loads(self.docs[int(self.doc_offsets[row]):int(self.doc_offsets[row + 1])])
+        return record["text"], record["metadata"]
+
+
+def index_exists(path=BM25_PATH):
+    """Returns True if a BM25 index, of any version, is saved at path."""
+    return os.path.exists(os.path.join(current_version(path), "meta.json"))
+
+
+def load_bm25_index(path=BM25_PATH, version_path=COLLECTION_VERSION_PATH):
+    """Loads the BM25 index saved at path, raising ValueError if it is missing, outdated or not the collection's.
+
+    The index must match the fingerprint store_db.py last recorded in version_path. Only store_db.py writes
+    the index, so serving processes never race each other or a running ingestion to rebuild it.
+    store_db.py --rebuild-index rebuilds it from the collection without crawling.
+    """
+    if not index_exists(path):
+        raise ValueError(f"No BM25 index in {path}, build it from the collection with store_db.py --rebuild-index")
+    index = BM25Index.load(path)
+    version = read_collection_version(version_path)
+    if index.fingerprint != version:
+        raise ValueError(f"BM25 index in {path} does not match the collection recorded in {version_path}, rebuild it from the collection with store_db.py --rebuild-index")
+    return index
+
+
+class BM25IndexRetriever(BaseRetriever):
+    """Sparse retriever over a saved BM25Index, for use in place of BM25Retriever; categories limits it to those categories."""
+
+    index: Any
+    k: int = 5
+    categories: Optional[List[str]] = None
+
+    def _get_relevant_documents(self, query, *, run_manager=None):
+        documents = []
+        for row, _ in self.index.search(query, self.k, self.categories):
+            text, metadata = self.index.document(row)
+            documents.append(Document(id=self.index.ids[row], page_content=text, metadata=metadata))
+        return documents
@@ -0,0 +1,303 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import numpy as np
+from langchain.schema import Document
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+_MERSENNE_PRIME = (1 << 61) - 1
+
+
+def normalize_chunk(text):
+    """Lowercases a chunk and collapses whitespace, so trivially different copies compare equal."""
+    return " ".join(text.lower().split())
+
+
+class MinHashIndex:
+    """Finds near-duplicate texts by MinHash over word shingles, with LSH banding to avoid comparing every pair.
+
+    num_perm hash functions are split into bands of num_perm // bands rows; texts sharing any band are
+    candidates, and a candidate counts as a duplicate if its estimated Jaccard similarity is at least threshold.
+    Every indexed signature carries a value, e.g. the key of the chunk it was computed from.
+    """
+
+    def __init__(self, threshold=0.85, num_perm=64, bands=16, shingle_size=5, seed=1):
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+        # shingle hashes and coefficients are 32-bit, so a * h + b never overflows uint64
+        rng = np.random.default_rng(seed)
+        self.a = rng.integers(1, 1 << 32, size=num_perm, dtype=np.uint64)
+        self.b = rng.integers(0, 1 << 32, size=num_perm, dtype=np.uint64)
+        self.buckets = {}  # (band, band signature bytes) -> list of (signature, value)
+        self.signatures = 0
+
+    def signature(self, text):
+        words = re.findall(r"\w+", text.lower())
+        if len(words) < self.shingle_size:
+            shingles = {" ".join(words)}
+        else:
+            shingles = {" ".join(words[i:i + self.shingle_size]) for i in range(len(words) - self.shingle_size + 1)}
+        hashes = np.array([int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=4).digest(), "little") for s in shingles], dtype=np.uint64)
+        return ((self.a[:, None] * hashes[None, :] + self.b[:, None]) % _MERSENNE_PRIME).min(axis=1)
+
+    def _band_keys(self, signature):
+        return [(band, signature[band * self.rows:(band + 1) * self.rows].tobytes()) for band in range(self.bands)]
+
+    def matches(self, signature):
+        """Yields the values of indexed signatures whose estimated Jaccard similarity to signature is at least threshold."""
+        found = set()
+        for key in self._band_keys(signature):
+            for other, value in self.buckets.get(key, ()):
+                if value not in found and np.mean(signature == other) >= self.threshold:
+                    found.add(value)
+                    yield value
+
+    def add(self, signature, value):
+        for key in self._band_keys(signature):
+            self.buckets.setdefault(key, []).append((signature, value))
+        self.signatures += 1
+
+
+class ChunkSplitter:
+    """Splits documents along their structure and drops chunks that repeat text already stored for another page.
+
+    Scraped documents are the h1 title, fact box, paragraphs and list items, one per line. Lines are packed
+    whole into chunks of up to chunk_size characters; a line longer than that is split on its own by a
+    RecursiveCharacterTextSplitter. The last lines of a chunk, up to chunk_overlap characters, are repeated
+    at the start of the next one, or the end of its last line, from a sentence or word boundary, if that line
+    alone is longer. No chunk is longer than chunk_size: the overlap shrinks to make room for the next line.
+
+    With dedupe="exact", a chunk whose normalized text another page owns is dropped; with dedupe="near", so is
+    a chunk that a MinHash index finds near-identical to one. The first page to produce a text owns it, and the
+    pages whose copy was dropped are recorded as referencing it. When a page is split again (e.g. it changed),
+    its references are recomputed and the texts it no longer produces are given up, unless other pages
+    reference them: is_referenced() then tells the caller to keep that stored chunk, so no page loses text
+    another page's change removed. seed() loads the owners of an existing collection and refs_file keeps the
+    references between runs, so a changed page replaces only its own chunks.
+    """
+
+    def __init__(self, chunk_size=1000, chunk_overlap=100, dedupe="near", near_threshold=0.85, refs_file=None):
+        if dedupe not in (None, "exact", "near"):
+            raise ValueError(f"Unknown dedupe mode: {dedupe}")
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.dedupe = dedupe
+        self.long_line_splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap, length_function=len)
+        self.minhash = MinHashIndex(threshold=near_threshold) if dedupe == "near" else None
+        self.owners = {}  # chunk key -> source of the page whose stored chunk has that text
+        self.owned = {}  # source -> chunk keys it owns
+        self.refs = {}  # chunk key -> sources whose copy of the text was dropped
+        self.referenced = {}  # source -> chunk keys it references
+        self.refs_file = refs_file
+        self.lock = threading.Lock()
+        self.chunks = 0
+        self.exact_duplicates = 0
+        self.near_duplicates = 0
+        self._load_refs()
+
+    def _load_refs(self):
+        if not self.refs_file or not os.path.exists(self.refs_file):
+            return
+        try:
+            with open(self.refs_file) as f:
+                refs = json.load(f)
+        except Exception as e:
+            print(f"Could not load chunk references: {e}")
+            return
+        for key, sources in refs.items():
+            self.refs[key] = set(sources)
+            for source in sources:
+                self.referenced.setdefault(source, set()).add(key)
+
+    def save(self):
+        """Saves the references between pages to refs_file, for the next run."""
+        if not self.refs_file:
+            return
+        with self.lock:
+            refs = {key: sorted(sources) for key, sources in self.refs.items()}
+        try:
+            with open(self.refs_file, "w") as f:
+                json.dump(refs, f)
+        except Exception as e:
+            print(f"Could not save chunk references: {e}")
+
+    @staticmethod
+    def key(text):
+        """Returns the deduplication key of a chunk's text."""
+        return hashlib.sha256(normalize_chunk(text).encode("utf-8")).hexdigest()
+
+    def _own(self, key, source, signature=None):
+        self.owners[key] = source
+        self.owned.setdefault(source, set()).add(key)
+        if signature is not None:
+            self.minhash.add(signature, key)
+
+    def seed(self, chunks):
+        """Records who owns the (text, source) chunks already stored, e.g. in the collection an incremental run updates."""
+        if not self.dedupe:
+            return
+        with self.lock:
+            for text, source in chunks:
+                key = self.key(text)
+                if key not in self.owners:
+                    self._own(key, source, self.minhash.signature(text) if self.minhash else None)
+
+    def is_referenced(self, text, source):
+        """Returns True if source owns text and other pages' copies of it were dropped, so its stored chunk must stay."""
+        key = self.key(text)
+        with self.lock:
+            return self.owners.get(key) == source and bool(self.refs.get(key))
+
+    def release(self, source):
+        """Forgets which texts a page referenced, e.g. because it changed or was deleted."""
+        with self.lock:
+            self._release(source)
+
+    def _release(self, source):
+        for key in self.referenced.pop(source, ()):
+            sources = self.refs.get(key)
+            if sources is not None:
+                sources.discard(source)
+                if not sources:
+                    del self.refs[key]
+
+    def _lines(self, text):
+        for line in text.split("\n"):
+            line = line.strip()
+            if not line:
+                continue
+            if len(line) > self.chunk_size:
+                yield from self.long_line_splitter.split_text(line)
+            else:
+                yield line
+
+    def _tail(self, line, budget):
+        """Returns the end of line, shorter than budget, starting at a sentence boundary or else a word boundary."""
+        if budget <= 1:
+            return ""
+        tail = line[len(line) - budget + 1:]
+        sentence = re.search(r"[.!?]\s+", tail)
+        if sentence:
+            return tail[sentence.end():]
+        space = tail.find(" ")
+        return tail[space + 1:] if space >= 0 else ""
+
+    def split_text(self, text):
+        """Packs the lines of text into chunks of up to chunk_size characters, overlapping by whole lines where they fit."""
+        chunks = []
+        current = []
+        length = 0
+        for line in self._lines(text):
+            if current and length + len(line) + 1 > self.chunk_size:
+                chunks.append("\n".join(current))
+                # the overlap may not push the next chunk over chunk_size together with line
+                budget = min(self.chunk_overlap, self.chunk_size - len(line) - 1)
+                # carry trailing lines over while they fit in the overlap budget
+                overlap = []
+                overlap_length = 0
+                for previous in reversed(current):
+                    if overlap_length + len(previous) + 1 > budget:
+                        break
+                    overlap.insert(0, previous)
+                    overlap_length += len(previous) + 1
+                if not overlap:
+                    # the last line is longer than the overlap budget, so carry over the end of it
+                    tail = self._tail(current[-1], budget)
+                    if tail:
+                        overlap, overlap_length = [tail], len(tail) + 1
+                current, length = overlap, overlap_length
+            current.append(line)
+            length += len(line) + 1
+        if current:
+            chunks.append("\n".join(current))
+        return chunks
+
+    def _duplicate_of(self, key, signature, source, produced):
+        """Returns the key of the text chunk repeats, if this page produced it already or another page owns it."""
+        if key in produced:
+            self.exact_duplicates += 1
+            return key
+        owner = self.owners.get(key)
+        if owner is not None:
+            if owner == source:
+                return None
+            self.exact_duplicates += 1
+            return key
+        if signature is not None:
+            for other in self.minhash.matches(signature):
+                owner = self.owners.get(other)
+                # texts given up since they were indexed have no owner
+                if other in produced or (owner is not None and owner != source):
+                    self.near_duplicates += 1
+                    return other
+        return None
+
+    def _dedupe(self, source, chunks):
+        """Returns the chunks of a page that aren't duplicates, updating ownership and references."""
+        self._release(source)
+        produced = set()
+        kept = []
+        for chunk in chunks:
+            key = self.key(chunk)
+            signature = self.minhash.signature(chunk) if self.minhash else None
+            duplicate = self._duplicate_of(key, signature, source, produced)
+            if duplicate is not None:
+                if duplicate not in produced:
+                    self.refs.setdefault(duplicate, set()).add(source)
+                    self.referenced.setdefault(source, set()).add(duplicate)
+                continue
+            if self.owners.get(key) != source:
+                self._own(key, source, signature)
+            produced.add(key)
+            kept.append(chunk)
+        # texts the page no longer produces are given up, unless other pages dropped their copy for them
+        owned = self.owned.get(source, set())
+        for key in owned - produced:
+            if not self.refs.get(key):
+                del self.owners[key]
+                owned.discard(key)
+        return kept
+
+    def split_documents(self, documents):
+        """Splits documents into chunk Documents carrying the source metadata plus a start_index."""
+        result = []
+        for document in documents:
+            text = document.page_content
+            chunks = self.split_text(text)
+            with self.lock:
+                if self.dedupe:
+                    chunks = self._dedupe(document.metadata.get("source"), chunks)
+                self.chunks += len(chunks)
+            position = 0
+            for chunk in chunks:
+                start = text.find(chunk.split("\n", 1)[0], position)
+                if start >= 0:
+                    position = start + 1
+                result.append(Document(page_content=chunk, metadata=dict(document.metadata, start_index=max(start, 0))))
+        return result
+
+    def stats(self):
+        with self.lock:
+            return {"chunks": self.chunks, "exact_duplicates": self.exact_duplicates, "near_duplicates": self.near_duplicates, "referenced_texts": len(self.refs)}
+
+    def report(self):
+        return "Chunking: " + ", ".join(f"{key}={value}" for key, value in self.stats().items())
+
+
+def get_text_splitter(chunking="structured", dedupe="near", chunk_size=1000, refs_file=None):
+    """Returns the splitter for a chunking mode: "structured" (line-aligned, 10% overlap, deduplicated) or "recursive" (the original 50% overlap splitter)."""
+    if chunking == "recursive":
+        return RecursiveCharacterTextSplitter(
+            chunk_size=chunk_size,
+            chunk_overlap=chunk_size // 2,
+            length_function=len,
+            add_start_index=True,
+        )
+    if chunking == "structured":
+        return ChunkSplitter(chunk_size=chunk_size, chunk_overlap=chunk_size // 10, dedupe=dedupe, refs_file=refs_file)
+    raise ValueError(f"Unknown chunking mode: {chunking}")
@@ -0,0 +1,186 @@
+import json
+import mmap
+import os
+import sys
+from typing import Any
+import numpy as np
+from langchain.schema import Document
+from langchain_core.retrievers import BaseRetriever
+from bm25_index import collection_fingerprint
+from index_versions import load_current, new_version, publish
+
+COMPACT_PATH = "./chroma_compact"
+
+
+def normalize_rows(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    return vectors / np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12, None)
+
+
+class CompactVectorIndex:
+    """Cosine-similarity index over scalar-quantized vectors, with exact re-scoring of the best candidates.
+
+    With mode="int8" every unit-normalized vector is stored as int8 codes plus one float32 scale (4x smaller
+    than float32); with mode="float16" as half floats (2x smaller). A query is scored against the compact
+    codes, the rescore_factor * k best candidates are re-scored exactly against float32 vectors kept in a
+    memory-mapped file, and the top k are returned. Chunk texts and metadata are read from a memory-mapped
+    JSON-lines file only for the results, so the codes and chunk IDs are all that stays in RAM.
+    fingerprint identifies the chunks indexed, to compare against the collection's.
+    """
+
+    def __init__(self, mode="int8", rescore_factor=4):
+        if mode not in ("int8", "float16"):
+            raise ValueError(f"Unknown quantization mode: {mode}")
+        self.mode = mode
+        self.rescore_factor = rescore_factor
+        self.ids = []
+        self.documents = []  # texts and metadatas of an index built in memory
+        self.metadatas = []
+        self.records = None  # records.jsonl, memory-mapped once loaded from disk
+        self.record_offsets = None
+        self.categories = []
+        self.row_category = None  # index into categories of every row's category, -1 if it has none
+        self.codes = None
+        self.scales = None
+        self.vectors = None  # float32, memory-mapped once loaded from disk
+        self.fingerprint = None
+
+    def __len__(self):
+        return len(self.ids)
+
+    def build(self, ids, vectors, documents=None, metadatas=None):
+        vectors = normalize_rows(vectors)
+        self.ids = list(ids)
+        self.documents = list(documents) if documents is not None else [""] * len(self.ids)
+        self.metadatas = list(metadatas) if metadatas is not None else [{}] * len(self.ids)
+        self.fingerprint = collection_fingerprint(self.ids)
+        self.categories = sorted({(metadata or {}).get("category") for metadata in self.metadatas} - {None})
+        category_ids = {category: i for i, category in enumerate(self.categories)}
+        self.row_category = np.array([category_ids.get((metadata or {}).get("category"), -1) for metadata in self.metadatas], dtype=np.int16)
+        if self.mode == "int8":
+            self.scales = np.clip(np.abs(vectors).max(axis=1), 1e-12, None) / 127.0
+            self.codes = np.round(vectors / self.scales[:, None]).astype(np.int8)
+        else:
+            self.codes = vectors.astype(np.float16)
+        self.vectors = vectors
+        return self
+
+    @classmethod
+    def from_chroma(cls, vectorstore, mode="int8", rescore_factor=4):
+        records = vectorstore.get(include=["embeddings", "documents", "metadatas"])
+        return cls(mode, rescore_factor).build(records["ids"], records["embeddings"], records["documents"], records["metadatas"])
+
+    def compact_bytes(self):
+        """Returns the bytes that have to stay in memory: the codes, scales, row categories and chunk IDs.
+
+        The memory-mapped float32 vectors and records are not counted, nor the texts of an index built in memory.
+        """
+        arrays = self.codes.nbytes + self.row_category.nbytes + (self.scales.nbytes if self.scales is not None else 0)
+        return arrays + sys.getsizeof(self.ids) + sum(sys.getsizeof(id) for id in self.ids)
+
+    def document(self, row):
+        """Returns (text, metadata) of a row, read from the memory-mapped records file once loaded from disk."""
+        if self.records is None:
+            return self.documents[row], self.metadatas[row] or {}
+        record = json.loads(self.records[int(self.record_offsets[row]):int(self.record_offsets[row + 1])])
+        return record["text"], record["metadata"] or {}
+
+    def _compact_scores(self, query, rows=None, block_size=16384):
+        # numpy upcasts the codes to float32 for the product, so score in blocks to bound that copy
+        count = len(self.codes) if rows is None else len(rows)
+        scores = np.empty(count, dtype=np.float32)
+        for start in range(0, count, block_size):
+            block_rows = slice(start, start + block_size) if rows is None else rows[start:start + block_size]
+            block = self.codes[block_rows].astype(np.float32) @ query
+            if self.scales is not None:
+                block *= self.scales[block_rows]
+            scores[start:start + block_size] = block
+        return scores
+
+    def category_rows(self, categories):
+        """Returns the rows whose category metadata is one of categories."""
+        category_ids = [self.categories.index(category) for category in categories if category in self.categories]
+        return np.flatnonzero(np.isin(self.row_category, category_ids))
+
+    def search_vector(self, query, k=5, rescore=True, rows=None):
+        """Returns the (row, cosine similarity) of the k vectors most similar to query, best first.
+
+        With rows, only those rows are searched.
+        """
+        if not self.ids or (rows is not None and not len(rows)):
+            return []
+        query = normalize_rows([query])[0]
+        scores = self._compact_scores(query, rows)
+        candidates = min(len(scores), k * self.rescore_factor if rescore else k)
+        # sorted rows read the memory-mapped vectors in file order
+        best = np.sort(np.argpartition(-scores, candidates - 1)[:candidates])
+        scores = scores[best]
+        rows = best if rows is None else rows[best]
+        if rescore:
+            scores = np.asarray(self.vectors[rows]) @ query
+        best = np.argsort(-scores)[:k]
+        return [(int(rows[i]), float(scores[i])) for i in best]
+
+    def save(self, path=COMPACT_PATH):
+        """Writes the index to a new version directory under path, and makes it current once it is complete.
+
+        Processes that memory-mapped the previous version keep reading its files until they reload.
+        """
+        os.makedirs(path, exist_ok=True)
+        version = new_version(path)
+        np.save(os.path.join(version, "codes.npy"), self.codes)
+        if self.scales is not None:
+            np.save(os.path.join(version, "scales.npy"), self.scales)
+        np.save(os.path.join(version, "vectors.npy"), self.vectors)
+        np.save(os.path.join(version, "row_category.npy"), self.row_category)
+        offsets = np.zeros(len(self.ids) + 1, dtype=np.int64)
+        with open(os.path.join(version, "records.jsonl"), "wb") as f:
+            for row in range(len(self.ids)):
+                text, metadata = self.document(row)
+                f.write(json.dumps({"text": text, "metadata": metadata}).encode("utf-8") + b"\n")
+                offsets[row + 1] = f.tell()
+        np.save(os.path.join(version, "record_offsets.npy"), offsets)
+        with open(os.path.join(version, "meta.json"), "w") as f:
+            json.dump({"mode": self.mode, "fingerprint": self.fingerprint, "ids": self.ids, "categories": self.categories}, f)
+        publish(path, version)
+
+    @classmethod
+    def load(cls, path=COMPACT_PATH, rescore_factor=4):
+        """Loads the current version of the index saved at path."""
+        return load_current(path, lambda version: cls._load_version(version, rescore_factor))
+
+    @classmethod
+    def _load_version(cls, path, rescore_factor):
+        if not os.path.exists(os.path.join(path, "meta.json")):
+            raise ValueError(f"Compact index in {path} has an old format, rebuild it with store_db.py --compact")
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+        index = cls(meta["mode"], rescore_factor)
+        index.ids, index.fingerprint, index.categories = meta["ids"], meta["fingerprint"], meta["categories"]
+        index.codes = np.load(os.path.join(path, "codes.npy"))
+        if index.mode == "int8":
+            index.scales = np.load(os.path.join(path, "scales.npy"))
+        index.row_category = np.load(os.path.join(path, "row_category.npy"))
+        index.record_offsets = np.load(os.path.join(path, "record_offsets.npy"), mmap_mode="r")
+        index.vectors = np.load(os.path.join(path, "vectors.npy"), mmap_mode="r")
+        with open(os.path.join(path, "records.jsonl"), "rb") as f:
+            # an empty file can't be mapped
+            index.records = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if os.fstat(f.fileno()).st_size else b""
+        return index
+
+
+class CompactRetriever(BaseRetriever):
+    """Dense retriever over a CompactVectorIndex, for use in place of the Chroma retriever; rows limits it to those rows."""
+
+    index: Any
+    embeddings: Any
+    k: int = 5
+    rows: Any = None
+
+    def _get_relevant_documents(self, query, *, run_manager=None):
+        results = self.index.search_vector(self.embeddings.embed_query(query), self.k, rows=self.rows)
+        documents = []
+        for row, _ in results:
+            text, metadata = self.index.document(row)
+            documents.append(Document(id=self.index.ids[row], page_content=text, metadata=metadata))
+        return documents
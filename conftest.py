@@ -0,0 +1 @@
+# lets tests/ import the top-level modules of this repository
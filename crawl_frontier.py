@@ -0,0 +1,157 @@
+import json
+import sqlite3
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+# lower is crawled first; keyed by the first path segment of a URL
+CATEGORY_PRIORITIES = {
+    "character": 0,
+    "creature": 1,
+    "magic": 2,
+    "thing": 3,
+    "place": 4,
+    "source": 5,
+    "event": 6,
+}
+DEFAULT_PRIORITY = 10
+
+# WordPress parameters that select the page itself (e.g. /?attachment_id=638), so they are never dropped
+CONTENT_PARAMS = ("attachment_id", "p", "page_id")
+
+# a page that fails this many times in one run is given up on until the next run
+MAX_ATTEMPTS = 3
+
+
+def normalize_url(url, keep_params=()):
+    """Normalizes a URL so that equivalent spellings dedupe to one entry.
+
+    Lowercases the scheme and host, drops the fragment, adds a trailing slash to the path and drops
+    every query parameter not in keep_params or CONTENT_PARAMS (content pages ignore ?letter=, listing
+    pages need it).
+    """
+    parts = urlsplit(url.strip())
+    path = parts.path or "/"
+    if not path.endswith("/") and "." not in path.rsplit("/", 1)[-1]:
+        path += "/"
+    query = urlencode(sorted((k, v) for k, v in parse_qsl(parts.query) if k in keep_params or k in CONTENT_PARAMS))
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), path, query, ""))
+
+
+def url_category(url):
+    """Returns the category of a URL, i.e. its first path segment ("character", "place", ...), or "" for the home page."""
+    segments = [segment for segment in urlsplit(url).path.split("/") if segment]
+    return segments[0] if segments else ""
+
+
+def category_priority(url):
+    """Returns the crawl priority of a URL based on its category path segment."""
+    return CATEGORY_PRIORITIES.get(url_category(url), DEFAULT_PRIORITY)
+
+
+class CrawlFrontier:
+    """Priority queue of pages to crawl, deduplicated by normalized URL and checkpointed to SQLite.
+
+    Every push and mark_done is committed immediately, so after an interruption the frontier still
+    knows which pages were queued but not crawled yet, and which listing pages were fully walked.
+    """
+
+    def __init__(self, frontier_file="crawl_frontier.db"):
+        self.frontier_file = frontier_file
+        self.conn = sqlite3.connect(frontier_file)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            """CREATE TABLE IF NOT EXISTS frontier (
+                url TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                priority INTEGER NOT NULL,
+                seq INTEGER NOT NULL,
+                options TEXT NOT NULL,
+                done INTEGER NOT NULL DEFAULT 0,
+                attempts INTEGER NOT NULL DEFAULT 0
+            )"""
+        )
+        # frontiers checkpointed before failed pages were retried lack the attempts column
+        if "attempts" not in [row[1] for row in self.conn.execute("PRAGMA table_info(frontier)")]:
+            self.conn.execute("ALTER TABLE frontier ADD COLUMN attempts INTEGER NOT NULL DEFAULT 0")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS frontier_pending ON frontier (done, priority, seq)")
+        self.conn.commit()
+        self.seq = self.conn.execute("SELECT COALESCE(MAX(seq), 0) FROM frontier").fetchone()[0]
+
+    def push(self, url, kind="page", priority=None, **options):
+        """Queues a URL unless it is already known. Returns True if it was added."""
+        self.seq += 1
+        if priority is None:
+            priority = category_priority(url)
+        cursor = self.conn.execute(
+            "INSERT OR IGNORE INTO frontier (url, kind, priority, seq, options) VALUES (?, ?, ?, ?, ?)",
+            (url, kind, priority, self.seq, json.dumps(options, sort_keys=True)),
+        )
+        self.conn.commit()
+        return cursor.rowcount > 0
+
+    def push_many(self, urls, kind="page", **options):
+        """Queues every URL that is not already known, in order. Returns how many were added."""
+        rows = []
+        for url in urls:
+            self.seq += 1
+            rows.append((url, kind, category_priority(url), self.seq, json.dumps(options, sort_keys=True)))
+        before = self.conn.total_changes
+        self.conn.executemany("INSERT OR IGNORE INTO frontier (url, kind, priority, seq, options) VALUES (?, ?, ?, ?, ?)", rows)
+        self.conn.commit()
+        return self.conn.total_changes - before
+
+    def pop_batch(self, size=64, kind="page"):
+        """Returns up to size pending (url, options) of a kind, highest priority first and pages that failed before last.
+
+        They stay pending until mark_done, or until mark_failed gives up on them.
+        """
+        rows = self.conn.execute(
+            "SELECT url, options FROM frontier WHERE done = 0 AND kind = ? ORDER BY attempts, priority, seq LIMIT ?", (kind, size)
+        ).fetchall()
+        return [(url, json.loads(options)) for url, options in rows]
+
+    def mark_done(self, urls):
+        """Marks URLs as crawled, adding them first if they were never queued (e.g. walked listing pages)."""
+        for url in urls:
+            self.seq += 1
+            self.conn.execute(
+                """INSERT INTO frontier (url, kind, priority, seq, options, done) VALUES (?, 'listing', ?, ?, '{}', 1)
+                   ON CONFLICT(url) DO UPDATE SET done = 1""",
+                (url, category_priority(url), self.seq),
+            )
+        self.conn.commit()
+
+    def mark_failed(self, urls, max_attempts=MAX_ATTEMPTS):
+        """Records a failed attempt at each URL. It stays pending, to be retried after the other pages, until max_attempts."""
+        self.conn.executemany(
+            "UPDATE frontier SET attempts = attempts + 1, done = CASE WHEN attempts + 1 >= ? THEN 1 ELSE 0 END WHERE url = ?",
+            [(max_attempts, url) for url in urls],
+        )
+        self.conn.commit()
+
+    def requeue(self, urls):
+        """Marks crawled URLs as pending again, with their attempts reset."""
+        self.conn.executemany("UPDATE frontier SET done = 0, attempts = 0 WHERE url = ?", ((url,) for url in urls))
+        self.conn.commit()
+
+    def is_done(self, url):
+        row = self.conn.execute("SELECT done FROM frontier WHERE url = ?", (url,)).fetchone()
+        return bool(row and row[0])
+
+    def pending_count(self, kind="page"):
+        return self.conn.execute("SELECT COUNT(*) FROM frontier WHERE done = 0 AND kind = ?", (kind,)).fetchone()[0]
+
+    def reset_attempts(self):
+        """Gives pages that failed in an earlier run their attempts back; failures the run gave up on are pending again."""
+        self.conn.execute("UPDATE frontier SET done = CASE WHEN attempts >= ? THEN 0 ELSE done END, attempts = 0", (MAX_ATTEMPTS,))
+        self.conn.commit()
+
+    def reset(self):
+        self.conn.execute("DELETE FROM frontier")
+        self.conn.commit()
+        self.seq = 0
+
+    def close(self):
+        self.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        self.conn.close()
+
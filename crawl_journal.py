@@ -0,0 +1,95 @@
+import os
+import sqlite3
+import time
+
+
+def remove_journal(journal_file):
+    """Deletes a journal database and its WAL side files. Returns True if anything was removed."""
+    removed = False
+    for path in (journal_file, f"{journal_file}-wal", f"{journal_file}-shm"):
+        if os.path.exists(path):
+            os.remove(path)
+            removed = True
+    return removed
+
+
+class CrawlJournal:
+    """Append-only log of crawled URLs backed by a small SQLite table.
+
+    Every record() is a single committed INSERT, so a crash never loses progress and writing the
+    log costs the same for the first URL as for the ten-thousandth. Superseded rows (the same URL
+    recorded again on a later crawl) are dropped by compact(), which runs every compact_every
+    records and on close.
+    """
+
+    def __init__(self, journal_file="crawl_journal.db", compact_every=1000):
+        self.journal_file = journal_file
+        self.compact_every = compact_every
+        self.records_since_compaction = 0
+        self.conn = sqlite3.connect(journal_file)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            """CREATE TABLE IF NOT EXISTS crawl_log (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                url TEXT NOT NULL,
+                status TEXT NOT NULL,
+                crawled_at REAL NOT NULL,
+                content_hash TEXT
+            )"""
+        )
+        self.conn.commit()
+
+    def __len__(self):
+        return self.conn.execute("SELECT COUNT(DISTINCT url) FROM crawl_log").fetchone()[0]
+
+    def load(self):
+        """Returns the set of every URL in the journal."""
+        return {url for (url,) in self.conn.execute("SELECT url FROM crawl_log")}
+
+    def latest(self, url):
+        """Returns the latest (status, crawled_at, content_hash) recorded for a URL, or None."""
+        return self.conn.execute(
+            "SELECT status, crawled_at, content_hash FROM crawl_log WHERE url = ? ORDER BY id DESC LIMIT 1", (url,)
+        ).fetchone()
+
+    def record(self, url, status="scraped", content_hash=None):
+        """Appends a record for a URL."""
+        self.conn.execute(
+            "INSERT INTO crawl_log (url, status, crawled_at, content_hash) VALUES (?, ?, ?, ?)",
+            (url, status, time.time(), content_hash),
+        )
+        self.conn.commit()
+        self.records_since_compaction += 1
+        if self.records_since_compaction >= self.compact_every:
+            self.compact()
+
+    def import_urls(self, urls, status="scraped"):
+        """Bulk-appends URLs, e.g. when migrating from the old scraped_urls.json."""
+        now = time.time()
+        self.conn.executemany(
+            "INSERT INTO crawl_log (url, status, crawled_at) VALUES (?, ?, ?)", ((url, status, now) for url in urls)
+        )
+        self.conn.commit()
+
+    def forget(self, urls):
+        """Removes every record of URLs, so they count as never crawled."""
+        self.conn.executemany("DELETE FROM crawl_log WHERE url = ?", ((url,) for url in urls))
+        self.conn.commit()
+
+    def compact(self):
+        """Drops every record that has been superseded by a newer one for the same URL."""
+        self.conn.execute("DELETE FROM crawl_log WHERE id NOT IN (SELECT MAX(id) FROM crawl_log GROUP BY url)")
+        self.conn.commit()
+        self.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        self.records_since_compaction = 0
+
+    def reset(self):
+        """Removes every record."""
+        self.conn.execute("DELETE FROM crawl_log")
+        self.conn.commit()
+        self.records_since_compaction = 0
+
+    def close(self):
+        self.compact()
+        self.conn.close()
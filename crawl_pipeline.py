@@ -0,0 +1,181 @@
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+_DONE = object()  # end-of-stream marker passed down the queues
+
+_worker_parsers = {}  # parser name -> PageParser, cached per worker process
+
+
+def _extract_page(html, url, kind, parser_name):
+    """Runs in a worker process: parses a content page and returns (extracted text or None, title or None, seconds spent)."""
+    # imported here so worker processes only load scrape_hp once they run a page, and to avoid a circular import
+    from html_parsers import get_parser
+    from scrape_hp import extract_text, extract_title
+    start = time.perf_counter()
+    if parser_name not in _worker_parsers:
+        _worker_parsers[parser_name] = get_parser(parser_name)
+    is_article = kind == "article"
+    soup = _worker_parsers[parser_name].parse_content(html, is_article=is_article)
+    text = extract_text(soup, url, is_article=is_article)
+    return text, extract_title(soup), time.perf_counter() - start
+
+
+class StageStats:
+    """Item count, busy time and output queue depth of one pipeline stage, accumulated across runs."""
+
+    def __init__(self, name):
+        self.name = name
+        self.items = 0
+        self.busy = 0.0
+        self.depth_total = 0
+        self.depth_samples = 0
+        self.max_depth = 0
+
+    def record(self, busy_seconds=0.0):
+        self.items += 1
+        self.busy += busy_seconds
+
+    def sample_depth(self, depth):
+        self.depth_total += depth
+        self.depth_samples += 1
+        self.max_depth = max(self.max_depth, depth)
+
+    def summary(self, elapsed, queue_size=None):
+        rate = self.items / elapsed if elapsed else 0.0
+        avg_depth = self.depth_total / self.depth_samples if self.depth_samples else 0.0
+        depth = f"{avg_depth:.1f}/{self.max_depth}" + (f" of {queue_size}" if queue_size else "")
+        return f"{self.name:<10}{self.items:>8}{rate:>12.1f}{self.busy:>12.1f}   {depth}"
+
+
+class CrawlPipeline:
+    """Crawls content pages as three stages connected by bounded queues.
+
+    fetch:   the async fetcher downloads pages and puts them on the parse queue; when that queue is
+             full the fetch workers block, so downloads never run far ahead of extraction.
+    extract: a dispatcher thread feeds a process pool (one worker per core by default) that parses
+             and extracts each page, and puts results on the write queue in submission order.
+    write:   the calling thread takes results off the write queue and hands them to a sink, so
+             everything that touches crawl state (journal, archive, store_callback) stays on one thread.
+
+    Per-stage throughput and queue depths are accumulated across runs; see report().
+    """
+
+    def __init__(self, fetcher, workers=None, parser="html.parser", queue_size=None, validators=None):
+        self.fetcher = fetcher
+        self.workers = workers or os.cpu_count() or 1
+        self.parser = parser
+        self.queue_size = queue_size or self.workers * 4
+        self.validators = validators
+        self.executor = None
+        self.elapsed = 0.0
+        self.stats = {name: StageStats(name) for name in ("fetch", "extract", "write")}
+
+    def _fetch_stage(self, jobs, parse_queue, write_queue, failed):
+        kinds = dict(jobs)
+        headers_by_url = {url: self.validators.conditional_headers(url) for url in kinds} if self.validators else None
+
+        def on_page(url, result):
+            self.stats["fetch"].record()
+            if result is None:
+                failed.append(url)
+            elif self.validators and self.validators.check(url, result):
+                # unchanged pages skip extraction entirely
+                write_queue.put(("unchanged", url, kinds[url], None, None, None))
+            else:
+                parse_queue.put((url, kinds[url], result.text))
+                self.stats["fetch"].sample_depth(parse_queue.qsize())
+
+        try:
+            self.fetcher.fetch_each(list(kinds), on_page, headers_by_url)
+        finally:
+            parse_queue.put(_DONE)
+
+    def _extract_stage(self, parse_queue, write_queue):
+        if self.executor is None:
+            # by now the fetch and ingestion threads are running, and forking a multithreaded process can leave a
+            # child deadlocked on a lock another thread held (e.g. stdout's); workers come from a fresh forkserver instead
+            method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+            self.executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context(method))
+        in_flight = deque()
+
+        def drain_one():
+            url, kind, html, future = in_flight.popleft()
+            status = "ok"
+            try:
+                text, title, busy = future.result()
+            except Exception as e:
+                # unlike a page without a content section, this one is retried
+                print(f"Error extracting {url}: {e}")
+                status, text, title, busy = "error", None, None, 0.0
+            self.stats["extract"].record(busy)
+            write_queue.put((status, url, kind, html, text, title))
+            self.stats["extract"].sample_depth(write_queue.qsize())
+
+        try:
+            while True:
+                item = parse_queue.get()
+                if item is _DONE:
+                    break
+                url, kind, html = item
+                in_flight.append((url, kind, html, self.executor.submit(_extract_page, html, url, kind, self.parser)))
+                # keep every worker busy with one page queued behind it, but no more
+                if len(in_flight) >= self.workers * 2:
+                    drain_one()
+            while in_flight:
+                drain_one()
+        finally:
+            write_queue.put(_DONE)
+
+    def run(self, jobs, sink):
+        """Crawls jobs, a list of (url, kind), calling sink(status, url, kind, html, text, title) for each page on this thread.
+
+        status is "ok" (text is None if the page had no content section), "error" if extracting the page raised,
+        or "unchanged".
+        Returns the urls that could not be fetched, so the caller can retry them another way.
+        """
+        if not jobs:
+            return []
+        start = time.perf_counter()
+        parse_queue = queue.Queue(maxsize=self.queue_size)
+        write_queue = queue.Queue(maxsize=self.queue_size)
+        failed = []
+        fetch_thread = threading.Thread(target=self._fetch_stage, args=(jobs, parse_queue, write_queue, failed), daemon=True)
+        extract_thread = threading.Thread(target=self._extract_stage, args=(parse_queue, write_queue), daemon=True)
+        fetch_thread.start()
+        extract_thread.start()
+
+        while True:
+            item = write_queue.get()
+            if item is _DONE:
+                break
+            write_start = time.perf_counter()
+            sink(*item)
+            self.stats["write"].record(time.perf_counter() - write_start)
+            self.stats["write"].sample_depth(write_queue.qsize())
+
+        fetch_thread.join()
+        extract_thread.join()
+        elapsed = time.perf_counter() - start
+        self.elapsed += elapsed
+        print(f"Pipeline processed {len(jobs) - len(failed)} pages in {elapsed:.2f} seconds ({len(failed)} failed)")
+        return failed
+
+    def report(self):
+        """Returns a table of per-stage item counts, throughput, busy seconds and output queue depth (avg/max)."""
+        lines = [
+            f"Pipeline stages over {self.elapsed:.1f} seconds:",
+            f"{'stage':<10}{'items':>8}{'items/sec':>12}{'busy sec':>12}   queue avg/max",
+        ]
+        for name, stats in self.stats.items():
+            lines.append(stats.summary(self.elapsed, self.queue_size if name != "write" else None))
+        return "\n".join(lines)
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
@@ -0,0 +1,90 @@
+import os
+import time
+from langchain_core.embeddings import Embeddings
+
+# default model of the local backend; its repository on the Hugging Face hub ships an ONNX export
+DEFAULT_LOCAL_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+
+
+class OnnxEmbeddings(Embeddings):
+    """Sentence-transformers style embeddings computed on the CPU with onnxruntime, without torch.
+
+    The model's onnx/model.onnx and tokenizer.json are downloaded from the Hugging Face hub once and cached.
+    Texts are sorted by length and grouped into batches of at most max_batch_tokens padded tokens, so
+    short texts aren't padded to the longest one in the corpus. Token embeddings are mean-pooled and
+    L2-normalized. threads sets onnxruntime's intra-op thread count (0 lets it decide); warmup runs one
+    inference up front so the first real query doesn't pay for session initialization.
+    """
+
+    def __init__(self, model_name=DEFAULT_LOCAL_MODEL, threads=0, max_length=256, max_batch_tokens=16384, warmup=True):
+        # imported here so the OpenAI backend doesn't need onnxruntime installed
+        import onnxruntime
+        from huggingface_hub import hf_hub_download
+        from tokenizers import Tokenizer
+
+        self.model = model_name
+        self.max_length = max_length
+        self.max_batch_tokens = max_batch_tokens
+        self.tokenizer = Tokenizer.from_file(hf_hub_download(model_name, "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=max_length)
+        self.tokenizer.enable_padding()
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = threads
+        self.session = onnxruntime.InferenceSession(hf_hub_download(model_name, "onnx/model.onnx"), options, providers=["CPUExecutionProvider"])
+        self.input_names = {model_input.name for model_input in self.session.get_inputs()}
+        if warmup:
+            start = time.perf_counter()
+            self.embed_query("warm up")
+            print(f"Warmed up {model_name} in {time.perf_counter() - start:.2f} seconds")
+
+    def _embed_batch(self, texts):
+        import numpy as np
+        encodings = self.tokenizer.encode_batch(texts)
+        input_ids = np.array([encoding.ids for encoding in encodings], dtype=np.int64)
+        attention_mask = np.array([encoding.attention_mask for encoding in encodings], dtype=np.int64)
+        inputs = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if "token_type_ids" in self.input_names:
+            inputs["token_type_ids"] = np.zeros_like(input_ids)
+        token_embeddings = self.session.run(None, inputs)[0]
+        mask = attention_mask[:, :, None].astype(np.float32)
+        pooled = (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        return pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+
+    def embed_documents(self, texts):
+        if not texts:
+            return []
+        # approximate token counts are enough to group similar lengths together
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        vectors = [None] * len(texts)
+        batch = []
+        for i in order:
+            longest = min(self.max_length, len(texts[i]) // 3 + 2)
+            if batch and longest * (len(batch) + 1) > self.max_batch_tokens:
+                for j, vector in zip(batch, self._embed_batch([texts[j] for j in batch])):
+                    vectors[j] = vector.tolist()
+                batch = []
+            batch.append(i)
+        for j, vector in zip(batch, self._embed_batch([texts[j] for j in batch])):
+            vectors[j] = vector.tolist()
+        return vectors
+
+    def embed_query(self, text):
+        return self._embed_batch([text])[0].tolist()
+
+
+def get_embeddings(backend=None):
+    """Returns the embedding model selected by backend, or by the EMBEDDING_BACKEND environment variable.
+
+    "openai" (default) uses OpenAIEmbeddings; "local" uses OnnxEmbeddings with the model in
+    LOCAL_EMBEDDING_MODEL and EMBEDDING_THREADS onnxruntime threads.
+    """
+    backend = backend or os.environ.get("EMBEDDING_BACKEND", "openai")
+    if backend == "openai":
+        from langchain_openai import OpenAIEmbeddings
+        return OpenAIEmbeddings()
+    if backend == "local":
+        return OnnxEmbeddings(
+            model_name=os.environ.get("LOCAL_EMBEDDING_MODEL", DEFAULT_LOCAL_MODEL),
+            threads=int(os.environ.get("EMBEDDING_THREADS", "0")),
+        )
+    raise ValueError(f"Unknown embedding backend: {backend}")
@@ -0,0 +1,141 @@
+import sqlite3
+import threading
+import time
+from array import array
+from langchain_core.embeddings import Embeddings
+from page_validators import content_hash
+
+EMBEDDING_CACHE_PATH = "embedding_cache.db"
+
+
+class EmbeddingCache:
+    """On-disk cache of embedding vectors keyed by model name and a hash of the embedded text.
+
+    Vectors are stored as float32 blobs in SQLite. Once the stored vectors exceed max_bytes, the least
+    recently used ones are evicted down to 90% of it. Safe to share between threads.
+    """
+
+    def __init__(self, cache_file=EMBEDDING_CACHE_PATH, max_bytes=1024 * 1024 * 1024):
+        self.cache_file = cache_file
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(cache_file, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            """CREATE TABLE IF NOT EXISTS embeddings (
+                key TEXT PRIMARY KEY,
+                vector BLOB NOT NULL,
+                last_used REAL NOT NULL
+            )"""
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+        self.conn.commit()
+        self.total_bytes = self.conn.execute("SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings").fetchone()[0]
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+
+    @staticmethod
+    def key(model, text):
+        return f"{model}:{content_hash(text)}"
+
+    def get_many(self, keys):
+        """Returns the cached vector (a list of floats) for each key, or None where there is none."""
+        found = {}
+        with self.lock:
+            # SQLite limits the number of bound parameters, so look keys up in slices
+            for start in range(0, len(keys), 500):
+                part = keys[start:start + 500]
+                rows = self.conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(part))})", part
+                ).fetchall()
+                found.update(rows)
+            if found:
+                now = time.time()
+                self.conn.executemany("UPDATE embeddings SET last_used = ? WHERE key = ?", [(now, key) for key in found])
+                self.conn.commit()
+            self.hits += sum(1 for key in keys if key in found)
+            self.misses += sum(1 for key in keys if key not in found)
+        return [array("f", found[key]).tolist() if key in found else None for key in keys]
+
+    def put_many(self, keys, vectors):
+        now = time.time()
+        rows = [(key, array("f", vector).tobytes(), now) for key, vector in zip(keys, vectors)]
+        with self.lock:
+            for key, blob, _ in rows:
+                old = self.conn.execute("SELECT LENGTH(vector) FROM embeddings WHERE key = ?", (key,)).fetchone()
+                self.total_bytes += len(blob) - (old[0] if old else 0)
+            self.conn.executemany("INSERT OR REPLACE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)", rows)
+            self.conn.commit()
+            if self.total_bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        target = self.max_bytes * 0.9
+        while self.total_bytes > target:
+            rows = self.conn.execute("SELECT key, LENGTH(vector) FROM embeddings ORDER BY last_used LIMIT 1000").fetchall()
+            if not rows:
+                break
+            removed = []
+            for key, size in rows:
+                if self.total_bytes <= target:
+                    break
+                removed.append((key,))
+                self.total_bytes -= size
+            self.conn.executemany("DELETE FROM embeddings WHERE key = ?", removed)
+            self.evicted += len(removed)
+        self.conn.commit()
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "evicted": self.evicted,
+                "size_mib": round(self.total_bytes / (1024 * 1024), 1),
+            }
+
+    def report(self):
+        return "Embedding cache: " + ", ".join(f"{key}={value}" for key, value in self.stats().items())
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+class CachedEmbeddings(Embeddings):
+    """Wraps an Embeddings model so every text is only ever embedded once per model.
+
+    Documents and queries are cached separately, since some models embed them differently.
+    """
+
+    def __init__(self, embeddings, cache=None, model_name=None):
+        self.embeddings = embeddings
+        self.cache = cache or EmbeddingCache()
+        self.model_name = model_name or getattr(embeddings, "model", None) or getattr(embeddings, "model_name", None) or type(embeddings).__name__
+
+    def embed_documents(self, texts):
+        keys = [EmbeddingCache.key(f"{self.model_name}:doc", text) for text in texts]
+        vectors = self.cache.get_many(keys)
+        # each distinct missing text is embedded once, even if it occurs several times in texts
+        missing = {}
+        for i, vector in enumerate(vectors):
+            if vector is None:
+                missing.setdefault(keys[i], texts[i])
+        if missing:
+            embedded = self.embeddings.embed_documents(list(missing.values()))
+            self.cache.put_many(list(missing), embedded)
+            by_key = dict(zip(missing, embedded))
+            vectors = [vector if vector is not None else by_key[key] for key, vector in zip(keys, vectors)]
+        return vectors
+
+    def embed_query(self, text):
+        key = EmbeddingCache.key(f"{self.model_name}:query", text)
+        vector = self.cache.get_many([key])[0]
+        if vector is None:
+            vector = self.embeddings.embed_query(text)
+            self.cache.put_many([key], [vector])
+        return vector
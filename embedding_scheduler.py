@@ -0,0 +1,113 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import tiktoken
+from langchain_core.embeddings import Embeddings
+from request_policy import RequestPolicy, TokenBucket
+
+# key for the request policy's per-host rate limit and circuit breaker
+EMBEDDINGS_ENDPOINT = "https://api.openai.com/v1/embeddings"
+
+
+class ScheduledEmbeddings(Embeddings):
+    """Embeds large lists of texts as several token-bounded requests running concurrently.
+
+    embed_documents packs texts into requests of at most max_tokens_per_request tokens (counted with
+    tiktoken) and max_texts_per_request texts, and sends up to concurrency of them at a time under a
+    requests/sec limit and an optional tokens/minute limit. A request that fails is retried on its own
+    with backoff, so one rate-limited sub-batch doesn't re-send the others.
+    """
+
+    def __init__(self, embeddings, max_tokens_per_request=100_000, max_texts_per_request=1000, concurrency=4,
+                 requests_per_second=5.0, tokens_per_minute=None, max_retries=5, model_name=None):
+        self.embeddings = embeddings
+        self.max_tokens_per_request = max_tokens_per_request
+        self.max_texts_per_request = max_texts_per_request
+        self.concurrency = concurrency
+        self.policy = RequestPolicy(rate=requests_per_second, burst=concurrency, max_retries=max_retries)
+        self.token_bucket = TokenBucket(tokens_per_minute / 60, tokens_per_minute) if tokens_per_minute else None
+        # exposed like the wrapped model's, so caches keyed by model name see through the scheduler
+        self.model = model_name or getattr(embeddings, "model", None)
+        try:
+            self.encoding = tiktoken.encoding_for_model(self.model)
+        except (KeyError, TypeError):
+            self.encoding = tiktoken.get_encoding("cl100k_base")
+        self.executor = ThreadPoolExecutor(max_workers=concurrency)
+        self.lock = threading.Lock()
+        self.texts = 0
+        self.tokens = 0
+        self.requests = 0
+        self.busy_seconds = 0.0
+
+    def pack(self, texts):
+        """Groups text indexes into requests, in order. Returns a list of (indexes, token count)."""
+        requests = []
+        indexes, tokens = [], 0
+        counts = [len(encoded) for encoded in self.encoding.encode_batch(texts, disallowed_special=())]
+        for i, count in enumerate(counts):
+            if indexes and (tokens + count > self.max_tokens_per_request or len(indexes) >= self.max_texts_per_request):
+                requests.append((indexes, tokens))
+                indexes, tokens = [], 0
+            indexes.append(i)
+            tokens += count
+        if indexes:
+            requests.append((indexes, tokens))
+        return requests
+
+    def _embed_request(self, texts, tokens):
+        for attempt in range(self.policy.max_retries + 1):
+            self.policy.wait_for_breaker(EMBEDDINGS_ENDPOINT)
+            delay = self.policy.wait_before_request(EMBEDDINGS_ENDPOINT)
+            if self.token_bucket:
+                delay = max(delay, self.token_bucket.reserve(tokens))
+            time.sleep(delay)
+            try:
+                vectors = self.embeddings.embed_documents(texts)
+            except Exception as e:
+                self.policy.record_failure(EMBEDDINGS_ENDPOINT)
+                if attempt == self.policy.max_retries:
+                    raise
+                delay = self.policy.backoff(attempt)
+                print(f"Embedding request of {len(texts)} texts failed: {e}. Retrying in {delay:.1f} seconds...")
+                time.sleep(delay)
+                continue
+            self.policy.record_success(EMBEDDINGS_ENDPOINT)
+            return vectors
+
+    def embed_documents(self, texts):
+        if not texts:
+            return []
+        start = time.perf_counter()
+        requests = self.pack(texts)
+        futures = [self.executor.submit(self._embed_request, [texts[i] for i in indexes], tokens) for indexes, tokens in requests]
+        vectors = [None] * len(texts)
+        for (indexes, _), future in zip(requests, futures):
+            for i, vector in zip(indexes, future.result()):
+                vectors[i] = vector
+        with self.lock:
+            self.texts += len(texts)
+            self.tokens += sum(tokens for _, tokens in requests)
+            self.requests += len(requests)
+            self.busy_seconds += time.perf_counter() - start
+        return vectors
+
+    def embed_query(self, text):
+        return self.embeddings.embed_query(text)
+
+    def stats(self):
+        with self.lock:
+            busy = self.busy_seconds
+            return {
+                "chunks": self.texts,
+                "tokens": self.tokens,
+                "requests": self.requests,
+                "retries": self.policy.stats()["retries"],
+                "chunks_per_sec": round(self.texts / busy, 1) if busy else 0.0,
+                "tokens_per_sec": round(self.tokens / busy, 1) if busy else 0.0,
+            }
+
+    def report(self):
+        return "Embedding: " + ", ".join(f"{key}={value}" for key, value in self.stats().items())
+
+    def close(self):
+        self.executor.shutdown()
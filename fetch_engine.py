@@ -0,0 +1,106 @@
+import asyncio
+from collections import namedtuple
+import aiohttp
+from request_policy import RequestPolicy, RETRYABLE_STATUSES
+
+# status, body and validator headers of a fetched page
+FetchResult = namedtuple("FetchResult", ["status", "text", "etag", "last_modified"])
+
+
+class AsyncFetcher:
+    """Downloads many pages concurrently with aiohttp, capping the number of in-flight requests per host.
+
+    A single keep-alive ClientSession and event loop are reused across fetch_all calls, so connections
+    stay pooled for the whole crawl. Rate limiting and retries follow the given RequestPolicy, which
+    can be shared with synchronous requests. If rewrite_url is given, each request is sent to
+    rewrite_url(url) while results stay keyed by the original url. Call close() when done.
+    """
+
+    def __init__(self, headers=None, per_host_limit=8, total_limit=64, timeout=30, policy=None, keepalive_timeout=60, rewrite_url=None):
+        self.headers = headers or {}
+        self.per_host_limit = per_host_limit
+        self.total_limit = total_limit
+        self.timeout = timeout
+        self.policy = policy or RequestPolicy()
+        self.keepalive_timeout = keepalive_timeout
+        self.rewrite_url = rewrite_url
+        self._loop = None
+        self._session = None
+
+    def _get_session(self):
+        """Returns the shared ClientSession, creating it on first use. Must be called from inside the loop."""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.total_limit,
+                limit_per_host=self.per_host_limit,
+                keepalive_timeout=self.keepalive_timeout,
+            )
+            timeout = aiohttp.ClientTimeout(total=self.timeout)
+            self._session = aiohttp.ClientSession(headers=self.headers, connector=connector, timeout=timeout)
+        return self._session
+
+    async def _fetch(self, session, url, headers=None):
+        """Fetches a single page under the request policy. Returns (url, FetchResult), or (url, None) if it kept failing."""
+        request_url = self.rewrite_url(url) if self.rewrite_url else url
+        try:
+            status, text, response_headers = await self.policy.get_async(session, request_url, headers)
+        except (aiohttp.ClientError, asyncio.TimeoutError, ConnectionResetError) as e:
+            print(f"Giving up on {url}: {e}")
+            return url, None
+        if status in RETRYABLE_STATUSES:
+            print(f"Giving up on {url}: status {status}")
+            return url, None
+        return url, FetchResult(status, text, response_headers.get("ETag"), response_headers.get("Last-Modified"))
+
+    async def _fetch_all(self, urls, headers_by_url):
+        session = self._get_session()
+        results = await asyncio.gather(*(self._fetch(session, url, headers_by_url.get(url)) for url in urls))
+        return {url: result for url, result in results if result is not None}
+
+    def fetch_all(self, urls, headers_by_url=None):
+        """Fetches all urls concurrently and returns a dict of url -> FetchResult. Pages that keep failing are left out.
+
+        headers_by_url optionally maps a url to extra request headers, e.g. conditional request validators.
+        """
+        urls = list(dict.fromkeys(urls))
+        if not urls:
+            return {}
+        if self._loop is None:
+            self._loop = asyncio.new_event_loop()
+        return self._loop.run_until_complete(self._fetch_all(urls, headers_by_url or {}))
+
+    async def _fetch_each(self, urls, callback, headers_by_url, workers):
+        session = self._get_session()
+        loop = asyncio.get_running_loop()
+        pending = iter(urls)
+
+        async def worker():
+            for url in pending:
+                url, result = await self._fetch(session, url, headers_by_url.get(url))
+                # the callback may block (e.g. on a full queue), so run it off the loop; this worker
+                # stops fetching until it returns, which is what gives the caller backpressure
+                await loop.run_in_executor(None, callback, url, result)
+
+        await asyncio.gather(*(worker() for _ in range(workers)))
+
+    def fetch_each(self, urls, callback, headers_by_url=None, workers=None):
+        """Fetches urls concurrently and calls callback(url, FetchResult or None) as each one completes.
+
+        At most `workers` pages (default total_limit) are in flight or waiting on the callback at a time.
+        """
+        urls = list(dict.fromkeys(urls))
+        if not urls:
+            return
+        if self._loop is None:
+            self._loop = asyncio.new_event_loop()
+        self._loop.run_until_complete(self._fetch_each(urls, callback, headers_by_url or {}, workers or self.total_limit))
+
+    def close(self):
+        """Closes the pooled session and its event loop."""
+        if self._loop is None:
+            return
+        if self._session is not None and not self._session.closed:
+            self._loop.run_until_complete(self._session.close())
+        self._loop.close()
+        self._loop = None
+        self._session = None
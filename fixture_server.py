@@ -0,0 +1,149 @@
+import random
+import socket
+import struct
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from crawl_frontier import normalize_url
+from html_archive import HtmlArchive
+
+SITE_URL = "https://www.hp-lexicon.org"
+
+
+class FixtureServer:
+    """Local stand-in for hp-lexicon.org that replays pages from an HtmlArchive.
+
+    A request for /some/path?letter=A is answered with the archived page of SITE_URL/some/path?letter=A
+    (404 if it was never captured). Every response is delayed by latency seconds plus up to jitter
+    seconds; a fraction error_rate of requests get a 503 and a fraction reset_rate have their connection
+    reset without a response. Pages carry their content hash as ETag, so conditional requests get 304s.
+    The server runs on a background thread; use it as a context manager or call start() and stop().
+    """
+
+    def __init__(self, archive_dir, latency=0.0, jitter=0.0, error_rate=0.0, reset_rate=0.0, seed=0, port=0):
+        self.archive_dir = archive_dir
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.reset_rate = reset_rate
+        self.random = random.Random(seed)
+        self.port = port
+        self.lock = threading.Lock()
+        self.counts = {"requests": 0, "ok": 0, "not_modified": 0, "not_found": 0, "errors": 0, "resets": 0}
+        self.bytes_sent = 0
+        self.pages = {}  # normalized url -> (content hash, archived url)
+        self.httpd = None
+        self.thread = None
+
+    @staticmethod
+    def _key(url):
+        return normalize_url(url, keep_params=("letter",))
+
+    def _load_index(self):
+        # only the index is loaded up front; page bodies are read from the archive per request
+        archive = HtmlArchive(self.archive_dir)
+        rows = archive.conn.execute("SELECT url, content_hash FROM pages").fetchall()
+        archive.close()
+        self.pages = {self._key(url): (digest, url) for url, digest in rows}
+        print(f"Serving {len(self.pages)} archived pages from {self.archive_dir}")
+
+    def _count(self, name, size=0):
+        with self.lock:
+            self.counts[name] += 1
+            self.bytes_sent += size
+
+    def _roll(self, rate):
+        with self.lock:
+            return self.random.random() < rate
+
+    def _delay(self):
+        with self.lock:
+            extra = self.random.uniform(0, self.jitter) if self.jitter else 0.0
+        return self.latency + extra
+
+    def _make_handler(self):
+        server = self
+        local = threading.local()
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive, so pooled clients reuse connections
+
+            def log_message(self, format, *args):
+                pass
+
+            def _archive(self):
+                # SQLite connections can't be shared across threads, so each handler thread opens its own
+                if not hasattr(local, "archive"):
+                    local.archive = HtmlArchive(server.archive_dir)
+                return local.archive
+
+            def _send(self, status, body=b"", headers=None):
+                self.send_response(status)
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                server._count("requests")
+                time.sleep(server._delay())
+                if server._roll(server.reset_rate):
+                    # SO_LINGER with a zero timeout makes close() send a RST instead of a FIN
+                    self.connection.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack("ii", 1, 0))
+                    self.close_connection = True
+                    self.connection.close()
+                    server._count("resets")
+                    return
+                if server._roll(server.error_rate):
+                    server._count("errors")
+                    self._send(503, b"Service Unavailable")
+                    return
+                entry = server.pages.get(server._key(SITE_URL + self.path))
+                if entry is None:
+                    server._count("not_found")
+                    self._send(404, b"Not Found")
+                    return
+                digest, url = entry
+                etag = f'"{digest}"'
+                if self.headers.get("If-None-Match") == etag:
+                    server._count("not_modified")
+                    self._send(304, headers={"ETag": etag})
+                    return
+                body = self._archive().read_blob(digest).encode("utf-8")
+                server._count("ok", len(body))
+                self._send(200, body, {"Content-Type": "text/html; charset=utf-8", "ETag": etag})
+
+        return Handler
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.httpd.server_address[1]}"
+
+    def start(self):
+        """Starts serving on a background thread and returns the server's base URL."""
+        self._load_index()
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", self.port), self._make_handler())
+        self.httpd.daemon_threads = True
+        # resets and clients hanging up are part of the test, not errors worth a traceback
+        self.httpd.handle_error = lambda request, client_address: None
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self.url
+
+    def stop(self):
+        if self.httpd is not None:
+            self.httpd.shutdown()
+            self.httpd.server_close()
+            self.httpd = None
+
+    def stats(self):
+        with self.lock:
+            return dict(self.counts, bytes_sent=self.bytes_sent)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -0,0 +1,89 @@
+import gzip
+import os
+import sqlite3
+import time
+from page_validators import content_hash
+
+# a page archived under several kinds keeps the most specific one, e.g. a character page that is
+# also parsed as a listing stays a "page"
+KIND_RANK = {"listing": 0, "timeline": 1, "page": 2, "article": 2, "quotes": 2, "timeline_index": 2}
+
+
+class HtmlArchive:
+    """Compressed, content-addressed local store of fetched HTML.
+
+    Each page body is gzipped into objects/<first two hash chars>/<sha256>.html.gz, so identical
+    pages are only stored once. An SQLite index maps every URL to the hash of its latest body and
+    to the kind of page it is ("page", "article", "quotes", "timeline" for an event page, "timeline_index"
+    for a timeline listing its events, or "listing"), which is what re-extraction needs to know to process it again.
+    """
+
+    def __init__(self, archive_dir="html_archive"):
+        self.archive_dir = archive_dir
+        self.objects_dir = os.path.join(archive_dir, "objects")
+        os.makedirs(self.objects_dir, exist_ok=True)
+        self.conn = sqlite3.connect(os.path.join(archive_dir, "index.db"))
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            """CREATE TABLE IF NOT EXISTS pages (
+                url TEXT PRIMARY KEY,
+                content_hash TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                fetched_at REAL NOT NULL
+            )"""
+        )
+        self.conn.commit()
+
+    def __len__(self):
+        return self.conn.execute("SELECT COUNT(*) FROM pages").fetchone()[0]
+
+    def _blob_path(self, digest):
+        return os.path.join(self.objects_dir, digest[:2], f"{digest}.html.gz")
+
+    def put(self, url, html, kind="page"):
+        """Stores the HTML of a URL and returns its content hash. A less specific kind never overrides a more specific one."""
+        digest = content_hash(html)
+        path = self._blob_path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(gzip.compress(html.encode("utf-8"), compresslevel=6))
+            os.replace(tmp_path, path)
+        row = self.conn.execute("SELECT kind FROM pages WHERE url = ?", (url,)).fetchone()
+        if row and KIND_RANK.get(row[0], 0) > KIND_RANK.get(kind, 0):
+            kind = row[0]
+        self.conn.execute(
+            "INSERT OR REPLACE INTO pages (url, content_hash, kind, fetched_at) VALUES (?, ?, ?, ?)",
+            (url, digest, kind, time.time()),
+        )
+        self.conn.commit()
+        return digest
+
+    def read_blob(self, digest):
+        """Returns the HTML stored under a content hash."""
+        with open(self._blob_path(digest), "rb") as f:
+            return gzip.decompress(f.read()).decode("utf-8")
+
+    def get(self, url):
+        """Returns the latest archived HTML for a URL, or None if it was never archived."""
+        row = self.conn.execute("SELECT content_hash FROM pages WHERE url = ?", (url,)).fetchone()
+        if not row:
+            return None
+        return self.read_blob(row[0])
+
+    def urls(self, kinds=None):
+        """Returns a list of (url, kind) for every archived page, optionally limited to some kinds."""
+        rows = self.conn.execute("SELECT url, kind FROM pages ORDER BY url").fetchall()
+        return [(url, kind) for url, kind in rows if kinds is None or kind in kinds]
+
+    def iter_pages(self, kinds=None):
+        """Yields (url, kind, html) for every archived page, optionally limited to some kinds."""
+        rows = self.conn.execute("SELECT url, kind, content_hash FROM pages ORDER BY url").fetchall()
+        for url, kind, digest in rows:
+            if kinds is None or kind in kinds:
+                yield url, kind, self.read_blob(digest)
+
+    def close(self):
+        self.conn.close()
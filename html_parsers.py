@@ -0,0 +1,57 @@
+from bs4 import BeautifulSoup, SoupStrainer
+
+# the only elements extract_text reads from a content page
+CONTENT_TAGS = ["article", "h1"]
+
+
+class PageParser:
+    """Builds BeautifulSoup trees with a configurable tree builder.
+
+    With subtree=True, content pages are parsed through a SoupStrainer that only builds <article>
+    and <h1> elements, so the navbar, sidebars, scripts and footer are never turned into Python
+    objects. Listing pages and article pages (whose opening paragraph lives outside <article>) are
+    always parsed in full.
+    """
+
+    def __init__(self, features="html.parser", subtree=False):
+        self.features = features
+        self.subtree = subtree
+
+    def parse(self, html):
+        """Parses a whole page."""
+        return BeautifulSoup(html, self.features)
+
+    def parse_content(self, html, is_article=False):
+        """Parses a content page, restricted to the subtree extract_text needs if subtree parsing is on."""
+        if self.subtree and not is_article:
+            return BeautifulSoup(html, self.features, parse_only=SoupStrainer(CONTENT_TAGS))
+        return self.parse(html)
+
+
+# name -> (tree builder, subtree parsing)
+PARSERS = {
+    "html.parser": ("html.parser", False),
+    "lxml": ("lxml", False),
+    "lxml-subtree": ("lxml", True),
+}
+
+
+def get_parser(name="html.parser"):
+    """Returns the PageParser registered under name."""
+    if name not in PARSERS:
+        raise ValueError(f"Unknown parser '{name}', expected one of: {', '.join(PARSERS)}")
+    features, subtree = PARSERS[name]
+    return PageParser(features, subtree=subtree)
+
+
+def find_content_section(soup):
+    """Returns the page's main <section> (html > body > article > section), or None."""
+    section = soup.select_one('html > body > article > section')
+    if section:
+        return section
+    # strained soups have no html/body, the page article sits at the top level
+    for article in soup.find_all("article", recursive=False):
+        section = article.find("section", recursive=False)
+        if section:
+            return section
+    return None
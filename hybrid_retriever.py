@@ -0,0 +1,62 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, List, Optional
+from langchain_core.retrievers import BaseRetriever
+
+# the constant EnsembleRetriever uses; larger values flatten the difference between top and lower ranks
+RRF_C = 60
+
+# shared by every HybridRetriever, so a query doesn't pay for starting threads
+_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="retriever")
+
+
+def reciprocal_rank_fusion(result_lists, weights=None, c=RRF_C, k=None):
+    """Fuses ranked lists of Documents into one, scoring each chunk by the sum of weight / (rank + c) over the lists.
+
+    A chunk returned by several lists is one result, matched by Document.id or, failing that, by identical
+    text, so overlapping chunks reach the prompt once. Returns at most k documents (all of them if k is None).
+    """
+    weights = weights or [1.0] * len(result_lists)
+    keys = {}  # document id or text -> fused key
+    scores = {}
+    documents = {}
+    for documents_list, weight in zip(result_lists, weights):
+        for rank, document in enumerate(documents_list, start=1):
+            key = keys.get(document.id) if document.id else None
+            if key is None:
+                key = keys.get(document.page_content, len(documents))
+            if document.id:
+                keys[document.id] = key
+            keys[document.page_content] = key
+            documents.setdefault(key, document)
+            scores[key] = scores.get(key, 0.0) + weight / (rank + c)
+    ranked = sorted(scores, key=lambda key: scores[key], reverse=True)
+    return [documents[key] for key in ranked[:k]]
+
+
+class HybridRetriever(BaseRetriever):
+    """Runs several retrievers concurrently and fuses their results with weighted reciprocal rank fusion.
+
+    Unlike EnsembleRetriever's sync path, the dense and sparse legs run at the same time on a thread pool,
+    so retrieval takes as long as the slowest leg rather than their sum. ainvoke awaits the legs' own async
+    paths together and never blocks the event loop.
+    """
+
+    retrievers: List[Any]
+    weights: Optional[List[float]] = None
+    c: int = RRF_C
+    k: Optional[int] = None
+
+    def _get_relevant_documents(self, query, *, run_manager):
+        futures = [
+            _pool.submit(retriever.invoke, query, config={"callbacks": run_manager.get_child(tag=f"retriever_{i + 1}")})
+            for i, retriever in enumerate(self.retrievers)
+        ]
+        return reciprocal_rank_fusion([future.result() for future in futures], self.weights, self.c, self.k)
+
+    async def _aget_relevant_documents(self, query, *, run_manager):
+        results = await asyncio.gather(*[
+            retriever.ainvoke(query, config={"callbacks": run_manager.get_child(tag=f"retriever_{i + 1}")})
+            for i, retriever in enumerate(self.retrievers)
+        ])
+        return reciprocal_rank_fusion(results, self.weights, self.c, self.k)
@@ -0,0 +1,60 @@
+import os
+import shutil
+import time
+
+# names the version directory of an index that is current; replaced atomically with os.replace
+POINTER_FILE = "CURRENT"
+
+
+def current_version(path):
+    """Returns the directory holding the current version of the index saved at path.
+
+    Indexes saved before versioning keep their files in path itself.
+    """
+    try:
+        with open(os.path.join(path, POINTER_FILE)) as f:
+            return os.path.join(path, f.read().strip())
+    except FileNotFoundError:
+        return path
+
+
+def new_version(path):
+    """Creates and returns an empty version directory under path, to write a new version of the index into."""
+    version = os.path.join(path, f"v{time.time_ns()}-{os.getpid()}")
+    os.makedirs(version)
+    return version
+
+
+def publish(path, version):
+    """Makes version the current version of the index at path, then deletes every other version.
+
+    Readers see either the old version or the new one, never a partly written or missing index. A crash
+    before the pointer is replaced leaves the old version current, and the next publish deletes the leftover.
+    """
+    tmp_pointer = os.path.join(path, f"{POINTER_FILE}.tmp")
+    with open(tmp_pointer, "w") as f:
+        f.write(os.path.basename(version))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_pointer, os.path.join(path, POINTER_FILE))
+    for name in os.listdir(path):
+        old = os.path.join(path, name)
+        if name == POINTER_FILE or old == version:
+            continue
+        # other versions, and the files of an index saved before versioning
+        if os.path.isdir(old):
+            shutil.rmtree(old, ignore_errors=True)
+        else:
+            os.remove(old)
+
+
+def load_current(path, load):
+    """Returns load(directory of the current version of the index at path).
+
+    A save may delete the version between reading the pointer and opening its files, so that is retried once
+    with the version it published. Files already memory-mapped stay readable after they are deleted.
+    """
+    try:
+        return load(current_version(path))
+    except FileNotFoundError:
+        return load(current_version(path))
@@ -0,0 +1,96 @@
+import queue
+import threading
+import time
+
+_STOP = object()  # tells a worker to exit
+
+
+class IngestQueue:
+    """Runs document ingestion (chunk, embed, store) on background threads so the crawl never waits on it.
+
+    submit() puts a batch of documents on a bounded queue and returns immediately; when max_pending
+    batches are already waiting it blocks, so a crawl that outruns the embedding API slows down instead
+    of piling up documents in memory. close() waits for every submitted batch to be stored.
+    store(documents) must return the number of chunks it stored. The urls of documents in batches that
+    failed to store are collected in failed_urls.
+    """
+
+    def __init__(self, store, workers=1, max_pending=4):
+        self.store = store
+        self.queue = queue.Queue(maxsize=max_pending)
+        self.max_pending = max_pending
+        self.lock = threading.Lock()
+        self.batches = 0
+        self.documents = 0
+        self.chunks = 0
+        self.failed_batches = 0
+        self.failed_documents = 0
+        self.failed_urls = set()
+        self.latencies = []
+        self.depth_total = 0
+        self.depth_samples = 0
+        self.max_depth = 0
+        self.blocked_seconds = 0.0
+        self.threads = [threading.Thread(target=self._worker, daemon=True) for _ in range(workers)]
+        for thread in self.threads:
+            thread.start()
+
+    def _worker(self):
+        while True:
+            documents = self.queue.get()
+            if documents is _STOP:
+                return
+            start = time.perf_counter()
+            try:
+                chunks = self.store(documents)
+            except Exception as e:
+                print(f"Error storing {len(documents)} documents: {e}")
+                with self.lock:
+                    self.failed_batches += 1
+                    self.failed_documents += len(documents)
+                    self.failed_urls.update(document.metadata["url"] for document in documents if document.metadata.get("url"))
+                continue
+            with self.lock:
+                self.batches += 1
+                self.documents += len(documents)
+                self.chunks += chunks
+                self.latencies.append(time.perf_counter() - start)
+
+    def submit(self, documents):
+        """Queues a batch of documents for storing, blocking while max_pending batches are already waiting."""
+        if not documents:
+            return
+        start = time.perf_counter()
+        self.queue.put(documents)
+        with self.lock:
+            self.blocked_seconds += time.perf_counter() - start
+            depth = self.queue.qsize()
+            self.depth_total += depth
+            self.depth_samples += 1
+            self.max_depth = max(self.max_depth, depth)
+
+    def close(self):
+        """Waits until every submitted batch is stored, then stops the workers."""
+        for _ in self.threads:
+            self.queue.put(_STOP)
+        for thread in self.threads:
+            thread.join()
+
+    def stats(self):
+        with self.lock:
+            latencies = sorted(self.latencies)
+            return {
+                "batches": self.batches,
+                "documents": self.documents,
+                "chunks": self.chunks,
+                "failed_documents": self.failed_documents,
+                "avg_queue_depth": round(self.depth_total / self.depth_samples, 2) if self.depth_samples else 0.0,
+                "max_queue_depth": self.max_depth,
+                "crawl_blocked_seconds": round(self.blocked_seconds, 2),
+                "avg_store_seconds": round(sum(latencies) / len(latencies), 3) if latencies else 0.0,
+                "p50_store_seconds": round(latencies[len(latencies) // 2], 3) if latencies else 0.0,
+                "max_store_seconds": round(latencies[-1], 3) if latencies else 0.0,
+            }
+
+    def report(self):
+        return "Ingestion: " + ", ".join(f"{key}={value}" for key, value in self.stats().items())
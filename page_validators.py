@@ -0,0 +1,103 @@
+import hashlib
+import json
+import os
+import threading
+
+
+def content_hash(text):
+    """Returns a stable hash of page content."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class ValidatorStore:
+    """Persists ETag, Last-Modified and content hash per URL so unchanged pages can be skipped on a recrawl.
+
+    The validators of a changed page are kept pending until commit() is called once its document is stored;
+    a page that fails extraction or storing keeps its old validators, so it is fetched and stored again.
+    """
+
+    def __init__(self, validators_file="page_validators.json"):
+        self.validators_file = validators_file
+        self.validators = {}  # url -> {"etag": ..., "last_modified": ..., "content_hash": ...}
+        self.pending = {}  # url -> validators of a fetched page that is not stored yet
+        self.lock = threading.Lock()
+        self.unchanged = 0
+        self._load()
+
+    def _load(self):
+        """Load previously stored validators from file if it exists."""
+        if os.path.exists(self.validators_file):
+            try:
+                with open(self.validators_file, 'r') as f:
+                    self.validators = json.load(f)
+                print(f"Loaded validators for {len(self.validators)} pages")
+            except Exception as e:
+                print(f"Could not load page validators: {e}")
+                self.validators = {}
+
+    def save(self):
+        """Save committed validators to file for the next recrawl."""
+        try:
+            with self.lock:
+                validators = dict(self.validators)
+            with open(self.validators_file, 'w') as f:
+                json.dump(validators, f)
+        except Exception as e:
+            print(f"Could not save page validators: {e}")
+
+    def reset(self):
+        """Forget all validators so the next crawl downloads every page in full."""
+        self.validators = {}
+        self.pending = {}
+        if os.path.exists(self.validators_file):
+            os.remove(self.validators_file)
+
+    def forget(self, urls):
+        """Drops the validators of URLs, so the next crawl downloads and stores them again."""
+        with self.lock:
+            for url in urls:
+                self.validators.pop(url, None)
+                self.pending.pop(url, None)
+
+    def commit(self, url):
+        """Keeps the pending validators of a page whose document was stored."""
+        with self.lock:
+            if url in self.pending:
+                self.validators[url] = self.pending.pop(url)
+
+    def conditional_headers(self, url):
+        """Returns If-None-Match / If-Modified-Since headers for a URL seen before."""
+        entry = self.validators.get(url)
+        if not entry:
+            return {}
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def check(self, url, result):
+        """Returns True if the page of a FetchResult is unchanged since the last crawl.
+
+        The validators of a changed page are held pending until commit(url).
+        """
+        with self.lock:
+            entry = self.validators.get(url)
+            if result.status == 304 and entry:
+                self.unchanged += 1
+                return True
+            digest = content_hash(result.text)
+            unchanged = entry is not None and entry.get("content_hash") == digest
+            validators = {
+                "etag": result.etag,
+                "last_modified": result.last_modified,
+                "content_hash": digest,
+            }
+            if unchanged:
+                # the stored document already has this content, only the etag or date may be new
+                self.validators[url] = validators
+                self.unchanged += 1
+            else:
+                self.pending[url] = validators
+            return unchanged
@@ -0,0 +1,254 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_core.retrievers import BaseRetriever
+from query_text import sanitize_query
+
+# rewritten by store_db.py whenever it changes the collection; caches compare its modification time
+COLLECTION_VERSION_PATH = "collection_version.json"
+
+CACHE_SIZE = 1024
+# seconds a cached retrieval result or answer is served for, even if the collection doesn't change
+CACHE_TTL = 3600
+
+
+def write_collection_version(fingerprint, path=COLLECTION_VERSION_PATH):
+    """Records that the collection changed, which invalidates the retrieval and answer caches of running processes."""
+    # replaced in one step, so a process reading it never sees a partly written file
+    with open(f"{path}.tmp", "w") as f:
+        json.dump({"fingerprint": fingerprint, "updated": time.time()}, f)
+    os.replace(f"{path}.tmp", path)
+
+
+def read_collection_version(path=COLLECTION_VERSION_PATH):
+    """Returns the fingerprint store_db.py last recorded for the collection, or None if it never did."""
+    try:
+        with open(path) as f:
+            return json.load(f).get("fingerprint")
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+class LRUCache:
+    """Least recently used cache with an optional time to live, counting hits and misses."""
+
+    def __init__(self, maxsize=CACHE_SIZE, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.entries = OrderedDict()  # key -> (time stored, value)
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """Returns the value stored under key, or None if it is missing or expired."""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and self.ttl is not None and time.monotonic() - entry[0] > self.ttl:
+                del self.entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, value):
+        with self.lock:
+            self.entries[key] = (time.monotonic(), value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def values(self):
+        """Returns the values that haven't expired, without counting a lookup."""
+        now = time.monotonic()
+        with self.lock:
+            return [value for stored, value in self.entries.values() if self.ttl is None or now - stored <= self.ttl]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+class QueryCache:
+    """Caches of query embeddings, retrieval results and answers, keyed on the sanitized query.
+
+    Embeddings don't depend on the collection and are kept in a plain LRU. Retrieval results and answers
+    expire after ttl seconds and are dropped as soon as store_db.py rewrites the collection version file,
+    after which every callable in on_version_change is called, e.g. to reload indexes saved with the collection.
+    With semantic_threshold set, a question whose embedding has at least that cosine similarity to an
+    earlier one is answered with the earlier answer.
+    """
+
+    def __init__(self, size=CACHE_SIZE, ttl=CACHE_TTL, semantic_threshold=None, version_path=COLLECTION_VERSION_PATH):
+        self.embeddings = LRUCache(size)
+        self.retrievals = LRUCache(size, ttl)
+        self.answers = LRUCache(size, ttl)
+        self.semantic_threshold = semantic_threshold
+        self.semantic_hits = 0
+        self.invalidations = 0
+        self.version_path = version_path
+        self.version = self._read_version()
+        self.version_lock = threading.Lock()
+        self.on_version_change = []
+
+    def _read_version(self):
+        try:
+            return os.stat(self.version_path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def check_version(self):
+        """Drops the retrieval results and answers if the collection changed since they were cached."""
+        version = self._read_version()
+        if version == self.version:
+            return
+        with self.version_lock:
+            # another request noticed the change first
+            if version == self.version:
+                return
+            for callback in self.on_version_change:
+                callback()
+            self.retrievals.clear()
+            self.answers.clear()
+            self.invalidations += 1
+            self.version = version
+
+    def semantic_answer(self, vector):
+        """Returns the cached answer of the most similar earlier question, if it is similar enough."""
+        cached = [(other, result) for other, result in self.answers.values() if other is not None]
+        if not cached:
+            return None
+        similarities = np.stack([other for other, _ in cached]) @ vector
+        best = int(np.argmax(similarities))
+        if similarities[best] < self.semantic_threshold:
+            return None
+        self.semantic_hits += 1
+        return cached[best][1]
+
+    def report(self):
+        return (
+            f"QueryCache: embedding_hit_rate={self.embeddings.hit_rate():.1%}, retrieval_hit_rate={self.retrievals.hit_rate():.1%}, "
+            f"answer_hit_rate={self.answers.hit_rate():.1%}, semantic_hits={self.semantic_hits}, invalidations={self.invalidations}"
+        )
+
+
+class LRUEmbeddings(Embeddings):
+    """Embeddings whose query vectors are kept in the QueryCache's embedding LRU, in front of the disk cache."""
+
+    def __init__(self, embeddings, cache: QueryCache):
+        self.embeddings = embeddings
+        self.cache = cache
+
+    def embed_documents(self, texts):
+        return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text):
+        key = sanitize_query(text)
+        vector = self.cache.embeddings.get(key)
+        if vector is None:
+            vector = self.embeddings.embed_query(text)
+            self.cache.embeddings.put(key, vector)
+        return vector
+
+
+class CachedRetriever(BaseRetriever):
+    """Serves repeated queries from the QueryCache's retrieval results instead of searching again.
+
+    embeddings, the query embeddings the retriever uses, is kept for CachedQAChain's semantic answer cache.
+    """
+
+    retriever: Any
+    query_cache: Any
+    embeddings: Any = None
+
+    def _get_relevant_documents(self, query, *, run_manager):
+        key = sanitize_query(query)
+        self.query_cache.check_version()
+        documents = self.query_cache.retrievals.get(key)
+        if documents is None:
+            documents = self.retriever.invoke(query, config={"callbacks": run_manager.get_child()})
+            self.query_cache.retrievals.put(key, documents)
+        return list(documents)
+
+    async def _aget_relevant_documents(self, query, *, run_manager):
+        key = sanitize_query(query)
+        self.query_cache.check_version()
+        documents = self.query_cache.retrievals.get(key)
+        if documents is None:
+            documents = await self.retriever.ainvoke(query, config={"callbacks": run_manager.get_child()})
+            self.query_cache.retrievals.put(key, documents)
+        return list(documents)
+
+
+class CachedQAChain:
+    """Wraps the retrieval chain so repeated questions are answered from the QueryCache without calling the LLM.
+
+    Questions asked with a chat history always go to the chain, since their answer depends on it.
+    router is the chain's QueryRouter when queries are routed, kept for reporting.
+    """
+
+    def __init__(self, chain, cache: QueryCache, embeddings=None, router=None):
+        self.chain = chain
+        self.cache = cache
+        self.embeddings = embeddings
+        self.router = router
+
+    def _cached(self, inputs, key):
+        self.cache.check_version()
+        cached = self.cache.answers.get(key)
+        return {**cached[1], "input": inputs["input"]} if cached is not None else None
+
+    def _semantic(self, inputs, vector):
+        result = self.cache.semantic_answer(vector)
+        return {**result, "input": inputs["input"]} if result is not None else None
+
+    def _use_semantic(self):
+        return self.cache.semantic_threshold is not None and self.embeddings is not None
+
+    def invoke(self, inputs, config=None, **kwargs):
+        if inputs.get("chat_history"):
+            return self.chain.invoke(inputs, config, **kwargs)
+        key = sanitize_query(inputs["input"])
+        result = self._cached(inputs, key)
+        if result is not None:
+            return result
+        vector = None
+        if self._use_semantic():
+            vector = np.asarray(self.embeddings.embed_query(inputs["input"]), dtype=np.float32)
+            vector /= max(float(np.linalg.norm(vector)), 1e-12)
+            result = self._semantic(inputs, vector)
+            if result is not None:
+                return result
+        result = self.chain.invoke(inputs, config, **kwargs)
+        self.cache.answers.put(key, (vector, result))
+        return result
+
+    async def ainvoke(self, inputs, config=None, **kwargs):
+        if inputs.get("chat_history"):
+            return await self.chain.ainvoke(inputs, config, **kwargs)
+        key = sanitize_query(inputs["input"])
+        result = self._cached(inputs, key)
+        if result is not None:
+            return result
+        vector = None
+        if self._use_semantic():
+            vector = np.asarray(await self.embeddings.aembed_query(inputs["input"]), dtype=np.float32)
+            vector /= max(float(np.linalg.norm(vector)), 1e-12)
+            result = self._semantic(inputs, vector)
+            if result is not None:
+                return result
+        result = await self.chain.ainvoke(inputs, config, **kwargs)
+        self.cache.answers.put(key, (vector, result))
+        return result
@@ -0,0 +1,129 @@
+import threading
+from typing import Any, Dict
+from langchain_core.retrievers import BaseRetriever
+from query_text import sanitize_query
+
+# words that point a question at one category of the lexicon (the first path segment of its urls); question
+# words and words as common across the lexicon as "house", "book" or "magic" would route almost anything
+CATEGORY_KEYWORDS = {
+    "character": {"character", "wizard", "witch", "family", "parents", "married", "born", "died", "student", "headmaster", "professor", "auror"},
+    "creature": {"creature", "creatures", "beast", "beasts", "animal", "dragon", "elf", "elves", "goblin", "giant", "werewolf", "centaur", "hippogriff", "owl", "phoenix", "basilisk", "dementor", "acromantula"},
+    "magic": {"spell", "spells", "charm", "charms", "curse", "curses", "jinx", "hex", "potion", "potions", "incantation", "enchantment", "transfiguration"},
+    "thing": {"object", "artifact", "artefact", "wand", "wands", "cloak", "broom", "broomstick", "map", "horcrux", "horcruxes", "hallows"},
+    "place": {"place", "located", "location", "village", "street", "alley", "castle", "shop", "ministry", "town"},
+    "source": {"novel", "novels", "chapter", "chapters", "film", "films", "movie"},
+    "event": {"year", "date", "battle", "war", "event", "events", "timeline"},
+}
+
+# a routed question searches everything after all when the best keyword match in its categories scores below
+# this fraction of the best match anywhere, i.e. the lexicon has much better text for it elsewhere
+MIN_ROUTED_SCORE_RATIO = 0.7
+
+# a question matching more categories than this isn't about anything specific and searches everything
+MAX_ROUTED_CATEGORIES = 2
+
+# longest page title, in words, looked up in questions
+MAX_TITLE_WORDS = 6
+
+
+class QueryRouter:
+    """Picks the lexicon categories a question is about from keyword and entity rules.
+
+    Entities are page titles: a question naming a page ("the elder wand", "dobby") is routed to the
+    categories of the pages with that title. Otherwise the categories whose keywords the question
+    contains are used. route() returns None when the question should search the whole collection: when
+    it matches no category or too many, or when the BM25 index scores its categories' best chunk well below
+    the best chunk anywhere.
+    """
+
+    def __init__(self, categories=(), titles=None, keywords=None, index=None, min_score_ratio=MIN_ROUTED_SCORE_RATIO):
+        self.all_keywords = keywords or CATEGORY_KEYWORDS
+        self.min_score_ratio = min_score_ratio
+        self.lock = threading.Lock()
+        self.routed = 0
+        self.unrouted = 0
+        self.low_score = 0
+        self.update(categories, titles, index)
+
+    @classmethod
+    def from_index(cls, index):
+        """Returns a router over the categories and page titles of a BM25Index, checking routes against it."""
+        return cls(index.categories, index.titles, index=index)
+
+    def update(self, categories, titles=None, index=None):
+        """Switches to new categories, page titles and index, e.g. after the collection changed, keeping the counts."""
+        self.categories = set(categories)
+        # single words shorter than 4 letters are too ambiguous to count as entities
+        self.titles = {title: found for title, found in (titles or {}).items() if len(title) >= 4 or " " in title}
+        self.keywords = {category: words for category, words in self.all_keywords.items() if category in self.categories}
+        self.index = index
+
+    def use_index(self, index):
+        """Switches to the categories and page titles of a newly loaded BM25Index, checking routes against it."""
+        self.update(index.categories, index.titles, index)
+
+    def _entity_categories(self, words):
+        found = set()
+        for size in range(min(MAX_TITLE_WORDS, len(words)), 0, -1):
+            for start in range(len(words) - size + 1):
+                found.update(self.titles.get(" ".join(words[start:start + size]), ()))
+        return found & self.categories
+
+    def route(self, query):
+        """Returns the sorted categories to search for query, or None to search everything."""
+        words = sanitize_query(query).replace("?", " ").replace("!", " ").split()
+        categories = self._entity_categories(words)
+        if not categories:
+            categories = {category for category, keywords in self.keywords.items() if keywords.intersection(words)}
+        routed = 0 < len(categories) <= MAX_ROUTED_CATEGORIES
+        low_score = routed and not self._scores_ok(query, categories)
+        with self.lock:
+            if low_score:
+                self.low_score += 1
+            elif routed:
+                self.routed += 1
+            else:
+                self.unrouted += 1
+        return sorted(categories) if routed and not low_score else None
+
+    def _scores_ok(self, query, categories):
+        """Returns False if the best keyword match in categories scores well below the best one anywhere."""
+        if self.index is None:
+            return True
+        best, best_routed = self.index.best_scores(query, categories)
+        # with no keyword match anywhere, the dense search alone decides
+        return best <= 0 or best_routed >= self.min_score_ratio * best
+
+    def report(self):
+        return f"QueryRouter: routed={self.routed}, unrouted={self.unrouted}, low_score={self.low_score}"
+
+
+class RoutedRetriever(BaseRetriever):
+    """Searches only the categories the router picks for a query, and the global retriever otherwise.
+
+    partition is called with a tuple of categories and returns the retriever searching only their chunks;
+    it is called once per combination. Only one of the two retrievers runs for a query.
+    """
+
+    router: Any
+    retriever: Any
+    partition: Any
+    partitions: Dict[Any, Any] = {}
+
+    def _partition_retriever(self, categories):
+        key = tuple(categories)
+        if key not in self.partitions:
+            self.partitions[key] = self.partition(key)
+        return self.partitions[key]
+
+    def _get_relevant_documents(self, query, *, run_manager):
+        categories = self.router.route(query)
+        if categories is not None:
+            return self._partition_retriever(categories).invoke(query, config={"callbacks": run_manager.get_child(tag="routed")})
+        return self.retriever.invoke(query, config={"callbacks": run_manager.get_child()})
+
+    async def _aget_relevant_documents(self, query, *, run_manager):
+        categories = self.router.route(query)
+        if categories is not None:
+            return await self._partition_retriever(categories).ainvoke(query, config={"callbacks": run_manager.get_child(tag="routed")})
+        return await self.retriever.ainvoke(query, config={"callbacks": run_manager.get_child()})
@@ -0,0 +1,9 @@
+import re
+
+# no third-party imports: search.py sanitizes the first question before langchain and numpy are loaded
+
+
+def sanitize_query(query):
+    query = query.strip().lower() # remove leading and trailing spaces and convert to lowercase
+    query = re.sub(r'[^\w\s?!]', '', query) # remove special characters
+    return " ".join(query.split()) # remove extra spaces
@@ -1,21 +1,12 @@
-from langchain_chroma import Chroma
-from langchain_openai import OpenAIEmbeddings
-from langchain_core.prompts import ChatPromptTemplate
-from langchain.chains import create_retrieval_chain
-from langchain.chains.combine_documents import create_stuff_documents_chain
-from langchain_core.messages import HumanMessage, AIMessage
-from langchain_openai import ChatOpenAI
 from dotenv import load_dotenv
-import openai
 import os
 import argparse
-from langchain.retrievers import EnsembleRetriever, ContextualCompressionRetriever
-from langchain_community.retrievers import BM25Retriever
-from langchain.schema import Document
+from startup_profile import timed
 
 load_dotenv()
 
-openai.api_key = os.environ['OPENAI_API_KEY']
+# langchain, Chroma and the OpenAI clients are imported when the chain is built, not on import, so a caller
+# like search.py can show its prompt first; langchain_openai reads OPENAI_API_KEY from the environment
 
 CHROMA_PATH = "./chroma"
 
@@ -37,38 +28,117 @@ def print_docs_information(query_results):
         print("-" * 100)
 
 def get_retriever():
-    vectorstore = Chroma(collection_name="harry_potter_collection", persist_directory=CHROMA_PATH, embedding_function=OpenAIEmbeddings())
-
-    # Use from_template for retrieval chains
-    rag_prompt = ChatPromptTemplate.from_messages(
-        [
-            ("system", RAG_PROMPT),
-            ("human", "{input}"),
-        ]
-    )
-    
-    question_answer_chain = create_stuff_documents_chain(llm=ChatOpenAI(model_name='gpt-4o-mini'), prompt=rag_prompt)
+    with timed("import langchain"):
+        from langchain_chroma import Chroma
+        from langchain_core.prompts import ChatPromptTemplate
+        from langchain.chains.combine_documents import create_stuff_documents_chain
+        from langchain_openai import ChatOpenAI
+    with timed("import retrieval modules"):
+        from embedding_cache import CachedEmbeddings, EmbeddingCache
+        from embedding_backends import get_embeddings
+        from compact_vectors import COMPACT_PATH, CompactRetriever, CompactVectorIndex
+        from bm25_index import BM25_PATH, BM25IndexRetriever, load_bm25_index
+        from hybrid_retriever import RRF_C, HybridRetriever
+        from query_cache import CachedRetriever, LRUEmbeddings, QueryCache, read_collection_version
+        from query_router import QueryRouter, RoutedRetriever
+
+    with timed("embeddings"):
+        # repeated queries are served from memory: their embeddings, retrieval results and answers;
+        # SEMANTIC_CACHE_THRESHOLD (e.g. 0.95) also reuses the answer of a similar enough earlier question
+        threshold = os.environ.get("SEMANTIC_CACHE_THRESHOLD")
+        query_cache = QueryCache(semantic_threshold=float(threshold) if threshold else None)
+        # other queries are embedded once; the disk cache is shared with ingestion
+        embeddings = LRUEmbeddings(CachedEmbeddings(get_embeddings(), EmbeddingCache()), query_cache)
+    with timed("chroma"):
+        vectorstore = Chroma(collection_name="harry_potter_collection", persist_directory=CHROMA_PATH, embedding_function=embeddings)
+
+    with timed("llm chain"):
+        # Use from_template for retrieval chains
+        rag_prompt = ChatPromptTemplate.from_messages(
+            [
+                ("system", RAG_PROMPT),
+                ("human", "{input}"),
+            ]
+        )
+
+        question_answer_chain = create_stuff_documents_chain(llm=ChatOpenAI(model_name='gpt-4o-mini'), prompt=rag_prompt)
+
+    def build_retriever():
+        """Loads the saved indexes and returns the retriever searching them and Chroma."""
+        with timed("dense retriever"):
+            # dense retrieval with vector embeddings; DENSE_INDEX=compact searches the quantized copy built by store_db.py --compact
+            compact_index = None
+            if os.environ.get("DENSE_INDEX") == "compact" and os.path.exists(COMPACT_PATH):
+                try:
+                    compact_index = CompactVectorIndex.load(COMPACT_PATH)
+                except ValueError as e:
+                    print(f"{e}, searching Chroma instead")
+                # a run without --compact changed the collection after the copy was saved
+                if compact_index is not None and compact_index.fingerprint != read_collection_version():
+                    print(f"Compact index in {COMPACT_PATH} does not match the collection, searching Chroma instead; rebuild it with store_db.py --rebuild-index --compact int8")
+                    compact_index = None
+
+        with timed("bm25 index"):
+            # sparse retrieval using BM25, from the index store_db.py saved; fails if it doesn't match the collection
+            bm25_index = load_bm25_index(BM25_PATH)
+
+        def legs(categories=None):
+            """Returns the dense and keyword retrievers over the chunks of the given categories, or over all chunks."""
+            if compact_index is not None:
+                rows = compact_index.category_rows(categories) if categories else None
+                retriever = CompactRetriever(index=compact_index, embeddings=embeddings, k=5, rows=rows)
+            elif categories:
+                # a filtered HNSW query
+                retriever = vectorstore.as_retriever(search_kwargs={"k": 5, "filter": {"category": {"$in": list(categories)}}})
+            else:
+                retriever = vectorstore.as_retriever(search_kwargs={"k": 5})
+            return [retriever, BM25IndexRetriever(index=bm25_index, k=5, categories=list(categories) if categories else None)]
+
+        # both legs run concurrently and are fused with reciprocal rank fusion; RRF_C overrides the fusion constant
+        c = int(os.environ.get("RRF_C", RRF_C))
+        retriever = HybridRetriever(retrievers=legs(), weights=[0.5, 0.5], c=c)
+
+        def routed_retriever(categories):
+            # the same legs over only the chunks of these categories, e.g. a metadata-filtered Chroma query
+            return HybridRetriever(retrievers=legs(categories), weights=[0.5, 0.5], c=c)
+
+        if router is not None and bm25_index.categories:
+            router.use_index(bm25_index)
+            retriever = RoutedRetriever(router=router, retriever=retriever, partition=routed_retriever)
+        return retriever
+
+    # QUERY_ROUTING=on searches only the categories a question is about (a named page, spells, creatures, places...);
+    # off by default until evaluate.py shows it doesn't cost answer quality. The router outlives index reloads, so
+    # its counts cover the whole session
+    router = QueryRouter() if os.environ.get("QUERY_ROUTING", "off") == "on" else None
 
-    # dense retrieval with vector embeddings
-    retriever = vectorstore.as_retriever(search_kwargs={"k": 5})
+    ensemble_retriever = CachedRetriever(retriever=build_retriever(), query_cache=query_cache, embeddings=embeddings)
 
-    # sparse retrieval using BM25
-    raw = vectorstore.get()
-    documents = [Document(page_content=text, metadata=meta) for text, meta in zip(raw['documents'], raw['metadatas'])]
-    keyword_retriever = BM25Retriever.from_documents(documents)
-    keyword_retriever.k = 5
+    def reload_indexes():
+        # store_db.py saved new BM25 and compact indexes; Chroma itself reads the updated collection
+        try:
+            ensemble_retriever.retriever = build_retriever()
+            print("Reloaded the retrieval indexes after the collection changed")
+        except (ValueError, OSError) as e:
+            # e.g. files of an index store_db.py is saving again, or a missing or mismatched one
+            print(f"Could not reload the retrieval indexes, still searching the previous ones: {e}")
 
-    ensemble_retriever = EnsembleRetriever(retrievers=[retriever, keyword_retriever], weights=[0.5, 0.5])
+    query_cache.on_version_change.append(reload_indexes)
 
     return ensemble_retriever, question_answer_chain
 
 def get_qa_chain():
     ensemble_retriever, question_answer_chain = get_retriever()
+    from langchain.chains import create_retrieval_chain
+    from query_cache import CachedQAChain
     # create retrieval chain
     rag_chain = create_retrieval_chain(ensemble_retriever, question_answer_chain)
-    return rag_chain
+    # the router, with QUERY_ROUTING=on, is reported next to the cache
+    router = getattr(ensemble_retriever.retriever, "router", None)
+    return CachedQAChain(rag_chain, ensemble_retriever.query_cache, ensemble_retriever.embeddings, router=router)
 
 def main():
+    from langchain_core.messages import HumanMessage, AIMessage
     rag_chain = get_qa_chain()
     
     chat_history = [
@@ -0,0 +1,249 @@
+import asyncio
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+import requests
+
+# statuses worth retrying: rate limited or a transient server error
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """Thread-safe token bucket. reserve() takes tokens (one by default) and returns how long the caller must wait for them."""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def reserve(self, tokens=1):
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= tokens
+            # a negative balance is a debt that is paid back by waiting
+            return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+
+class CircuitBreaker:
+    """Pauses requests to a host after too many consecutive failures.
+
+    After failure_threshold failures in a row the host is open for cooldown seconds, and every
+    request to it waits until then instead of adding load to a struggling server. After the cooldown
+    the breaker is half-open: a single trial request goes out while the others keep waiting, and a
+    success closes the breaker while a failure opens it again. A trial whose outcome is never recorded
+    (e.g. it raised something other than a connection error) is replaced after another cooldown.
+    """
+
+    def __init__(self, failure_threshold=5, cooldown=30.0, probe_interval=1.0):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.probe_interval = min(probe_interval, cooldown)  # how often requests waiting on a trial check again
+        self.failures = 0
+        self.open_until = 0.0
+        self.half_open = False
+        self.probe_started = None
+        self.opens = 0
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Returns 0.0 if a request may be sent now, otherwise how long to wait before asking again."""
+        with self.lock:
+            now = time.monotonic()
+            if now < self.open_until:
+                return self.open_until - now
+            if self.half_open:
+                if self.probe_started is not None and now - self.probe_started < self.cooldown:
+                    return self.probe_interval
+                # this request is the trial
+                self.probe_started = now
+            return 0.0
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.half_open = False
+            self.probe_started = None
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.half_open or self.failures >= self.failure_threshold:
+                self.open_until = time.monotonic() + self.cooldown
+                self.half_open = True
+                self.probe_started = None
+                self.opens += 1
+
+
+def parse_retry_after(value):
+    """Returns the delay in seconds requested by a Retry-After header (seconds or HTTP date), or None."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class RequestPolicy:
+    """Central retry and throttling policy shared by every request the scraper makes.
+
+    - a per-host token bucket caps the request rate (rate requests/sec, bursts of up to burst)
+    - transient failures are retried up to max_retries times with exponential backoff and full
+      jitter, or after the delay a 429/503 response asks for in Retry-After
+    - a per-host circuit breaker pauses a host after repeated failures
+    Counters for requests, retries, failures and time spent throttled are available from stats().
+    """
+
+    def __init__(self, rate=10.0, burst=10, max_retries=5, base_delay=0.5, max_delay=60.0, failure_threshold=5, cooldown=30.0):
+        self.rate = rate
+        self.burst = burst
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.buckets = {}
+        self.breakers = {}
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.retries = 0
+        self.failures = 0
+        self.throttled_seconds = 0.0
+        self.backoff_seconds = 0.0
+
+    def _host_state(self, url):
+        host = urlsplit(url).netloc
+        with self.lock:
+            if host not in self.buckets:
+                self.buckets[host] = TokenBucket(self.rate, self.burst)
+                self.breakers[host] = CircuitBreaker(self.failure_threshold, self.cooldown)
+            return self.buckets[host], self.breakers[host]
+
+    def breaker_delay(self, url):
+        """Returns 0.0 if the circuit breaker of url's host lets a request through now, or how long to wait before asking again."""
+        delay = self._host_state(url)[1].acquire()
+        if delay:
+            with self.lock:
+                self.throttled_seconds += delay
+        return delay
+
+    def wait_for_breaker(self, url):
+        """Blocks until the circuit breaker of url's host lets a request through."""
+        delay = self.breaker_delay(url)
+        while delay:
+            time.sleep(delay)
+            delay = self.breaker_delay(url)
+
+    def wait_before_request(self, url):
+        """Returns how long the rate limit of url's host makes a request wait, and counts it as throttled time.
+
+        Call it once the circuit breaker lets the request through (see wait_for_breaker).
+        """
+        delay = self._host_state(url)[0].reserve()
+        with self.lock:
+            self.requests += 1
+            self.throttled_seconds += delay
+        return delay
+
+    def backoff(self, attempt, retry_after=None):
+        """Returns the delay before retry number attempt (0-based), honoring Retry-After if the server sent one."""
+        if retry_after is not None:
+            delay = min(self.max_delay, retry_after)
+        else:
+            delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        with self.lock:
+            self.retries += 1
+            self.backoff_seconds += delay
+        return delay
+
+    def record_success(self, url):
+        self._host_state(url)[1].record_success()
+
+    def record_failure(self, url):
+        breaker = self._host_state(url)[1]
+        with self.lock:
+            self.failures += 1
+            breaker.record_failure()
+
+    def get(self, session, url, **kwargs):
+        """GETs url with a requests session under this policy. Raises the last error (or HTTPError) once retries are exhausted."""
+        for attempt in range(self.max_retries + 1):
+            self.wait_for_breaker(url)
+            time.sleep(self.wait_before_request(url))
+            try:
+                response = session.get(url, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout, ConnectionResetError) as e:
+                self.record_failure(url)
+                if attempt == self.max_retries:
+                    raise
+                delay = self.backoff(attempt)
+                print(f"Connection error for {url}: {e}. Retrying in {delay:.1f} seconds...")
+                time.sleep(delay)
+                continue
+            if response.status_code in RETRYABLE_STATUSES:
+                self.record_failure(url)
+                if attempt == self.max_retries:
+                    response.raise_for_status()
+                delay = self.backoff(attempt, parse_retry_after(response.headers.get("Retry-After")))
+                print(f"Got {response.status_code} for {url}. Retrying in {delay:.1f} seconds...")
+                time.sleep(delay)
+                continue
+            self.record_success(url)
+            return response
+
+    async def get_async(self, session, url, headers=None):
+        """aiohttp counterpart of get(). Returns (status, text, response headers); the status is still retryable if retries ran out on it."""
+        # imported here so the sync path doesn't need aiohttp
+        import aiohttp
+        for attempt in range(self.max_retries + 1):
+            delay = self.breaker_delay(url)
+            while delay:
+                await asyncio.sleep(delay)
+                delay = self.breaker_delay(url)
+            await asyncio.sleep(self.wait_before_request(url))
+            try:
+                async with session.get(url, headers=headers) as response:
+                    text = "" if response.status == 304 else await response.text()
+                    status, response_headers = response.status, response.headers
+            except (aiohttp.ClientError, asyncio.TimeoutError, ConnectionResetError) as e:
+                self.record_failure(url)
+                if attempt == self.max_retries:
+                    raise
+                delay = self.backoff(attempt)
+                print(f"Connection error for {url}: {e}. Retrying in {delay:.1f} seconds...")
+                await asyncio.sleep(delay)
+                continue
+            if status in RETRYABLE_STATUSES:
+                self.record_failure(url)
+                if attempt == self.max_retries:
+                    return status, text, response_headers
+                delay = self.backoff(attempt, parse_retry_after(response_headers.get("Retry-After")))
+                print(f"Got {status} for {url}. Retrying in {delay:.1f} seconds...")
+                await asyncio.sleep(delay)
+                continue
+            self.record_success(url)
+            return status, text, response_headers
+
+    def stats(self):
+        with self.lock:
+            return {
+                "requests": self.requests,
+                "retries": self.retries,
+                "failures": self.failures,
+                "throttled_seconds": round(self.throttled_seconds, 2),
+                "backoff_seconds": round(self.backoff_seconds, 2),
+                "circuit_opens": sum(breaker.opens for breaker in self.breakers.values()),
+            }
+
+    def report(self):
+        return "Request policy: " + ", ".join(f"{key}={value}" for key, value in self.stats().items())
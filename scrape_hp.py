@@ -1,13 +1,27 @@
 import requests
-from bs4 import BeautifulSoup
 import time
 import json
 import os
 from functools import wraps
 import shutil
+from requests.adapters import HTTPAdapter
+from cachetools import LRUCache
+from fetch_engine import AsyncFetcher, FetchResult
+from page_validators import ValidatorStore, content_hash
+from crawl_journal import CrawlJournal, remove_journal
+from html_archive import HtmlArchive
+from html_parsers import get_parser, find_content_section
+from crawl_pipeline import CrawlPipeline
+from crawl_frontier import CrawlFrontier, normalize_url, url_category
+from request_policy import RequestPolicy
+from sitemap_discovery import SitemapDiscovery
 
 # TODO: EVENTS, SOURCES
 
+# categories whose pages are queued from the sitemap in discovery="sitemap" mode; sources and events
+# are still found through their index pages because they need recursive and timeline crawling
+SITEMAP_CATEGORIES = ("character", "creature", "magic", "thing", "place")
+
 def clear_hp_data():
     """Clears hp_data folder contents."""
     if os.path.exists("hp_data"):
@@ -18,12 +32,16 @@ def clear_hp_data():
         print("hp_data folder does not exist")
 
 def clear_scraped_urls():
-    """Clears scraped_urls.json file."""
+    """Clears the crawl journal, the frontier checkpoint and the legacy scraped_urls.json file."""
+    if remove_journal("crawl_journal.db"):
+        print("Cleared crawl_journal.db")
+    else:
+        print("crawl_journal.db file does not exist")
+    if remove_journal("crawl_frontier.db"):
+        print("Cleared crawl_frontier.db")
     if os.path.exists("scraped_urls.json"):
         os.remove("scraped_urls.json")
         print("Cleared scraped_urls.json")
-    else:
-        print("scraped_urls.json file does not exist")
 
 def timing_decorator(func):
     @wraps(func)
@@ -38,19 +56,147 @@ def timing_decorator(func):
         return result
     return wrapper
 
+def extract_text(soup, url, is_article=False):
+    """Extracts the text of a content page: the article opening (if is_article), h1 title, fact box and all <p> and <li> elements of the section in order of appearance. Returns None if the page has no content section."""
+    text_parts = []
+    if is_article:
+        try:
+            opening = soup.select_one(".ArticleGambit_gambit__iDGnv.ArticleGambit_darkTheme__E0VQv.ArticleGambit_default__t_9Q_")
+            text_parts.append(opening.get_text())
+        except Exception as e:
+            print(f"No article opening found for {url}")
+
+    # try to get h1 title
+    try:
+        h1_title = soup.find('h1')
+        if h1_title:
+            text_parts.append(h1_title.get_text())
+    except Exception as e:
+        print(f"No h1 title found for {url}")
+
+    section = find_content_section(soup)
+    if not section:
+        return None
+    elements = section.find_all(['p', 'li'])
+
+    # try to get fact box content if it exists
+    try:
+        fact_box = section.find('div', class_='fact_box')
+        if fact_box:
+            fact_box_text = fact_box.get_text()
+            text_parts.append(fact_box_text)
+    except Exception as e:
+        pass  # ignore if no fact box found
+
+    # get all paragraphs and lists in order of appearance
+    for element in elements:
+        if element.name == 'p':
+            text_parts.append(element.get_text())
+        else:  # element is a ul
+            list_items = element.find_all('li')
+            for li in list_items:
+                text_parts.append(li.get_text())
+
+    text = "\n".join(text_parts)
+
+    # cut off text after "Tags" or "Editors" appears
+    # find last occurrence of Tags/Editor to avoid cutting off content that happens to contain those words
+    if "Tags" in text:
+        text = text.rsplit("Tags", 1)[0]
+    if "Editor" in text:
+        text = text.rsplit("Editor", 1)[0]
+    if "Copyright" in text:
+        text = text.rsplit("Copyright", 1)[0]
+    return text
+
+def extract_title(soup):
+    """Returns the text of a page's h1 title, or None if it has none."""
+    h1_title = soup.find('h1')
+    return h1_title.get_text().strip() if h1_title else None
+
+def page_metadata(url, title=None):
+    """Returns the metadata stored with a scraped document: its normalized url, category and title (derived from the url if missing)."""
+    url = normalize_url(url)
+    if not title:
+        title = url.rstrip("/").split("/")[-1].replace("-", " ").title()
+    return {"source": url, "url": url, "category": url_category(url), "title": title}
+
+def timeline_event_urls(soup):
+    """Returns the urls of the event pages a timeline page lists, in timeline order."""
+    column = soup.select_one("html > body > article > section > div > div")
+    if not column:
+        return None
+    urls = []
+    for event in column.find_all("article"):
+        links = event.select_one(".timeline_tmlabel").select("a")
+        urls.append(links[0].get("href"))
+    return urls
+
+def extract_quotes(soup):
+    """Extracts every <li> of a quote page, one per line."""
+    text = ""
+    for quote in soup.find_all("li"):
+        text += quote.get_text() + "\n"
+    return text
+
 class Scraper:
-    def __init__(self, batch_size=20, store_callback=None, scraped_urls_file="scraped_urls.json"):
+    def __init__(self, batch_size=20, store_callback=None, scraped_urls_file="scraped_urls.json", concurrency=8, validators_file="page_validators.json", journal_file="crawl_journal.db", archive_dir=None, offline=False, parser="html.parser", pipeline_workers=0, frontier_file="crawl_frontier.db", resume=False, text_cache_size=64 * 1024 * 1024, rate_limit=10.0, discovery="listings", sitemap_url=None, sitemap_lastmod_file="sitemap_lastmod.json", origin=None, document_sink=None):
         self.base_url = "https://www.hp-lexicon.org"
+        # requests for base_url pages go to origin instead if given, e.g. a local fixture server
+        self.origin = origin.rstrip("/") if origin else None
         self.documents_scraped = 0
         self.batch_size = batch_size
         self.store_callback = store_callback
+        # document_sink(text, metadata) receives every scraped document; without one they are written to hp_data/
+        self.document_sink = document_sink
         self.alphabet = ["A", "B", "C", "D", "E", "F", "G", "H", "I", "J", "K", "L", "M", "N", "O", "P", "Q", "R", "S", "T", "U", "V", "W", "X", "Y", "Z"]
         self.headers = {
             'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
         }
         self.scraped_urls = set()  # Track scraped URLs in memory
-        self.scraped_urls_file = scraped_urls_file
+        self.failed_urls = set()  # normalized pages and listings that could not be fetched or scraped this run
+        self.scraped_urls_file = scraped_urls_file  # legacy JSON list, only read to migrate into the journal
+        self.journal = CrawlJournal(journal_file)
         self._load_scraped_urls()  # Load previously scraped URLs
+        # rate limiting, retries with backoff and the per-host circuit breaker for every request
+        self.policy = RequestPolicy(rate=rate_limit, burst=concurrency)
+        self.fetcher = AsyncFetcher(headers=self.headers, per_host_limit=concurrency, policy=self.policy, rewrite_url=self._request_url if self.origin else None)
+        self.prefetched_pages = {}  # url -> FetchResult downloaded ahead of time by the async fetcher
+        # pooled keep-alive session for pages fetched outside of a prefetch
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+        adapter = HTTPAdapter(pool_connections=concurrency, pool_maxsize=concurrency)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.validators = ValidatorStore(validators_file)
+        # optional raw HTML archive; with offline=True every page is read from it instead of the network
+        self.archive = HtmlArchive(archive_dir) if archive_dir else None
+        self.parser = get_parser(parser)  # see html_parsers.PARSERS
+        # with pipeline_workers > 0, lists of content pages are fetched, extracted (in a process pool) and written as a pipeline
+        self.pipeline = CrawlPipeline(self.fetcher, workers=pipeline_workers, parser=parser, validators=self.validators) if pipeline_workers else None
+        # pages waiting to be crawled and listing pages already walked; with resume=True an interrupted
+        # crawl picks up its pending pages and skips the listings it finished
+        self.frontier = CrawlFrontier(frontier_file)
+        if resume:
+            # pages the interrupted run gave up on get another try
+            self.frontier.reset_attempts()
+            print(f"Resuming crawl with {self.frontier.pending_count()} pending pages")
+        else:
+            self.frontier.reset()
+        self._draining = False
+        # normalized url -> extracted text, bounded by total characters; lets timelines reuse pages
+        # that other categories (or earlier timelines) already fetched and parsed
+        self.text_cache = LRUCache(maxsize=text_cache_size, getsizeof=len)
+        # with discovery="sitemap", catalog items are queued from the XML sitemaps instead of walking
+        # every letter page; listing pages are still walked if the sitemap can't be read
+        if discovery not in ("listings", "sitemap"):
+            raise ValueError(f"Unknown discovery mode: {discovery}")
+        self.sitemap = SitemapDiscovery(self._fetch_raw, sitemap_lastmod_file) if discovery == "sitemap" else None
+        self.sitemap_url = sitemap_url or self.base_url + "/sitemap_index.xml"
+        self._sitemap_pages = None  # pages queued from the sitemap, None until discovery has run
+        self.offline = offline
+        if offline and not self.archive:
+            raise ValueError("offline mode requires an archive_dir")
     
     def increment_documents_scraped(self):
         """Increments the number of documents scraped and calls the store callback if the batch size is reached."""
@@ -59,168 +205,333 @@ class Scraper:
         if self.documents_scraped % self.batch_size == 0:
             self.store_callback()
 
+    def store_document(self, url, text, title=None, filename=None):
+        """Hands a scraped document to the document sink, or writes it to hp_data if there is none."""
+        if self.document_sink:
+            self.document_sink(text, page_metadata(url, title))
+            return
+        if filename is None:
+            filename = '_'.join(url.split('/')[-2:])
+        with open(f"hp_data/{filename}.txt", "w") as f:
+            f.write(text)
+
     def get_documents_scraped(self):
         """Returns the number of documents scraped."""
         return self.documents_scraped
     
     def _load_scraped_urls(self):
-        """Load previously scraped URLs from file if it exists."""
-        if os.path.exists(self.scraped_urls_file):
+        """Load previously scraped URLs from the crawl journal, migrating scraped_urls.json into it if needed."""
+        if len(self.journal) == 0 and os.path.exists(self.scraped_urls_file):
             try:
                 with open(self.scraped_urls_file, 'r') as f:
-                    url_list = json.load(f)
-                    self.scraped_urls = set(url_list)
-                    print(f"Loaded {len(self.scraped_urls)} previously scraped URLs")
+                    self.journal.import_urls(json.load(f))
+                print(f"Migrated {self.scraped_urls_file} into {self.journal.journal_file}")
             except Exception as e:
-                print(f"Could not load scraped URLs: {e}")
-                self.scraped_urls = set()
+                print(f"Could not migrate scraped URLs: {e}")
+        self.scraped_urls = {normalize_url(url) for url in self.journal.load()}
+        if self.scraped_urls:
+            print(f"Loaded {len(self.scraped_urls)} previously scraped URLs")
         else:
             print("No previous scraping history found, starting fresh")
     
     def _save_scraped_urls(self):
-        """Save scraped URLs to file for persistence."""
+        """Compact the crawl journal and save page validators. Scraped URLs themselves are journaled as they happen."""
         try:
-            with open(self.scraped_urls_file, 'w') as f:
-                json.dump(list(self.scraped_urls), f, indent=2)
+            self.journal.compact()
         except Exception as e:
-            print(f"Could not save scraped URLs: {e}")
+            print(f"Could not compact crawl journal: {e}")
+        self.validators.save()
     
     def is_url_scraped(self, url):
-        """Check if a URL has already been scraped."""
-        return url in self.scraped_urls
+        """Check if a URL (or an equivalent spelling of it) has already been scraped."""
+        return normalize_url(url) in self.scraped_urls
     
-    def mark_url_as_scraped(self, url):
-        """Mark a URL as scraped and periodically save to disk."""
+    def mark_url_as_scraped(self, url, status="scraped", text=None):
+        """Mark a URL as scraped and append it to the crawl journal, with a hash of the extracted text if given.
+
+        The page's pending validators are committed, since its document has been handed on for storing.
+        """
+        self.validators.commit(url)
+        url = normalize_url(url)
+        self.validators.commit(url)
         self.scraped_urls.add(url)
-        # Save to disk periodically (every 10 URLs)
-        if len(self.scraped_urls) % 10 == 0:
-            self._save_scraped_urls()
+        # a page that failed earlier in the run and was retried successfully
+        self.failed_urls.discard(url)
+        self.journal.record(url, status, content_hash(text) if text is not None else None)
     
+    def forget_pages(self, urls):
+        """Forgets that pages were crawled, e.g. because storing them failed, so the next run fetches them again.
+
+        Their journal records, validators and sitemap lastmods are dropped and they are pending on the frontier
+        again, so both --resume and --incremental runs pick them up.
+        """
+        urls = {normalize_url(url) for url in urls}
+        self.scraped_urls.difference_update(urls)
+        self.journal.forget(urls)
+        self.validators.forget(urls)
+        self.frontier.requeue(urls)
+        if self.sitemap:
+            self.sitemap.forget(urls)
+            self.sitemap.save()
+        print(f"Forgot {len(urls)} pages that were not stored, they will be fetched again on the next run")
+
     def reset_scraped_urls(self):
         """Reset the scraped URLs tracker (use with caution!)."""
         self.scraped_urls = set()
+        self.journal.reset()
         if os.path.exists(self.scraped_urls_file):
             os.remove(self.scraped_urls_file)
         print("Scraped URLs tracker has been reset")
 
+    def close(self):
+        """Saves crawl state and closes the pooled HTTP sessions."""
+        self._save_scraped_urls()
+        self.journal.close()
+        self.frontier.close()
+        self.fetcher.close()
+        self.session.close()
+        print(self.policy.report())
+        if self.pipeline:
+            print(self.pipeline.report())
+            self.pipeline.close()
+        if self.archive:
+            self.archive.close()
+
+    def _request_url(self, url):
+        """Returns the URL to request for a page, pointing base_url pages at origin if one is set."""
+        if self.origin and url.startswith(self.base_url):
+            return self.origin + url[len(self.base_url):]
+        return url
+
+    def get_page(self, url, conditional=False, kind="listing"):
+        """Returns the HTML of a page, using the prefetched copy if there is one.
+
+        If conditional is True, the request carries the page's stored validators and None is returned
+        when the page has not changed since the last crawl. Downloaded pages are saved to the archive
+        (if any) under the given kind; in offline mode pages are only ever read from the archive.
+        """
+        if self.offline:
+            html = self.archive.get(url)
+            if html is None:
+                print(f"Page not in archive: {url}")
+                return ""
+            return html
+        if url in self.prefetched_pages:
+            result = self.prefetched_pages.pop(url)
+        else:
+            headers = self.validators.conditional_headers(url) if conditional else None
+            response = self.policy.get(self.session, self._request_url(url), headers=headers)
+            text = "" if response.status_code == 304 else response.text
+            result = FetchResult(response.status_code, text, response.headers.get("ETag"), response.headers.get("Last-Modified"))
+        if conditional:
+            if self.validators.check(url, result):
+                return None
+        elif result.status == 304:
+            # a conditional prefetch was consumed unconditionally, so fetch the full page
+            result = result._replace(status=200, text=self.policy.get(self.session, self._request_url(url)).text)
+        if self.archive and result.status == 200:
+            self.archive.put(url, result.text, kind)
+        return result.text
+
+    def _fetch_raw(self, url):
+        """Returns the raw body of a URL (e.g. a gzipped sitemap), without archiving it."""
+        return self.policy.get(self.session, self._request_url(url)).content
+
+    def discover_from_sitemap(self):
+        """Queues and crawls every page of SITEMAP_CATEGORIES listed in the sitemaps. Returns how many pages were found.
+
+        Pages whose <lastmod> is the one recorded when they were last crawled are marked unchanged without
+        being requested; only new pages and pages whose lastmod changed are fetched.
+        """
+        entries = self.sitemap.walk(self.sitemap_url, path_prefixes=SITEMAP_CATEGORIES)
+        entries = [entry._replace(loc=normalize_url(entry.loc)) for entry in entries]
+        if not entries:
+            print("No pages found in the sitemap, falling back to listing pages")
+            return 0
+        unchanged = [entry.loc for entry in entries if self.sitemap.unchanged(entry) and not self.is_url_scraped(entry.loc)]
+        changed = [entry.loc for entry in entries if self.sitemap.changed(entry)]
+        # marked scraped in bulk, so incremental pruning knows these pages still exist
+        self.journal.import_urls(unchanged, status="unchanged")
+        self.scraped_urls.update(unchanged)
+        # a changed page journaled by an interrupted run is fetched again
+        self.scraped_urls.difference_update(changed)
+        to_fetch = [entry.loc for entry in entries if not self.is_url_scraped(entry.loc)]
+        print(f"Discovered {len(entries)} pages from the sitemap: {len(unchanged)} unchanged, {len(changed)} changed, fetching {len(to_fetch)}")
+        self.scrape_urls(to_fetch)
+        # a lastmod is only recorded once its page was stored, so a page that failed is fetched again next time
+        self.sitemap.remember([entry for entry in entries if self.is_url_scraped(entry.loc) and entry.loc not in self.failed_urls])
+        self.sitemap.save()
+        return len(entries)
+
+    def prefetch_pages(self, urls, conditional=False):
+        """Downloads pages concurrently so that later get_page calls don't wait on the network."""
+        if self.offline:
+            return
+        pending = [url for url in urls if url and url not in self.prefetched_pages]
+        headers_by_url = {url: self.validators.conditional_headers(url) for url in pending} if conditional else None
+        self.prefetched_pages.update(self.fetcher.fetch_all(pending, headers_by_url))
+
+    def scrape_urls(self, urls, **kwargs):
+        """Queues pages on the crawl frontier, then crawls everything pending in priority order."""
+        urls = [normalize_url(url) for url in urls if url]
+        if kwargs.get("is_timeline"):
+            # timeline pages return their text to the caller instead of being stored, so they bypass the frontier
+            self._crawl_batch(urls, **kwargs)
+            return
+        self.frontier.push_many([url for url in urls if not self.is_url_scraped(url)], **kwargs)
+        # pages queued while the frontier is being drained (e.g. chapter links) are picked up by the running drain
+        if not self._draining:
+            self.drain_frontier()
+
+    def drain_frontier(self, batch_size=64):
+        """Crawls pending frontier pages, highest priority first, until none are left."""
+        self._draining = True
+        try:
+            while True:
+                batch = self.frontier.pop_batch(batch_size)
+                if not batch:
+                    break
+                # pages crawled with the same options (is_article, recursive) are fetched together
+                groups = {}
+                for url, options in batch:
+                    groups.setdefault(tuple(sorted(options.items())), []).append(url)
+                for options, urls in groups.items():
+                    self._crawl_batch(urls, **dict(options))
+                    # failed pages stay pending and are retried after the rest, up to MAX_ATTEMPTS times
+                    failed = [url for url in urls if url in self.failed_urls]
+                    self.frontier.mark_done([url for url in urls if url not in self.failed_urls])
+                    if failed:
+                        self.frontier.mark_failed(failed)
+        finally:
+            self._draining = False
+
+    def _crawl_batch(self, urls, **kwargs):
+        """Scrapes a list of pages in order, downloading the ones not scraped yet concurrently first."""
+        urls = [url for url in dict.fromkeys(urls) if not self.is_url_scraped(url)]
+        # recursive and timeline pages need the calling thread, so they keep the sequential path
+        if self.pipeline and not self.offline and not kwargs.get("recursive") and not kwargs.get("is_timeline"):
+            kind = "article" if kwargs.get("is_article") else "page"
+            # pages the pipeline could not fetch are retried one by one below
+            urls = self.pipeline.run([(url, kind) for url in urls], self._store_extracted)
+        else:
+            self.prefetch_pages(urls, conditional=not kwargs.get("is_timeline", False))
+        for url in urls:
+            self.scrape_raw_text(url, **kwargs)
+
+    def _store_extracted(self, status, url, kind, html, text, title):
+        """Pipeline sink: records a page extracted by the crawl pipeline, like the end of scrape_raw_text does."""
+        if status == "unchanged":
+            print(f"Skipping unchanged page: {url}")
+            self.mark_url_as_scraped(url, status="unchanged")
+            return
+        if self.archive:
+            self.archive.put(url, html, kind)
+        if status == "error":
+            # retried by the frontier, and keeps --incremental from pruning the page's chunks
+            self.failed_urls.add(normalize_url(url))
+            return
+        if text is None:
+            print(f"No section found for {url}")
+            return
+        self.mark_url_as_scraped(url, text=text)
+        self.text_cache[normalize_url(url)] = text
+        self.store_document(url, text, title)
+        self.increment_documents_scraped()
+
+    def scrape_timeline_events(self, urls):
+        """Returns the text of every timeline event page in order, fetching the ones not in the text cache concurrently."""
+        urls = [normalize_url(url) for url in urls]
+        self.prefetch_pages([url for url in dict.fromkeys(urls) if url not in self.text_cache])
+        return [self.scrape_raw_text(url, is_timeline=True) for url in urls]
+
     # scrape alphabetical catalog of magical items & devices, magical and mundane plants
     def scrape_catalog_by_letter(self, base_url):
         """Scrapes a catalog page that's organized by letter."""
-        for letter in self.alphabet:
-            while True:
-                try:
-                    page = requests.get(base_url.format(letter=letter), headers=self.headers)
-                    soup = BeautifulSoup(page.text, "html.parser")
-                    middle_column = soup.find_all("div", class_="col-md-12")[1]
-                    items_list = middle_column.find_all("article")
-                    for item in items_list:
-                        link_elem = item.find("link")
-                        if not link_elem:
-                            continue
-                        item_url = link_elem.get("href")
-                        if not item_url:
-                            continue
-                        self.scrape_raw_text(item_url)
-                        print("Finished scraping category: ", item_url)
-                    break
-                except (requests.exceptions.ConnectionError, ConnectionResetError) as e:
-                    print(f"Connection error retrieving page: {e}. Retrying in 10 seconds...")
-                    time.sleep(10)
-                except Exception as e:
-                    break
+        if self.sitemap and not self.offline:
+            if self._sitemap_pages is None:
+                self._sitemap_pages = self.discover_from_sitemap()
+            if self._sitemap_pages:
+                # the catalog's items were already queued from the sitemap
+                print(f"Skipping letter pages of {base_url}, items come from the sitemap")
+                return
+        letter_urls = [normalize_url(base_url.format(letter=letter), keep_params=("letter",)) for letter in self.alphabet]
+        # letters walked to the end by an interrupted run are not walked again
+        letter_urls = [letter_url for letter_url in letter_urls if not self.frontier.is_done(letter_url)]
+        self.prefetch_pages(letter_urls)
+        for letter_url in letter_urls:
+            try:
+                soup = self.parser.parse(self.get_page(letter_url))
+                middle_column = soup.find_all("div", class_="col-md-12")[1]
+                items_list = middle_column.find_all("article")
+                item_urls = []
+                for item in items_list:
+                    link_elem = item.find("link")
+                    if not link_elem:
+                        continue
+                    item_url = link_elem.get("href")
+                    if not item_url:
+                        continue
+                    item_urls.append(item_url)
+                self.scrape_urls(item_urls)
+                self.frontier.mark_done([letter_url])
+                print(f"Finished scraping {len(item_urls)} items from: {letter_url}")
+            except requests.exceptions.RequestException as e:
+                print(f"Failed to retrieve {letter_url}: {e}")
+                self.failed_urls.add(letter_url)
+            except Exception as e:
+                print(f"Error scraping listing {letter_url}: {e}")
+                self.failed_urls.add(letter_url)
 
     def scrape_raw_text(self, url, is_article=False, recursive=False, is_timeline=False):
-        """Scrapes all <p> and <li> elements in order of appearance after the navbar. If is_article is True, it scrapes the article opening paragraph. If recursive is True, it scrapes links included in the chapter page."""
-        # Check if URL has already been scraped
-        if self.is_url_scraped(url):
+        """Scrapes all <p> and <li> elements in order of appearance after the navbar. If is_article is True, it scrapes the article opening paragraph. If recursive is True, it scrapes links included in the chapter page. If is_timeline is True, the text is returned (from the text cache if possible) instead of stored."""
+        if is_timeline and normalize_url(url) in self.text_cache:
+            return self.text_cache[normalize_url(url)]
+        # Check if URL has already been scraped; timelines need the text even if it was
+        if not is_timeline and self.is_url_scraped(url):
             print(f"Skipping already scraped URL: {url}")
             return
         
-        tries = 0
-        while True:
-            try:
-                character_page = requests.get(url, headers=self.headers)
-                soup = BeautifulSoup(character_page.text, "html.parser")
-                text_parts = []
-                if is_article:
-                    try:
-                        opening = soup.select_one(".ArticleGambit_gambit__iDGnv.ArticleGambit_darkTheme__E0VQv.ArticleGambit_default__t_9Q_")
-                        text_parts.append(opening.get_text())
-                    except Exception as e:
-                        print(f"No article opening found for {url}")
-                
-                # try to get h1 title
-                try:
-                    h1_title = soup.find('h1')
-                    if h1_title:
-                        text_parts.append(h1_title.get_text())
-                except Exception as e:
-                    print(f"No h1 title found for {url}")
-
-                # get all paragraphs and lists in order of appearance
-                section = soup.select_one('html > body > article > section')
-                if not section:
-                    print(f"No section found for {url}")
-                    break
-                elements = section.find_all(['p', 'li'])
-                if recursive:
-                    links = section.find_all("a")
-                    for link in links:
-                        link_url = link.get("href")
-                        if not link_url:
-                            continue
-                        print("Scraping link within document: ", link_url)
-                        # only scrape links in current chapter
-                        if "hapter" not in link_url and "attachment_id" not in link_url:
-                            self.scrape_raw_text(link_url, recursive=False)
-
-                # try to get fact box content if it exists
-                try:
-                    fact_box = section.find('div', class_='fact_box')
-                    if fact_box:
-                        fact_box_text = fact_box.get_text()
-                        text_parts.append(fact_box_text)
-                except Exception as e:
-                    pass  # ignore if no fact box found
-
-                # get all paragraphs and lists in order of appearance
-                for element in elements:
-                    if element.name == 'p':
-                        text_parts.append(element.get_text())
-                    else:  # element is a ul
-                        list_items = element.find_all('li')
-                        for li in list_items:
-                            text_parts.append(li.get_text())
-
-                text = "\n".join(text_parts)
-
-                # cut off text after "Tags" or "Editors" appears
-                # find last occurrence of Tags/Editor to avoid cutting off content that happens to contain those words
-                if "Tags" in text:
-                    text = text.rsplit("Tags", 1)[0]
-                if "Editor" in text:
-                    text = text.rsplit("Editor", 1)[0]
-                if "Copyright" in text:
-                    text = text.rsplit("Copyright", 1)[0]
-                
-                if is_timeline:
-                    return text
-                
-                self.mark_url_as_scraped(url)  # Mark URL as scraped
-                self.increment_documents_scraped()
+        try:
+            kind = "timeline" if is_timeline else ("article" if is_article else "page")
+            html = self.get_page(url, conditional=not is_timeline, kind=kind)
+            if html is None:
+                print(f"Skipping unchanged page: {url}")
+                self.mark_url_as_scraped(url, status="unchanged")
+                return
+            soup = self.parser.parse_content(html, is_article=is_article)
+            section = find_content_section(soup)
+            if not section:
+                print(f"No section found for {url}")
+                return
+            if recursive:
+                links = section.find_all("a")
+                link_urls = []
+                for link in links:
+                    link_url = link.get("href")
+                    if not link_url:
+                        continue
+                    # only scrape links in current chapter
+                    if "hapter" not in link_url and "attachment_id" not in link_url:
+                        link_urls.append(link_url)
+                print(f"Scraping {len(link_urls)} links within document: {url}")
+                self.scrape_urls(link_urls, recursive=False)
+
+            text = extract_text(soup, url, is_article=is_article)
+            self.text_cache[normalize_url(url)] = text
+            
+            if is_timeline:
+                return text
+            
+            self.mark_url_as_scraped(url, text=text)  # Mark URL as scraped
+            self.store_document(url, text, extract_title(soup))
+            self.increment_documents_scraped()
+        except requests.exceptions.RequestException as e:
+            print(f"Failed to retrieve {url}: {e}")
+            self.failed_urls.add(normalize_url(url))
+        except Exception as e:
+            print(f"Error scraping {url}: {e}")
+            self.failed_urls.add(normalize_url(url))
 
-                filename = '_'.join(url.split('/')[-2:])
-                with open(f"hp_data/{filename}.txt", "w") as f:
-                    f.write(text)
-                break
-            except (requests.exceptions.ConnectionError, ConnectionResetError) as e:
-                print(f"Connection error for {url}: {e}. Retrying in 10 seconds...")
-                tries += 1
-                if tries > 2:
-                    break
-            except Exception as e:
-                break
-    
     def scrape_alphabetical_catalog(self, heading):
         """Scrapes alphabetical catalog of items."""
         if not heading:
@@ -240,30 +551,7 @@ class Scraper:
                 print(f"No href found for category: {cat.get_text()}")
                 continue
             # go through each letter in catalog
-            for letter in self.alphabet:
-                while True:
-                    try:
-                        print("Retrieving letter: ", letter)
-                        cur_cat_url = f"{cat_url}?letter={letter}"
-                        cur_cat_page = requests.get(cur_cat_url, headers=self.headers)
-                        letter_soup = BeautifulSoup(cur_cat_page.text, "html.parser")
-                        middle_column = letter_soup.find_all("div", class_="col-md-12")[1]
-                        cur_cat_items = middle_column.find_all("article")
-                        for item in cur_cat_items:
-                            link_elem = item.find("link")
-                            if not link_elem:
-                                continue
-                            item_url = link_elem.get("href")
-                            if not item_url:
-                                continue
-                            self.scrape_raw_text(item_url)
-                            print("Finished scraping category: ", item_url)
-                        break
-                    except (requests.exceptions.ConnectionError, ConnectionResetError) as e:
-                        print(f"Connection error retrieving letter {letter}: {e}. Retrying in 10 seconds...")
-                        time.sleep(10)
-                    except Exception as e:
-                        break
+            self.scrape_catalog_by_letter(cat_url + "?letter={letter}")
     
     def scrape_quotes(self, url):
         """Scrapes a designated quote page."""
@@ -272,38 +560,61 @@ class Scraper:
             print(f"Skipping already scraped URL: {url}")
             return
         
-        while True:
-            try:
-                quote_page = requests.get(url, headers=self.headers)
-                soup = BeautifulSoup(quote_page.text, "html.parser")
-                quotes_list = soup.find_all("li")
-                text = ""
-                for quote in quotes_list:
-                    text += quote.get_text() + "\n"
-                filename = url.split('/')[-1]
-                with open(f"hp_data/{filename}.txt", "w") as f:
-                    f.write(text)
-                self.mark_url_as_scraped(url)  # Mark URL as scraped
-                break
-            except (requests.exceptions.ConnectionError, ConnectionResetError) as e:
-                print(f"Connection error for {url}: {e}. Retrying in 10 seconds...")
-                time.sleep(10)
-            except Exception as e:
-                break
+        try:
+            soup = self.parser.parse(self.get_page(url, kind="quotes"))
+            text = extract_quotes(soup)
+            self.store_document(url, text, extract_title(soup), filename=url.split('/')[-1])
+            self.mark_url_as_scraped(url, status="quotes", text=text)  # Mark URL as scraped
+        except requests.exceptions.RequestException as e:
+            print(f"Failed to retrieve {url}: {e}")
+            self.failed_urls.add(normalize_url(url))
+        except Exception as e:
+            print(f"Error scraping quotes {url}: {e}")
+            self.failed_urls.add(normalize_url(url))
+
+    @timing_decorator
+    def reextract_archive(self):
+        """Re-runs extraction over every archived content page and stores the documents again, without touching the network."""
+        if not self.archive:
+            print("No archive configured for reextract_archive")
+            return
+        missing_events = 0
+        for url, kind, html in self.archive.iter_pages(kinds=("page", "article", "quotes", "timeline_index")):
+            if kind == "quotes":
+                soup = self.parser.parse(html)
+                self.store_document(url, extract_quotes(soup), extract_title(soup), filename=url.split('/')[-1])
+                continue
+            if kind == "timeline_index":
+                # a timeline document is the text of its event pages, in timeline order
+                soup = self.parser.parse(html)
+                parts = []
+                for event_url in timeline_event_urls(soup) or []:
+                    event_html = self.archive.get(normalize_url(event_url))
+                    if event_html is None:
+                        missing_events += 1
+                        continue
+                    event_text = extract_text(self.parser.parse_content(event_html), event_url)
+                    if event_text:
+                        parts.append(event_text)
+                self.store_document(url, "\n".join(parts), extract_title(soup))
+                self.increment_documents_scraped()
+                continue
+            soup = self.parser.parse_content(html, is_article=(kind == "article"))
+            text = extract_text(soup, url, is_article=(kind == "article"))
+            if text is None:
+                continue
+            self.store_document(url, text, extract_title(soup))
+            self.increment_documents_scraped()
+        print(f"Re-extracted {self.documents_scraped} documents from {self.archive.archive_dir}")
+        if missing_events:
+            print(f"{missing_events} timeline event pages were not in the archive and are missing from their timelines")
 
     @timing_decorator
     def retrieve_characters(self):
         """Retrieves all characters from the characters page."""
         print("Retrieving characters...")
         url = "https://www.hp-lexicon.org/characters/"
-        while True:
-            try:
-                characters_page = requests.get(url, headers=self.headers)
-                soup = BeautifulSoup(characters_page.text, "html.parser")
-                break
-            except (requests.exceptions.ConnectionError, ConnectionResetError) as e:
-                print(f"Connection error retrieving characters page: {e}. Retrying in 10 seconds...")
-                time.sleep(10)
+        soup = self.parser.parse(self.get_page(url))
         
         group_names = ["Notable Characters", "Families", "Groups and Related Resources"]
 
@@ -319,51 +630,19 @@ class Scraper:
             if not group:
                 print(f"No ul sibling found for group: {group_name}")
                 continue
-            for character in group.find_all("a"):
-                char_url = character.get("href")
-                if not char_url:
-                    continue
-                self.scrape_raw_text(char_url)
-                print(f"Scraped character: {char_url}")
+            char_urls = [character.get("href") for character in group.find_all("a") if character.get("href")]
+            self.scrape_urls(char_urls)
+            print(f"Scraped {len(char_urls)} characters from group: {group_name}")
         
         # scrape alphabetical catalog of characters
-        alphabetical_catalog_url = "https://www.hp-lexicon.org/character/?letter={letter}"
-        for letter in self.alphabet:
-            while True:
-                try:
-                    page = requests.get(alphabetical_catalog_url.format(letter=letter), headers=self.headers)
-                    soup = BeautifulSoup(page.text, "html.parser")
-                    middle_column = soup.find_all("div", class_="col-md-12")[1]
-                    items_list = middle_column.find_all("article")
-                    for item in items_list:
-                        link_elem = item.find("link")
-                        if not link_elem:
-                            continue
-                        item_url = link_elem.get("href")
-                        if not item_url:
-                            continue
-                        self.scrape_raw_text(item_url)
-                        print("Finished scraping category: ", item_url)
-                    break
-                except (requests.exceptions.ConnectionError, ConnectionResetError) as e:
-                    print(f"Connection error retrieving page: {e}. Retrying in 10 seconds...")
-                    time.sleep(10)
-                except Exception as e:
-                    break
+        self.scrape_catalog_by_letter("https://www.hp-lexicon.org/character/?letter={letter}")
 
     @timing_decorator
     def retrieve_places(self):
         """Retrieves all places from the places page."""
         print("Retrieving places...")
         url = "https://www.hp-lexicon.org/places/"
-        while True:
-            try:
-                places_page = requests.get(url, headers=self.headers)
-                soup = BeautifulSoup(places_page.text, "html.parser")
-                break
-            except (requests.exceptions.ConnectionError, ConnectionResetError) as e:
-                print(f"Connection error retrieving places page: {e}. Retrying in 10 seconds...")
-                time.sleep(10)
+        soup = self.parser.parse(self.get_page(url))
         
         group_names = ["Scotland", "London and Surrey", "The West Country", "Elsewhere in Britain", "Elsewhere in the World"]
 
@@ -382,12 +661,9 @@ class Scraper:
             if not group:
                 print(f"No ul sibling found for group: {group_name}")
                 continue
-            for place in group.find_all("a"):
-                place_url = place.get("href")
-                if not place_url:
-                    continue
-                self.scrape_raw_text(place_url)
-                print(f"Place: {place_url}")
+            place_urls = [place.get("href") for place in group.find_all("a") if place.get("href")]
+            self.scrape_urls(place_urls)
+            print(f"Scraped {len(place_urls)} places from group: {group_name}")
         
         # types of places
         heading = soup.find("h2", string="Types of Places")
@@ -401,14 +677,7 @@ class Scraper:
         """Retrieves all magic from the magic page."""
         print("Retrieving magic...")
         url = "https://www.hp-lexicon.org/magic/"
-        while True:
-            try:
-                magic_page = requests.get(url, headers=self.headers)
-                soup = BeautifulSoup(magic_page.text, "html.parser")
-                break
-            except (requests.exceptions.ConnectionError, ConnectionResetError) as e:
-                print(f"Connection error retrieving magic page: {e}. Retrying in 10 seconds...")
-                time.sleep(10)
+        soup = self.parser.parse(self.get_page(url))
         
         magic_groups_catalogs = ["Spells", "Potions"]
         for group_name in magic_groups_catalogs:
@@ -432,15 +701,14 @@ class Scraper:
             if not group:
                 print(f"No ul sibling found for group: {group_name}")
                 continue
-            for magic in group.find_all("a"):
-                magic_url = magic.get("href")
-                if not magic_url:
-                    continue
-                if (group_name != "Quotes from J.K. Rowling"):
-                    self.scrape_raw_text(magic_url)
-                else:
+            magic_urls = [magic.get("href") for magic in group.find_all("a") if magic.get("href")]
+            if (group_name != "Quotes from J.K. Rowling"):
+                self.scrape_urls(magic_urls)
+            else:
+                self.prefetch_pages([magic_url for magic_url in magic_urls if not self.is_url_scraped(magic_url)])
+                for magic_url in magic_urls:
                     self.scrape_quotes(magic_url)
-                print(f"Magic: {magic_url}")
+            print(f"Scraped {len(magic_urls)} magic pages from group: {group_name}")
 
         # Scrape magical items & devices
         magical_items_url = "https://www.hp-lexicon.org/thing-category/magical-objects/?letter={letter}"
@@ -454,14 +722,7 @@ class Scraper:
     def retrieve_things(self):
         """Retrieves all things from the things page."""
         url = "https://www.hp-lexicon.org/things/"
-        while True:
-            try:
-                things_page = requests.get(url, headers=self.headers)
-                soup = BeautifulSoup(things_page.text, "html.parser")
-                break
-            except (requests.exceptions.ConnectionError, ConnectionResetError) as e:
-                print(f"Connection error retrieving things page: {e}. Retrying in 10 seconds...")
-                time.sleep(10)
+        soup = self.parser.parse(self.get_page(url))
         
         # scrape alphabetical catalog of words and terms in wizarding world
         self.scrape_catalog_by_letter("https://www.hp-lexicon.org/thing-category/words-and-terms/?letter={letter}")
@@ -471,82 +732,61 @@ class Scraper:
         if explore_wizarding_world:
             ww_list = explore_wizarding_world.find_next_sibling("ul")
             if ww_list:
-                for i, item in enumerate(ww_list.find_all("a")[:4]):
-                    item_url = item.get("href")
-                    if item_url:
-                        self.scrape_raw_text(item_url)
+                self.scrape_urls([item.get("href") for item in ww_list.find_all("a")[:4]])
         
         # scrape departments
         mom_url = "https://www.hp-lexicon.org/thing/ministry-of-magic/"
-        mom_page = requests.get(mom_url, headers=self.headers)
-        mom_soup = BeautifulSoup(mom_page.text, "html.parser")
+        mom_soup = self.parser.parse(self.get_page(mom_url))
         departments_list = mom_soup.select_one("html > body > article > section > div > div > section > div > div:nth-of-type(2) > div:nth-of-type(1) > ul")
         if departments_list:
-            for department in departments_list.find_all("a"):
-                department_url = department.get("href")
-                if department_url:
-                    self.scrape_raw_text(department_url)
+            self.scrape_urls([department.get("href") for department in departments_list.find_all("a")])
 
         # scrape places and equipment, organizations
         quidditch_url = "https://www.hp-lexicon.org/thing/quidditch/"
-        quidditch_page = requests.get(quidditch_url, headers=self.headers)
-        quidditch_soup = BeautifulSoup(quidditch_page.text, "html.parser")
+        quidditch_soup = self.parser.parse(self.get_page(quidditch_url))
+        quidditch_urls = []
         places_and_equipment = quidditch_soup.find("h2", string="Quiddith places and equipment")
         if places_and_equipment:
             for p in places_and_equipment.find_next_siblings("p")[:10]:
                 a_tag = p.find("a")
                 if a_tag:
-                    url = a_tag.get("href")
-                    if url:
-                        self.scrape_raw_text(url)
+                    quidditch_urls.append(a_tag.get("href"))
         organizations = quidditch_soup.find("h2", string="Other Quidditch organizations")
         if organizations:
             for p in organizations.find_next_siblings("p")[:4]:
                 a_tag = p.find("a")
                 if a_tag:
-                    url = a_tag.get("href")
-                    if url:
-                        self.scrape_raw_text(url)
+                    quidditch_urls.append(a_tag.get("href"))
+        self.scrape_urls(quidditch_urls)
 
         # scrape daily prophet personnel
         dp_employees_url = "https://www.hp-lexicon.org/thing/daily-prophet/writers-employees-daily-prophet/"
         self.scrape_raw_text(dp_employees_url)
-        dp_employees_page = requests.get(dp_employees_url, headers=self.headers)
-        dp_employees_soup = BeautifulSoup(dp_employees_page.text, "html.parser")
+        dp_employees_soup = self.parser.parse(self.get_page(dp_employees_url))
         headline = dp_employees_soup.select_one("html > body > article > section > div > div > section > div > div:nth-of-type(1) > div:nth-of-type(1) > h2")
         if headline:
+            employee_urls = []
             for i, p in enumerate(headline.find_next_siblings("p")[:14]):
                 if i == 5 or i == 9:
                     continue
                 a_tags = p.find_all("a")
                 if a_tags:
-                    url = a_tags[0].get("href")
-                    if url:
-                        self.scrape_raw_text(url)
+                    employee_urls.append(a_tags[0].get("href"))
+            self.scrape_urls(employee_urls)
         
         # scrape daily prophet headlines and articles
         headlines_url = "https://www.hp-lexicon.org/thing/daily-prophet/headlines-articles-daily-prophet/"
         self.scrape_raw_text(headlines_url)
-        headlines_page = requests.get(headlines_url, headers=self.headers)
-        headlines_soup = BeautifulSoup(headlines_page.text, "html.parser")
+        headlines_soup = self.parser.parse(self.get_page(headlines_url))
         headlines = headlines_soup.find_all("p")
-        for p in headlines:
-            a_tag = p.find("a")
-            if a_tag:
-                url = a_tag.get("href")
-                if url:
-                    self.scrape_raw_text(url)
+        self.scrape_urls([p.find("a").get("href") for p in headlines if p.find("a")])
 
         # scrape Pottermore Hogwarts Express articles
         express_url = "https://www.hp-lexicon.org/thing/hogwarts-express/"
-        express_page = requests.get(express_url, headers=self.headers)
-        express_soup = BeautifulSoup(express_page.text, "html.parser")
+        express_soup = self.parser.parse(self.get_page(express_url))
         articles = express_soup.select_one("html > body > article > section > div > div > section > div > div:nth-of-type(3) > div:nth-of-type(2) > ul")
         if articles:
-            for article in articles.find_all("a"):
-                url = article.get("href")
-                if url:
-                    self.scrape_raw_text(url, is_article=True)
+            self.scrape_urls([article.get("href") for article in articles.find_all("a")], is_article=True)
 
         # scrape rest of things
         css_selector = "html > body > article > section > div > div > section > div > div:nth-of-type(1) > div:nth-of-type(1) > p:nth-of-type({position})"
@@ -558,6 +798,8 @@ class Scraper:
                 ul_sibling = heading.find_next_sibling("ul")
                 if ul_sibling:
                     li_elements = ul_sibling.find_all("li")[:6]
+                    school_urls = [li.find("a").get("href") for li in li_elements if li.find("a")]
+                    self.prefetch_pages([school_url for school_url in school_urls if not self.is_url_scraped(school_url)], conditional=True)
                     for i, li in enumerate(li_elements):
                         link = li.find("a")
                         if link:
@@ -586,26 +828,22 @@ class Scraper:
         if quotes_heading:
             quotes = quotes_heading.find_next_sibling("ul")
             if quotes:
-                for quote in quotes.find_all("a"):
-                    quote_url = quote.get("href")
-                    if quote_url:
-                        self.scrape_quotes(quote_url)
+                quote_urls = [quote.get("href") for quote in quotes.find_all("a") if quote.get("href")]
+                self.prefetch_pages([quote_url for quote_url in quote_urls if not self.is_url_scraped(quote_url)])
+                for quote_url in quote_urls:
+                    self.scrape_quotes(quote_url)
         essays_heading = soup.find("h2", string="Essays")
         if essays_heading:
             essays = essays_heading.find_next_sibling("ul")
             if essays:
-                for essay in essays.find_all("a"):
-                    essay_url = essay.get("href")
-                    if essay_url:
-                        self.scrape_raw_text(essay_url)
+                self.scrape_urls([essay.get("href") for essay in essays.find_all("a")])
             
     @timing_decorator
     def retrieve_creatures(self):
         """Retrieves all creatures from the creatures page."""
         url = "https://www.hp-lexicon.org/creatures-bestiary/"
         self.scrape_raw_text(url)
-        creatures_page = requests.get(url, headers=self.headers)
-        soup = BeautifulSoup(creatures_page.text, "html.parser")
+        soup = self.parser.parse(self.get_page(url))
         sections = ["Well-Known Creatures", "Types of Creatures", "Characters who are Creatures", "Miscellaneous"]
         for section in sections:
             creatures = soup.find("h2", string=section)
@@ -616,11 +854,9 @@ class Scraper:
             if not creatures_list:
                 print(f"No ul sibling found for section: {section}")
                 continue
-            for creature in creatures_list.find_all("a"):
-                creature_url = creature.get("href")
-                if creature_url:
-                    print(f"Scraping creature: {creature_url}")
-                    self.scrape_raw_text(creature_url)
+            creature_urls = [creature.get("href") for creature in creatures_list.find_all("a") if creature.get("href")]
+            print(f"Scraping {len(creature_urls)} creatures from section: {section}")
+            self.scrape_urls(creature_urls)
         
         # scrape alphabetical catalog of creatures
         self.scrape_catalog_by_letter("https://www.hp-lexicon.org/creature/?letter={letter}")
@@ -628,19 +864,16 @@ class Scraper:
         # scrape different human-like creatures
         hlc_list = soup.select_one("html > body > article > section > div > div > section > div > div:nth-of-type(1) > div:nth-of-type(1) > ul")
         if hlc_list:
-            for hlc in hlc_list.find_all("a"):
-                hlc_url = hlc.get("href")
-                if hlc_url:
-                    print(f"Scraping human-like creature: {hlc_url}")
-                    self.scrape_raw_text(hlc_url)
+            hlc_urls = [hlc.get("href") for hlc in hlc_list.find_all("a") if hlc.get("href")]
+            print(f"Scraping {len(hlc_urls)} human-like creatures")
+            self.scrape_urls(hlc_urls)
     
     @timing_decorator
     def retrieve_novels(self):
         """Retrieves all novels from the novels page."""
         url = "https://www.hp-lexicon.org/source/the-harry-potter-novels/"
         # self.scrape_raw_text(url)
-        novels_page = requests.get(url, headers=self.headers)
-        soup = BeautifulSoup(novels_page.text, "html.parser")
+        soup = self.parser.parse(self.get_page(url))
         temp = soup.select_one("html > body > article > section > div > div > section > div > div:nth-of-type(2) > div:nth-of-type(1) > hr:nth-of-type(1)")
         if not temp:
             print("No hr element found for novels")
@@ -655,14 +888,10 @@ class Scraper:
             url = book_link.get("href")
             if not url:
                 continue
-            book_page = requests.get(url, headers=self.headers)
-            book_soup = BeautifulSoup(book_page.text, "html.parser")
+            book_soup = self.parser.parse(self.get_page(url))
             self.scrape_raw_text(url)
             chapters = book_soup.find_all("a", string=lambda text: text and "Chapter" in text and "-" in text )
-            for chapter in chapters:
-                chapter_url = chapter.get("href")
-                if chapter_url:
-                    self.scrape_raw_text(chapter_url, recursive=True)
+            self.scrape_urls([chapter.get("href") for chapter in chapters], recursive=True)
         
         # fantastic beasts and where to find them
         fb_url = "https://www.hp-lexicon.org/source/other-potter-books/fb/"
@@ -673,15 +902,10 @@ class Scraper:
         print("Scraping quidditch through the ages...")
         qa_url = "https://www.hp-lexicon.org/source/other-potter-books/qa/"
         self.scrape_raw_text(qa_url)
-        qa_page = requests.get(qa_url, headers=self.headers)
-        qa_soup = BeautifulSoup(qa_page.text, "html.parser")
+        qa_soup = self.parser.parse(self.get_page(qa_url))
         contents = qa_soup.find("h2", string="Contents")
         chapters = contents.find_next_siblings("p")[:10]
-        for chapter in chapters:
-            chapter_links = chapter.find_all("a")
-            chapter_url = chapter_links[-1].get("href")
-            if chapter_url:
-                self.scrape_raw_text(chapter_url, recursive=True)
+        self.scrape_urls([chapter.find_all("a")[-1].get("href") for chapter in chapters], recursive=True)
 
     @timing_decorator
     def retrieve_all(self):
@@ -693,7 +917,7 @@ class Scraper:
         self.retrieve_creatures()
         self.retrieve_novels()
         self.retrieve_events()
-        # Save all scraped URLs at the end
+        # Compact the crawl journal at the end
         self._save_scraped_urls()
         print(f"Scraping complete! Total URLs scraped: {len(self.scraped_urls)}")
 
@@ -709,29 +933,22 @@ class Scraper:
                 return
             if "attachment" in url:
                 return
-            page = requests.get(url, headers=self.headers)
-            soup = BeautifulSoup(page.text, "html.parser")
-            column = soup.select_one("html > body > article > section > div > div")
+            # archived as its own kind, so reextract_archive can rebuild the timeline from its archived events
+            soup = self.parser.parse(self.get_page(url, kind="timeline_index"))
+            title_urls = timeline_event_urls(soup)
             timeline_text_parts = []
-            if column:
-                all_events = column.find_all("article")
-                for event in all_events:
-                    time = event.select_one(".timeline-tmtime").get_text()
-                    timeline_label = event.select_one(".timeline_tmlabel")
-                    links = timeline_label.select("a")
-                    title_url = links[0].get("href")
-                    print(f"Scraping title within timeline: {title_url}")
-                    timeline_text_parts.append(self.scrape_raw_text(title_url, is_timeline=True))
-                    self.mark_url_as_scraped(title_url)
+            if title_urls is not None:
+                print(f"Scraping {len(title_urls)} titles within timeline: {url}")
+                # events are fetched concurrently and reassembled in timeline order; pages without a section give None
+                timeline_text_parts = [text for text in self.scrape_timeline_events(title_urls) if text]
+                for title_url in title_urls:
+                    self.mark_url_as_scraped(title_url, status="timeline")
             timeline_text = '\n'.join(timeline_text_parts)
-            filename = '_'.join(url.split('/')[-2:])
-            with open(f"hp_data/{filename}.txt", "w") as f:
-                f.write(timeline_text)
+            self.store_document(url, timeline_text, extract_title(soup))
             self.increment_documents_scraped()
-            self.mark_url_as_scraped(url)
+            self.mark_url_as_scraped(url, text=timeline_text)
 
-        events_page = requests.get(events_url, headers=self.headers)
-        soup = BeautifulSoup(events_page.text, "html.parser")
+        soup = self.parser.parse(self.get_page(events_url))
         section = soup.select_one("html > body > article > section > div > div > section > div > div:nth-of-type(1) > div:nth-of-type(1)")
         if section:
             timeline_links = section.find_all("a")
@@ -751,19 +968,18 @@ class Scraper:
         additional_resources_headline = soup.find("h2", string="Additional resources")
         ar_list = additional_resources_headline.find_next_sibling("ul")
         if ar_list:
-            for i, link in enumerate(ar_list.find_all("a")):
-                ar_url = link.get("href")
-                if ar_url:
-                    try:
-                        self.scrape_raw_text(ar_url, recursive=True)
-                    except Exception as e:
-                        print(f"Error scraping additional resource: {e}")
-                        continue
+            ar_urls = [link.get("href") for link in ar_list.find_all("a") if link.get("href")]
+            self.prefetch_pages([ar_url for ar_url in ar_urls if not self.is_url_scraped(ar_url)], conditional=True)
+            for ar_url in ar_urls:
+                try:
+                    self.scrape_raw_text(ar_url, recursive=True)
+                except Exception as e:
+                    print(f"Error scraping additional resource: {e}")
+                    continue
         
         # scrape hogwarts classes
         classes = ["astronomy-class", "charms-class", "defense-against-the-dark-arts", "herbology-class", "history-of-magic-class", "potions-class", "transfiguration-class", "ancient-runes-class", "arithmancy-class", "care-of-magical-creatures-class", "divination-class", "muggle-studies-class"]
-        for class_name in classes:
-            self.scrape_raw_text(f"https://www.hp-lexicon.org/thing/{class_name}/")
+        self.scrape_urls([f"https://www.hp-lexicon.org/thing/{class_name}/" for class_name in classes])
 
 if __name__ == "__main__":
     try:
@@ -772,8 +988,8 @@ if __name__ == "__main__":
 
         scraper = Scraper(batch_size=20, store_callback=lambda: print(f"Scraped {scraper.documents_scraped} documents"))
         scraper.retrieve_things()
-        scraper._save_scraped_urls()
-        print(f"Finished scraping {scraper.documents_scraped} documents")
+        print(f"Finished scraping {scraper.documents_scraped} documents ({scraper.validators.unchanged} unchanged pages skipped)")
+        scraper.close()
         
     except Exception as e:
         print(f"An error occurred: {e}")
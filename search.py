@@ -1,20 +1,36 @@
+import time
+
+START = time.perf_counter()
+
 from dotenv import load_dotenv
 import argparse
-from rag_chain import get_qa_chain
-from langchain.agents import Tool, AgentExecutor, create_react_agent
-from langchain.prompts.prompt import PromptTemplate
-from langchain.chains.conversation.memory import ConversationBufferWindowMemory
 import os
-from langchain_openai import ChatOpenAI
-import re
+import threading
+import traceback
+import startup_profile
+from query_text import sanitize_query
+from startup_profile import timed
 
 load_dotenv()
 
-rag_chain = get_qa_chain()
+# the RAG chain, langchain and the OpenAI clients are only loaded when first needed, or by the warm-up
+# thread main() starts once the prompt is up, so the prompt doesn't wait for them
+_lock = threading.Lock()
+_rag_chain = None
+
+def get_rag_chain():
+    """Returns the RAG chain, building it on first use."""
+    global _rag_chain
+    with _lock:
+        if _rag_chain is None:
+            with timed("import rag_chain"):
+                from rag_chain import get_qa_chain
+            _rag_chain = get_qa_chain()
+    return _rag_chain
 
 def rag_tool_func(q):
     print(f"\nRAG tool called with question: {q}")
-    result = rag_chain.invoke({"input": q})
+    result = get_rag_chain().invoke({"input": q})
     print("-" * 100)
     print(f"\nRetrieved {len(result['context'])} documents:")
     for i, doc in enumerate(result['context'], 1):
@@ -25,14 +41,6 @@ def rag_tool_func(q):
     answer = result.get("answer", "No answer found")
     return answer
 
-tools = [
-    Tool(
-        name="RAG",
-        func=rag_tool_func,
-        description=f"Use this FIRST to answer questions about any Harry Potter related lore, including characters, magic, places, and events."
-    )
-]
-
 REACT_PROMPT = """You are a helpful assistant that answers questions about Harry Potter related lore. You have access to the following tools:
 {tools}
 
@@ -63,33 +71,95 @@ Thought: {agent_scratchpad}
 
 
 def get_agent_chain():
-    prompt = PromptTemplate.from_template(REACT_PROMPT)
-    agent = create_react_agent(llm=ChatOpenAI(model_name='gpt-4-turbo'), tools=tools, prompt=prompt)
-    memory = ConversationBufferWindowMemory(memory_key='chat_history', k=5, return_messages=True, output_key="output")
-    agent_chain = AgentExecutor(agent=agent,
-                            tools=tools,
-                            memory=memory,
-                            max_iterations=5,
-                            handle_parsing_errors=True,
-                            verbose=True,
-                            )
+    with timed("import langchain agents"):
+        from langchain.agents import Tool, AgentExecutor, create_react_agent
+        from langchain.prompts.prompt import PromptTemplate
+        from langchain.chains.conversation.memory import ConversationBufferWindowMemory
+        from langchain_openai import ChatOpenAI
+    with timed("agent chain"):
+        tools = [
+            Tool(
+                name="RAG",
+                func=rag_tool_func,
+                description=f"Use this FIRST to answer questions about any Harry Potter related lore, including characters, magic, places, and events."
+            )
+        ]
+        prompt = PromptTemplate.from_template(REACT_PROMPT)
+        agent = create_react_agent(llm=ChatOpenAI(model_name='gpt-4-turbo'), tools=tools, prompt=prompt)
+        memory = ConversationBufferWindowMemory(memory_key='chat_history', k=5, return_messages=True, output_key="output")
+        agent_chain = AgentExecutor(agent=agent,
+                                tools=tools,
+                                memory=memory,
+                                max_iterations=5,
+                                handle_parsing_errors=True,
+                                verbose=True,
+                                )
     return agent_chain
 
-def sanitize_query(query):
-    query = query.strip().lower() # remove leading and trailing spaces and convert to lowercase
-    query = re.sub(r'[^\w\s?!]', '', query) # remove special characters
-    return " ".join(query.split()) # remove extra spaces
+def build_agent_chain():
+    """Builds the RAG chain, then the agent using it."""
+    get_rag_chain()
+    return get_agent_chain()
+
+class WarmUp:
+    """Builds the agent chain on a daemon thread, so quitting never waits for it.
+
+    A failure is printed as soon as it happens rather than when the first question needs the chain,
+    and get() raises it again.
+    """
+
+    def __init__(self, build):
+        self.build = build
+        self.result = None
+        self.error = None
+        self.done = threading.Event()
+        threading.Thread(target=self._run, name="warm-up", daemon=True).start()
+
+    def _run(self):
+        try:
+            self.result = self.build()
+        except Exception as e:
+            self.error = e
+            print("\nCould not build the chatbot in the background:")
+            traceback.print_exc()
+        finally:
+            self.done.set()
+
+    def get(self):
+        """Waits for the build to finish and returns the agent chain, or raises the error that stopped it."""
+        self.done.wait()
+        if self.error is not None:
+            raise self.error
+        return self.result
 
 def main():
-    agent_chain = get_agent_chain()
+    parser = argparse.ArgumentParser(description="Ask questions about Harry Potter lore.")
+    parser.add_argument("--profile-startup", action="store_true", help="build everything up front, print the import and init time of each component and exit")
+    args = parser.parse_args()
+    if args.profile_startup:
+        ready = time.perf_counter() - START
+        build_agent_chain()
+        print(startup_profile.report())
+        print(f"Prompt ready after {ready * 1000:.0f} ms, everything built after {(time.perf_counter() - START) * 1000:.0f} ms")
+        return
+
+    # the chains are built in the background while the first question is typed
+    warm_up = WarmUp(build_agent_chain)
+    agent_chain = None
     while True:
         user_query = sanitize_query(input("> "))
         if user_query == "q":
             break
+        if agent_chain is None:
+            agent_chain = warm_up.get()
         # use agent chain to simulate conversation
         response = agent_chain.invoke({"input": user_query})
         print(response['output'])
+    if _rag_chain is not None:
+        print(_rag_chain.cache.report())
+        if _rag_chain.router is not None:
+            print(_rag_chain.router.report())
     print("Goodbye!")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
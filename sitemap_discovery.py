@@ -0,0 +1,120 @@
+import gzip
+import json
+import os
+import xml.etree.ElementTree as ET
+from collections import namedtuple
+from urllib.parse import urlsplit
+
+SITEMAP_NS = "{http://www.sitemaps.org/schemas/sitemap/0.9}"
+
+# a page or child sitemap listed in a sitemap, with its <lastmod> (None if the sitemap has none)
+SitemapEntry = namedtuple("SitemapEntry", ["loc", "lastmod"])
+
+
+def decode_sitemap(content, url=""):
+    """Returns the XML text of a sitemap response body, gunzipping .xml.gz sitemaps."""
+    if content[:2] == b"\x1f\x8b" or url.endswith(".gz"):
+        content = gzip.decompress(content)
+    return content.decode("utf-8", errors="replace")
+
+
+def parse_sitemap(xml_text):
+    """Parses a sitemap or sitemap index. Returns (is_index, list of SitemapEntry)."""
+    root = ET.fromstring(xml_text.strip())
+    is_index = root.tag == SITEMAP_NS + "sitemapindex" or root.tag == "sitemapindex"
+    entries = []
+    for node in root:
+        loc = node.findtext(SITEMAP_NS + "loc") or node.findtext("loc")
+        if not loc:
+            continue
+        lastmod = node.findtext(SITEMAP_NS + "lastmod") or node.findtext("lastmod")
+        entries.append(SitemapEntry(loc.strip(), lastmod.strip() if lastmod else None))
+    return is_index, entries
+
+
+class SitemapDiscovery:
+    """Finds pages to crawl from a site's XML sitemaps instead of walking its listing pages.
+
+    Sitemap indexes are followed recursively and the <lastmod> of every page is remembered in
+    lastmod_file, so a recrawl can tell which pages changed without requesting them. fetch is a
+    callable that takes a URL and returns the raw response body as bytes.
+    """
+
+    def __init__(self, fetch, lastmod_file="sitemap_lastmod.json"):
+        self.fetch = fetch
+        self.lastmod_file = lastmod_file
+        self.lastmods = {}  # url -> lastmod seen by the previous discovery
+        self.sitemaps_fetched = 0
+        self._load()
+
+    def _load(self):
+        if os.path.exists(self.lastmod_file):
+            try:
+                with open(self.lastmod_file, 'r') as f:
+                    self.lastmods = json.load(f)
+            except Exception as e:
+                print(f"Could not load sitemap lastmods: {e}")
+                self.lastmods = {}
+
+    def save(self):
+        try:
+            with open(self.lastmod_file, 'w') as f:
+                json.dump(self.lastmods, f)
+        except Exception as e:
+            print(f"Could not save sitemap lastmods: {e}")
+
+    def reset(self):
+        self.lastmods = {}
+        if os.path.exists(self.lastmod_file):
+            os.remove(self.lastmod_file)
+
+    def walk(self, sitemap_url, path_prefixes=None):
+        """Returns the SitemapEntry of every page reachable from sitemap_url, in sitemap order.
+
+        If path_prefixes is given, only pages whose first path segment is one of them are returned.
+        Child sitemaps that fail to download or parse are reported and skipped.
+        """
+        pages = []
+        seen = set()
+        pending = [sitemap_url]
+        while pending:
+            url = pending.pop(0)
+            if url in seen:
+                continue
+            seen.add(url)
+            try:
+                is_index, entries = parse_sitemap(decode_sitemap(self.fetch(url), url))
+            except Exception as e:
+                print(f"Could not read sitemap {url}: {e}")
+                continue
+            self.sitemaps_fetched += 1
+            if is_index:
+                pending.extend(entry.loc for entry in entries)
+                continue
+            for entry in entries:
+                segments = [segment for segment in urlsplit(entry.loc).path.split("/") if segment]
+                if path_prefixes is not None and (not segments or segments[0] not in path_prefixes):
+                    continue
+                pages.append(entry)
+        print(f"Found {len(pages)} pages in {self.sitemaps_fetched} sitemaps under {sitemap_url}")
+        return pages
+
+    def changed(self, entry):
+        """Returns True if a page's lastmod differs from the one seen by the previous discovery. Pages without both are not considered changed."""
+        previous = self.lastmods.get(entry.loc)
+        return entry.lastmod is not None and previous is not None and previous != entry.lastmod
+
+    def unchanged(self, entry):
+        """Returns True if a page's lastmod is the one recorded when it was last crawled, so it needn't be requested."""
+        return entry.lastmod is not None and self.lastmods.get(entry.loc) == entry.lastmod
+
+    def forget(self, urls):
+        """Drops the recorded lastmod of pages, so the next discovery fetches them."""
+        for url in urls:
+            self.lastmods.pop(url, None)
+
+    def remember(self, entries):
+        """Records the lastmod of pages, to compare against on the next discovery."""
+        for entry in entries:
+            if entry.lastmod is not None:
+                self.lastmods[entry.loc] = entry.lastmod
@@ -0,0 +1,24 @@
+import threading
+import time
+from contextlib import contextmanager
+
+# (component, seconds) in the order they finished; components may be timed from a warm-up thread
+timings = []
+_lock = threading.Lock()
+
+
+@contextmanager
+def timed(component):
+    """Records how long the body takes as the import or initialization time of component."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        with _lock:
+            timings.append((component, time.perf_counter() - start))
+
+
+def report():
+    with _lock:
+        lines = [f"{component:<32}{seconds * 1000:>9.0f} ms" for component, seconds in timings]
+    return "\n".join(["Startup profile:"] + lines)
@@ -1,81 +1,313 @@
-from langchain_community.document_loaders import DirectoryLoader
 from langchain.schema import Document
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_openai import OpenAIEmbeddings
 from langchain_chroma import Chroma
 from dotenv import load_dotenv
 import openai
 import os
 import shutil
-from scrape_hp import Scraper
-import threading
+from scrape_hp import Scraper, clear_scraped_urls
+from page_validators import content_hash
+from ingest_queue import IngestQueue
+from embedding_cache import CachedEmbeddings, EmbeddingCache
+from embedding_scheduler import ScheduledEmbeddings
+from embedding_backends import get_embeddings
+from chunking import ChunkSplitter, get_text_splitter
+from compact_vectors import COMPACT_PATH, CompactVectorIndex
+from bm25_index import BM25_PATH, BM25Builder, collection_fingerprint
+from query_cache import write_collection_version
+import argparse
+import sys
 import time
 
 load_dotenv()
 
-openai.api_key = os.environ['OPENAI_API_KEY']
+# not needed with EMBEDDING_BACKEND=local
+openai.api_key = os.environ.get('OPENAI_API_KEY')
 
 CHROMA_PATH = "./chroma"
 
 DATA_PATH = "hp_data"
 
-def chunk_documents():
-    loader = DirectoryLoader(DATA_PATH, glob="*.txt")
-    documents = loader.load()
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=1000,
-        chunk_overlap=500,
-        length_function=len,
-        add_start_index=True,
-    )
-    chunks = text_splitter.split_documents(documents)
-    print(f"Split {len(documents)} documents into {len(chunks)} chunks")
-    return chunks
-
-# clear hp_data after each batch
+# which pages' chunks were dropped as duplicates of another page's, kept between incremental runs
+CHUNK_REFS_PATH = "chunk_refs.json"
+
+# raw HTML of every fetched page, kept so extraction can be re-run without re-crawling
+ARCHIVE_PATH = "html_archive"
+
+# chunks handed to the vector store per add_documents call; a whole scraped batch usually fits in one, so it is
+# embedded as concurrent token-packed requests by ScheduledEmbeddings and written to Chroma in bulk
+STORE_BATCH_SIZE = 1000
+
+def chunk_id(source, index, text):
+    """Returns a deterministic chunk ID derived from the chunk's source url, position in the document and content."""
+    return content_hash(f"{source}\n{index}\n{content_hash(text)}")
+
+def iter_chunks(vectorstore: Chroma, text_splitter, documents, counts):
+    """Splits documents into chunks lazily, one document at a time, and yields the (id, chunk) pairs not stored yet.
+
+    Chunks a document had before that it no longer has are collected in counts["stale"] for the caller to
+    delete once the new ones are stored, so a changed page replaces only its own chunks, an unchanged one
+    costs no embedding calls and a failed store never leaves a page without chunks. counts["skipped"]
+    tallies unchanged chunks. A chunk other pages dropped as a duplicate of stays, see ChunkSplitter.
+    """
+    referenced = text_splitter.is_referenced if isinstance(text_splitter, ChunkSplitter) and text_splitter.dedupe else None
+    for document in documents:
+        source = document.metadata["source"]
+        chunks = text_splitter.split_documents([document])
+        ids = [chunk_id(source, i, chunk.page_content) for i, chunk in enumerate(chunks)]
+        records = vectorstore.get(where={"source": source}, include=["documents"] if referenced else [])
+        existing = set(records["ids"])
+        stale = existing.difference(ids)
+        if referenced and stale:
+            stale = {id for id, text in zip(records["ids"], records["documents"]) if id in stale and not referenced(text, source)}
+        counts["stale"].extend(stale)
+        for id, chunk in zip(ids, chunks):
+            if id in existing:
+                counts["skipped"] += 1
+            else:
+                yield id, chunk
+
+def batched(iterable, size):
+    """Yields lists of up to size items from an iterable."""
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def store_documents(vectorstore: Chroma, text_splitter, documents, bm25=None):
+    """Chunks, embeds and upserts a stream of documents, keeping the bm25 corpus in step if given. Returns the number of chunks stored."""
+    counts = {"skipped": 0, "stale": []}
+    stored = 0
+    for batch in batched(iter_chunks(vectorstore, text_splitter, documents, counts), STORE_BATCH_SIZE):
+        ids, chunks = zip(*batch)
+        vectorstore.add_documents(list(chunks), ids=list(ids))
+        if bm25 is not None:
+            bm25.add(ids, chunks)
+        stored += len(chunks)
+    # only now that the new chunks are stored are the ones they replace deleted
+    if counts["stale"]:
+        vectorstore.delete(ids=counts["stale"])
+        if bm25 is not None:
+            bm25.remove(counts["stale"])
+    if counts["skipped"]:
+        print(f"Skipped {counts['skipped']} unchanged chunks")
+    return stored
+
+def prune_deleted_pages(vectorstore: Chroma, crawled_urls, bm25=None, text_splitter=None):
+    """Deletes the chunks of every page a complete crawl did not come across. Returns the number of pages removed.
+
+    With a deduplicating ChunkSplitter, a deleted page's chunks that other pages dropped as duplicates are kept.
+    """
+    deduped = isinstance(text_splitter, ChunkSplitter) and text_splitter.dedupe
+    records = vectorstore.get(include=["metadatas", "documents"] if deduped else ["metadatas"])
+    stale = {}
+    for i, (id, metadata) in enumerate(zip(records["ids"], records["metadatas"])):
+        url = (metadata or {}).get("url")
+        # chunks without a url come from older file-based runs and are left alone, see delete_legacy_chunks
+        if url and url not in crawled_urls:
+            stale.setdefault(url, []).append(i)
+    for url, rows in stale.items():
+        print(f"Removing deleted page: {url}")
+        if deduped:
+            text_splitter.release(url)
+            rows = [row for row in rows if not text_splitter.is_referenced(records["documents"][row], url)]
+        ids = [records["ids"][row] for row in rows]
+        if ids:
+            vectorstore.delete(ids=ids)
+            if bm25 is not None:
+                bm25.remove(ids)
+    return len(stale)
+
+def delete_legacy_chunks(vectorstore: Chroma, bm25=None):
+    """Deletes the chunks without a url, stored by older file-based runs, which prune_deleted_pages never removes.
+
+    Returns the number of chunks deleted. Their pages are in the collection again after the next crawl.
+    """
+    records = vectorstore.get(include=["metadatas"])
+    ids = [id for id, metadata in zip(records["ids"], records["metadatas"]) if not (metadata or {}).get("url")]
+    if ids:
+        vectorstore.delete(ids=ids)
+        if bm25 is not None:
+            bm25.remove(ids)
+    return len(ids)
+
+def load_data_folder():
+    """Yields the documents an older, file-based run left in hp_data."""
+    for file in sorted(os.listdir(DATA_PATH)):
+        with open(os.path.join(DATA_PATH, file)) as f:
+            yield Document(page_content=f.read(), metadata={"source": os.path.join(DATA_PATH, file)})
+
+class DocumentBuffer:
+    """Collects the documents streamed by the scraper until the next store callback."""
+
+    def __init__(self):
+        self.documents = []
+
+    def add(self, text, metadata):
+        self.documents.append(Document(page_content=text, metadata=metadata))
+
+    def drain(self):
+        documents, self.documents = self.documents, []
+        return documents
+
+# documents are streamed straight from the scraper; hp_data only exists if an older file-based run left it
 def clear_data_folder():
     if os.path.exists(DATA_PATH):
         shutil.rmtree(DATA_PATH)
-    os.makedirs(DATA_PATH)
-    print(f"Cleared {DATA_PATH} folder")
-
-def store_chroma_callback(vectorstore: Chroma):
-    chunks = chunk_documents()
-    vectorstore.add_documents(chunks)
-    print(f"Stored {len(chunks)} chunks in {CHROMA_PATH}")
-
-    clear_data_folder()
-
-def main():
-    # clear temporary text file storage
-    clear_data_folder()
-
-    # clear chroma database first
-    if os.path.exists(CHROMA_PATH):
-        shutil.rmtree(CHROMA_PATH)
-    # clear scraped_urls.json
-    if os.path.exists("scraped_urls.json"):
-        os.remove("scraped_urls.json")
-        print("Cleared scraped_urls.json")
-    # create new database from documents
-    vectorstore = Chroma(collection_name="harry_potter_collection", persist_directory=CHROMA_PATH, embedding_function=OpenAIEmbeddings())
+        print(f"Cleared {DATA_PATH} folder")
+
+def store_batch(vectorstore: Chroma, text_splitter, documents, bm25=None):
+    stored = store_documents(vectorstore, text_splitter, documents, bm25)
+    print(f"Stored {stored} chunks from {len(documents)} documents in {CHROMA_PATH}")
+    return stored
+
+# hands the scraped batch to the background ingestion workers, so the crawl keeps going while it is embedded
+def store_chroma_callback(buffer: DocumentBuffer, ingest: IngestQueue):
+    ingest.submit(buffer.drain())
+
+def save_indexes(vectorstore: Chroma, bm25, compact=None):
+    """Saves the BM25 index, and a compact copy of the vectors with compact, then records the collection version."""
+    bm25.save(BM25_PATH)
+    print(f"Saved BM25 index of {len(bm25)} chunks to {BM25_PATH}")
+
+    if compact:
+        index = CompactVectorIndex.from_chroma(vectorstore, mode=compact)
+        index.save(COMPACT_PATH)
+        print(f"Saved {compact} index of {len(index)} chunks ({index.compact_bytes() / (1024 * 1024):.1f} MiB in memory) to {COMPACT_PATH}")
+
+    # written last: running rag_chain processes drop their cached retrieval results and answers and reload the indexes
+    write_collection_version(collection_fingerprint(list(bm25.docs)))
+
+def rebuild_indexes(compact=None, drop_legacy_chunks=False):
+    """Rebuilds the indexes rag_chain.py serves from the stored collection, without crawling or embedding anything.
+
+    Fixes a missing or mismatched BM25 index, e.g. after a run that crashed before it recorded the collection version.
+    """
+    vectorstore = Chroma(collection_name="harry_potter_collection", persist_directory=CHROMA_PATH)
+    # a saved index still matching the collection is reused as is
+    bm25 = BM25Builder.for_collection(vectorstore, BM25_PATH)
+    if drop_legacy_chunks:
+        print(f"Deleted {delete_legacy_chunks(vectorstore, bm25)} chunks stored without a url")
+    save_indexes(vectorstore, bm25, compact)
+
+def main(resume=False, discovery="listings", ingest_workers=1, incremental=False, chunking="structured", dedupe="near", compact=None, drop_legacy_chunks=False):
+    if incremental:
+        # keep the collection, page validators and sitemap lastmods: unchanged pages are skipped on fetch,
+        # changed ones replace their own chunks, and pages this crawl no longer finds are pruned at the end
+        clear_data_folder()
+        clear_scraped_urls()
+    elif not resume:
+        clear_data_folder()
+
+        # clear chroma database first
+        if os.path.exists(CHROMA_PATH):
+            shutil.rmtree(CHROMA_PATH)
+        if os.path.exists(BM25_PATH):
+            shutil.rmtree(BM25_PATH)
+        if os.path.exists(COMPACT_PATH):
+            shutil.rmtree(COMPACT_PATH)
+        # clear crawl journal and frontier
+        clear_scraped_urls()
+        # clear page validators too, otherwise unchanged pages would be skipped and never stored
+        if os.path.exists("page_validators.json"):
+            os.remove("page_validators.json")
+            print("Cleared page_validators.json")
+        if os.path.exists("sitemap_lastmod.json"):
+            os.remove("sitemap_lastmod.json")
+            print("Cleared sitemap_lastmod.json")
+        if os.path.exists(CHUNK_REFS_PATH):
+            os.remove(CHUNK_REFS_PATH)
+    # create new database from documents; the embedding cache survives rebuilds, so unchanged text is never embedded twice
+    embedding_backend = os.environ.get("EMBEDDING_BACKEND", "openai")
+    model = get_embeddings(embedding_backend)
+    # API requests are packed and sent concurrently; the local model batches on its own
+    scheduler = ScheduledEmbeddings(model) if embedding_backend == "openai" else None
+    embeddings = CachedEmbeddings(scheduler or model, EmbeddingCache())
+    vectorstore = Chroma(collection_name="harry_potter_collection", persist_directory=CHROMA_PATH, embedding_function=embeddings)
+    text_splitter = get_text_splitter(chunking, dedupe, refs_file=CHUNK_REFS_PATH)
+    # the keyword index is kept in step with the collection while storing and saved at the end, so rag_chain.py
+    # loads it instead of tokenizing the whole collection on startup
+    bm25 = BM25Builder.for_collection(vectorstore, BM25_PATH) if resume or incremental else BM25Builder()
+    if drop_legacy_chunks:
+        print(f"Deleted {delete_legacy_chunks(vectorstore, bm25)} chunks stored without a url")
+    if isinstance(text_splitter, ChunkSplitter):
+        # chunks repeating text another stored page owns are dropped, across runs too
+        text_splitter.seed((text, (metadata or {}).get("source")) for _, text, metadata in bm25.chunks())
+
+    if resume and os.path.exists(DATA_PATH):
+        # documents an interrupted file-based run scraped but did not store yet
+        stored = store_documents(vectorstore, text_splitter, load_data_folder(), bm25)
+        print(f"Stored {stored} chunks left in {DATA_PATH}")
+        clear_data_folder()
 
     before_time = time.time()
-    scraper = Scraper(batch_size=20, store_callback=lambda: store_chroma_callback(vectorstore))
+    buffer = DocumentBuffer()
+    ingest = IngestQueue(lambda documents: store_batch(vectorstore, text_splitter, documents, bm25), workers=ingest_workers)
+    scraper = Scraper(batch_size=20, store_callback=lambda: store_chroma_callback(buffer, ingest), document_sink=buffer.add, archive_dir=ARCHIVE_PATH, parser="lxml", pipeline_workers=os.cpu_count(), resume=resume, discovery=discovery)
     
-    scraper.retrieve_things()
-    scraper.retrieve_creatures() 
-    scraper.retrieve_novels()
-    scraper.retrieve_events()
-    scraper.retrieve_magic()
-    scraper.retrieve_places()
-    scraper.retrieve_characters()
+    try:
+        scraper.retrieve_things()
+        scraper.retrieve_creatures() 
+        scraper.retrieve_novels()
+        scraper.retrieve_events()
+        scraper.retrieve_magic()
+        scraper.retrieve_places()
+        scraper.retrieve_characters()
+    finally:
+        # also runs on an interrupted crawl: everything scraped so far is journaled as done, so it must be stored
+        # the last batch is smaller than batch_size, so the callback never fired for it
+        store_chroma_callback(buffer, ingest)
+        ingest.close()
+        if isinstance(text_splitter, ChunkSplitter):
+            text_splitter.save()
+        # pages that were journaled as done but never made it into the collection are fetched again next run
+        if ingest.failed_urls:
+            scraper.forget_pages(ingest.failed_urls)
+        scraper.close()
+        print(ingest.report())
+        if isinstance(text_splitter, ChunkSplitter):
+            print(text_splitter.report())
+        print(embeddings.cache.report())
+        if scheduler:
+            print(scheduler.report())
+            scheduler.close()
+
+    if ingest.failed_documents:
+        # the collection is missing these documents, so the keyword index and the collection version are left as they
+        # were: serving processes keep a consistent index, and the next --resume or --incremental run reconciles it
+        print(f"{ingest.failed_documents} documents failed to store, not saving the BM25 index or updating the collection version")
+        sys.exit(1)
+
+    if incremental:
+        if scraper.failed_urls:
+            # a page that failed to download is not necessarily gone from the site
+            print(f"Not pruning deleted pages, {len(scraper.failed_urls)} pages or listings failed")
+        else:
+            print(f"Removed {prune_deleted_pages(vectorstore, scraper.scraped_urls, bm25, text_splitter)} deleted pages")
     
+    save_indexes(vectorstore, bm25, compact)
+
     after_time = time.time()
     print(f"Time taken: {after_time - before_time} seconds")
     print(f"Scraped {scraper.documents_scraped} documents")
 
-    clear_data_folder()
-
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Scrape hp-lexicon.org and store it in the Chroma database.")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--resume", action="store_true", help="continue an interrupted run instead of rebuilding from scratch")
+    mode.add_argument("--incremental", action="store_true", help="refresh the existing collection, re-embedding only pages that changed")
+    mode.add_argument("--rebuild-index", action="store_true", help="only rebuild the BM25 (and with --compact, the compact) index from the stored collection")
+    parser.add_argument("--discovery", choices=["listings", "sitemap"], default="listings", help="find catalog items by walking letter pages or from the site's XML sitemaps")
+    parser.add_argument("--chunking", choices=["structured", "recursive"], default="structured", help="line-aligned chunks with little overlap, or the original 50%% overlap recursive splitter")
+    parser.add_argument("--dedupe", choices=["near", "exact", "none"], default="near", help="drop chunks repeating earlier text exactly, or near-exactly (MinHash), with structured chunking")
+    parser.add_argument("--compact", choices=["int8", "float16"], default=None, help="also save a quantized copy of the vectors for DENSE_INDEX=compact")
+    parser.add_argument("--drop-legacy-chunks", action="store_true", help="delete chunks stored without a url by older file-based runs")
+    parser.add_argument("--ingest-workers", type=int, default=1, help="background threads chunking, embedding and storing documents")
+    args = parser.parse_args()
+    if args.rebuild_index:
+        rebuild_indexes(compact=args.compact, drop_legacy_chunks=args.drop_legacy_chunks)
+    else:
+        main(resume=args.resume, discovery=args.discovery, ingest_workers=args.ingest_workers, incremental=args.incremental, chunking=args.chunking, dedupe=None if args.dedupe == "none" else args.dedupe, compact=args.compact, drop_legacy_chunks=args.drop_legacy_chunks)
\ No newline at end of file
@@ -0,0 +1,122 @@
+import os
+import numpy as np
+import pytest
+from langchain.schema import Document
+from rank_bm25 import BM25Okapi
+from bm25_index import BM25Builder, BM25Index, collection_fingerprint, load_bm25_index
+from query_cache import write_collection_version
+
+CORPUS = [
+    ("Harry Potter is a wizard who attended Hogwarts", "Characters"),
+    ("Hermione Granger is the brightest witch of her age at Hogwarts", "Characters"),
+    ("The Hogwarts Express leaves from platform nine and three quarters", "Places"),
+    ("Diagon Alley is a shopping street for wizards in London", "Places"),
+    ("A wand chooses the wizard, said Ollivander", "Objects"),
+    ("The Elder Wand is the most powerful wand ever made", "Objects"),
+    ("Polyjuice Potion lets the drinker take the form of someone else", "Potions"),
+    ("Felix Felicis is a potion that makes the drinker lucky", "Potions"),
+]
+
+QUERIES = ["wizard", "Hogwarts wizard", "wand wand", "the potion drinker", "Dumbledore"]
+
+
+@pytest.fixture
+def index(tmp_path):
+    builder = BM25Builder()
+    builder.add([f"id{i}" for i in range(len(CORPUS))], [Document(page_content=text, metadata={"category": category}) for text, category in CORPUS])
+    builder.save(str(tmp_path / "bm25"))
+    return BM25Index.load(str(tmp_path / "bm25"))
+
+
+@pytest.fixture
+def okapi():
+    return BM25Okapi([text.split() for text, _ in CORPUS])
+
+
+@pytest.mark.parametrize("query", QUERIES)
+def test_scores_match_rank_bm25(index, okapi, query):
+    np.testing.assert_allclose(index.get_scores(query), okapi.get_scores(query.split()))
+
+
+@pytest.mark.parametrize("query", QUERIES)
+def test_top_k_matches_rank_bm25(index, okapi, query):
+    k = 3
+    expected = okapi.get_scores(query.split())
+    results = index.search(query, k)
+    assert len(results) == k
+    # the same scores, best first; rows only where they aren't tied
+    np.testing.assert_allclose([score for _, score in results], sorted(expected, reverse=True)[:k])
+    for row, score in results:
+        assert expected[row] == pytest.approx(score)
+        if np.sum(np.isclose(expected, score)) == 1:
+            assert index.document(row)[0] in okapi_top_n(okapi, query, k)
+
+
+def okapi_top_n(okapi, query, k):
+    return [" ".join(tokens) for tokens in okapi.get_top_n(query.split(), [text.split() for text, _ in CORPUS], k)]
+
+
+def test_search_batch_matches_single_searches(index):
+    assert index.search_batch(QUERIES, 4) == [index.search(query, 4) for query in QUERIES]
+
+
+def test_categories_limit_results(index):
+    rows = [row for row, _ in index.search("Hogwarts wizard wizards", 5, categories=["Places"])]
+    assert sorted(index.document(row)[0] for row in rows) == sorted(text for text, category in CORPUS if category == "Places")
+
+
+def test_removed_chunks_leave_the_index(tmp_path):
+    builder = BM25Builder()
+    builder.add(["a", "b"], [Document(page_content="Hedwig the owl", metadata={}), Document(page_content="Errol the owl", metadata={})])
+    builder.remove(["a"])
+    builder.save(str(tmp_path / "bm25"))
+    index = BM25Index.load(str(tmp_path / "bm25"))
+    assert index.ids == ["b"]
+    assert index.search("Hedwig", 1) == [(0, 0.0)]
+
+
+def test_save_publishes_a_new_version(tmp_path):
+    path = str(tmp_path / "bm25")
+    builder = BM25Builder()
+    builder.add(["a"], [Document(page_content="Hedwig the owl", metadata={})])
+    builder.save(path)
+    old = BM25Index.load(path)
+    builder.add(["b"], [Document(page_content="Errol the owl", metadata={})])
+    builder.save(path)
+    assert BM25Index.load(path).ids == ["a", "b"]
+    assert BM25Builder.load(path).chunks() == builder.chunks()
+    # the old version's files are gone but stay readable through the index that mapped them
+    assert len(os.listdir(path)) == 2
+    assert old.document(0)[0] == "Hedwig the owl"
+
+
+def test_mismatched_index_points_to_rebuild(tmp_path):
+    path, version_path = str(tmp_path / "bm25"), str(tmp_path / "collection_version.json")
+    builder = BM25Builder()
+    builder.add(["a"], [Document(page_content="Hedwig the owl", metadata={})])
+    with pytest.raises(ValueError, match="--rebuild-index"):
+        load_bm25_index(path, version_path)
+    builder.save(path)
+    write_collection_version(collection_fingerprint(["b"]), version_path)
+    with pytest.raises(ValueError, match="--rebuild-index"):
+        load_bm25_index(path, version_path)
+    write_collection_version(collection_fingerprint(["a"]), version_path)
+    assert load_bm25_index(path, version_path).ids == ["a"]
+
+
+@pytest.mark.parametrize("categories", [["Places"], ["Objects", "Potions"], ["Unknown"]])
+def test_category_search_scores_only_their_chunks(index, okapi, categories):
+    for query in QUERIES:
+        expected = okapi.get_scores(query.split())
+        rows = [row for row, (_, category) in enumerate(CORPUS) if category in categories and expected[row] > 0]
+        results = index.search(query, 3, categories)
+        assert [score for _, score in results] == pytest.approx(sorted(expected[rows], reverse=True)[:3])
+        assert all(row in rows for row, _ in results)
+
+
+def test_best_scores(index, okapi):
+    expected = okapi.get_scores("wand wizard".split())
+    best, best_routed = index.best_scores("wand wizard", ["Objects"])
+    assert best == pytest.approx(expected.max())
+    assert best_routed == pytest.approx(expected[4:6].max())
+    assert index.best_scores("Dumbledore", ["Objects"]) == (0.0, 0.0)
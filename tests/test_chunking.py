@@ -0,0 +1,69 @@
+import random
+from langchain.schema import Document
+from chunking import ChunkSplitter
+
+BOILERPLATE = "The Harry Potter Lexicon is an unofficial fan site and is not endorsed by the author or publishers of the books."
+
+
+def page(source, *lines):
+    return Document(page_content="\n".join(lines), metadata={"source": source})
+
+
+def test_split_text_respects_chunk_size_and_overlap():
+    rng = random.Random(7)
+    words = ["wand", "owl", "potion", "castle", "dragon", "quill", "cloak"]
+    lines = [" ".join(rng.choice(words) for _ in range(rng.randint(1, 30))) + "." for _ in range(200)]
+    splitter = ChunkSplitter(chunk_size=300, chunk_overlap=60, dedupe=None)
+    chunks = splitter.split_text("\n".join(lines))
+    assert len(chunks) > 1
+    assert all(len(chunk) <= 300 for chunk in chunks)
+    for line in lines:
+        assert any(line in chunk.split("\n") for chunk in chunks)
+    overlaps = 0
+    for previous, chunk in zip(chunks, chunks[1:]):
+        first = chunk.split("\n", 1)[0]
+        if "\n" in chunk and previous.endswith(first):
+            assert len(first) < 60
+            overlaps += 1
+    assert overlaps > len(chunks) // 2
+
+
+def test_split_text_carries_the_tail_of_a_long_line():
+    splitter = ChunkSplitter(chunk_size=100, chunk_overlap=30, dedupe=None)
+    chunks = splitter.split_text("A first sentence that runs on for a while. Then a short end.\n" + "x" * 60)
+    assert chunks == ["A first sentence that runs on for a while. Then a short end.", "Then a short end.\n" + "x" * 60]
+
+
+def test_dedupe_drops_boilerplate_repeated_across_pages():
+    splitter = ChunkSplitter(chunk_size=120, chunk_overlap=0, dedupe="exact")
+    first = splitter.split_documents([page("a", "Dobby is a house-elf.", BOILERPLATE)])
+    second = splitter.split_documents([page("b", "Hedwig is an owl.", BOILERPLATE)])
+    assert [chunk.page_content for chunk in first] == ["Dobby is a house-elf.", BOILERPLATE]
+    assert [chunk.page_content for chunk in second] == ["Hedwig is an owl."]
+    # splitting the owner again gives the same chunks, so an unchanged page keeps its chunk ids
+    assert [chunk.page_content for chunk in splitter.split_documents([page("a", "Dobby is a house-elf.", BOILERPLATE)])] == ["Dobby is a house-elf.", BOILERPLATE]
+
+
+def test_dedupe_keeps_text_other_pages_reference():
+    splitter = ChunkSplitter(chunk_size=120, chunk_overlap=0, dedupe="near")
+    splitter.split_documents([page("a", "Dobby is a house-elf.", BOILERPLATE)])
+    splitter.split_documents([page("b", "Hedwig is an owl.", BOILERPLATE)])
+    # page a drops the boilerplate, but page b relies on a's stored copy of it
+    assert [chunk.page_content for chunk in splitter.split_documents([page("a", "Dobby is a free elf.")])] == ["Dobby is a free elf."]
+    assert splitter.is_referenced(BOILERPLATE, "a")
+    assert not splitter.is_referenced(BOILERPLATE, "b")
+    # once b no longer repeats it either, a's copy can go
+    splitter.split_documents([page("b", "Hedwig is a snowy owl.")])
+    assert not splitter.is_referenced(BOILERPLATE, "a")
+
+
+def test_references_survive_between_runs(tmp_path):
+    refs_file = str(tmp_path / "chunk_refs.json")
+    splitter = ChunkSplitter(chunk_size=120, chunk_overlap=0, dedupe="near", refs_file=refs_file)
+    stored = splitter.split_documents([page("a", "Dobby is a house-elf.", BOILERPLATE), page("b", "Hedwig is an owl.", BOILERPLATE)])
+    splitter.save()
+    # the next incremental run seeds the owners from the stored chunks
+    splitter = ChunkSplitter(chunk_size=120, chunk_overlap=0, dedupe="near", refs_file=refs_file)
+    splitter.seed((chunk.page_content, chunk.metadata["source"]) for chunk in stored)
+    assert [chunk.page_content for chunk in splitter.split_documents([page("b", "Hedwig is an owl!", BOILERPLATE)])] == ["Hedwig is an owl!"]
+    assert splitter.is_referenced(BOILERPLATE, "a")
@@ -0,0 +1,41 @@
+import os
+import numpy as np
+from compact_vectors import CompactVectorIndex
+from index_versions import POINTER_FILE
+
+
+def build(mode="int8"):
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(40, 16))
+    metadatas = [{"category": "place" if i % 2 else "character"} for i in range(40)]
+    return vectors, CompactVectorIndex(mode).build([f"id{i}" for i in range(40)], vectors, [f"text {i}" for i in range(40)], metadatas)
+
+
+def test_saved_index_searches_like_the_built_one(tmp_path):
+    vectors, index = build()
+    index.save(str(tmp_path))
+    loaded = CompactVectorIndex.load(str(tmp_path))
+    for row in range(0, 40, 7):
+        assert loaded.search_vector(vectors[row], 3) == index.search_vector(vectors[row], 3)
+        assert loaded.document(row) == index.document(row)
+    assert loaded.fingerprint == index.fingerprint
+    assert loaded.category_rows(["place"]).tolist() == index.category_rows(["place"]).tolist() == list(range(1, 40, 2))
+
+
+def test_rows_limit_the_search():
+    vectors, index = build("float16")
+    rows = index.category_rows(["character"])
+    assert all(row % 2 == 0 for row, _ in index.search_vector(vectors[1], 5, rows=rows))
+
+
+def test_save_replaces_the_previous_version(tmp_path):
+    vectors, index = build()
+    index.save(str(tmp_path))
+    old = CompactVectorIndex.load(str(tmp_path))
+    _, other = build("float16")
+    other.save(str(tmp_path))
+    # only the pointer and the new version are left, and a process that loaded the old one can still read it
+    assert sorted(os.listdir(tmp_path))[0] == POINTER_FILE and len(os.listdir(tmp_path)) == 2
+    assert CompactVectorIndex.load(str(tmp_path)).mode == "float16"
+    assert old.search_vector(vectors[0], 1)[0][0] == 0
+    assert old.document(5) == ("text 5", {"category": "place"})
@@ -0,0 +1,28 @@
+from crawl_frontier import CrawlFrontier, normalize_url
+
+
+def test_normalize_url_equivalent_spellings():
+    assert normalize_url("HTTPS://WWW.HP-Lexicon.org/character/harry-potter") == "https://www.hp-lexicon.org/character/harry-potter/"
+    assert normalize_url("https://www.hp-lexicon.org/character/harry-potter/#family") == "https://www.hp-lexicon.org/character/harry-potter/"
+    assert normalize_url("  https://www.hp-lexicon.org/character/harry-potter/?letter=H ") == "https://www.hp-lexicon.org/character/harry-potter/"
+
+
+def test_normalize_url_keeps_params():
+    assert normalize_url("https://www.hp-lexicon.org/?attachment_id=638") == "https://www.hp-lexicon.org/?attachment_id=638"
+    assert normalize_url("https://www.hp-lexicon.org/character/?letter=B&utm_source=x", keep_params=("letter",)) == "https://www.hp-lexicon.org/character/?letter=B"
+    # kept parameters are sorted, so their order doesn't matter
+    assert normalize_url("https://www.hp-lexicon.org/?p=2&page_id=1") == normalize_url("https://www.hp-lexicon.org/?page_id=1&p=2")
+
+
+def test_normalize_url_leaves_file_paths_alone():
+    assert normalize_url("https://www.hp-lexicon.org/sitemap_index.xml") == "https://www.hp-lexicon.org/sitemap_index.xml"
+    assert normalize_url("https://www.hp-lexicon.org") == "https://www.hp-lexicon.org/"
+
+
+def test_frontier_retries_failed_pages_last(tmp_path):
+    frontier = CrawlFrontier(str(tmp_path / "frontier.db"))
+    frontier.push_many(["https://www.hp-lexicon.org/place/a/", "https://www.hp-lexicon.org/character/b/"])
+    assert [url for url, _ in frontier.pop_batch()] == ["https://www.hp-lexicon.org/character/b/", "https://www.hp-lexicon.org/place/a/"]
+    frontier.mark_failed(["https://www.hp-lexicon.org/character/b/"])
+    assert [url for url, _ in frontier.pop_batch()] == ["https://www.hp-lexicon.org/place/a/", "https://www.hp-lexicon.org/character/b/"]
+    frontier.close()
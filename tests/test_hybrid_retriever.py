@@ -0,0 +1,29 @@
+from langchain_core.documents import Document
+from hybrid_retriever import reciprocal_rank_fusion
+
+
+def ids(documents):
+    return [document.id for document in documents]
+
+
+def test_rrf_orders_by_summed_reciprocal_rank():
+    dense = [Document(id="a", page_content="a"), Document(id="b", page_content="b"), Document(id="c", page_content="c")]
+    sparse = [Document(id="c", page_content="c"), Document(id="b", page_content="b"), Document(id="d", page_content="d")]
+    # b: 1/62 + 1/62, c: 1/63 + 1/61, a: 1/61, d: 1/63
+    assert ids(reciprocal_rank_fusion([dense, sparse])) == ["c", "b", "a", "d"]
+
+
+def test_rrf_weights_and_k():
+    first = [Document(id="a", page_content="a")]
+    second = [Document(id="b", page_content="b")]
+    assert ids(reciprocal_rank_fusion([first, second], weights=[0.3, 0.7])) == ["b", "a"]
+    assert ids(reciprocal_rank_fusion([first, second], weights=[0.7, 0.3], k=1)) == ["a"]
+
+
+def test_rrf_dedupes_by_id_then_text():
+    dense = [Document(id="a", page_content="same text"), Document(page_content="other")]
+    # same chunk without an id, and an id-less copy of a text seen before
+    sparse = [Document(page_content="same text"), Document(page_content="other")]
+    fused = reciprocal_rank_fusion([dense, sparse])
+    assert [document.page_content for document in fused] == ["same text", "other"]
+    assert fused[0].id == "a"
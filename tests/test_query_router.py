@@ -0,0 +1,47 @@
+import pytest
+from langchain.schema import Document
+from bm25_index import BM25Builder, BM25Index
+from query_router import QueryRouter
+
+CHUNKS = [
+    ("Dobby is a house-elf who served the Malfoy family", "character", "Dobby"),
+    ("The Elder Wand is the most powerful wand ever made", "thing", "Elder Wand"),
+    ("Wandlore: a wand chooses its wizard", "thing", "Wandlore"),
+    ("Dragons are large winged creatures that breathe fire", "creature", "Dragon"),
+    ("Expelliarmus is a charm that disarms an opponent, it took the Elder Wand from Draco", "magic", "Expelliarmus"),
+]
+
+
+@pytest.fixture
+def index(tmp_path):
+    builder = BM25Builder()
+    builder.add([f"id{i}" for i in range(len(CHUNKS))], [Document(page_content=text, metadata={"category": category, "title": title}) for text, category, title in CHUNKS])
+    builder.save(str(tmp_path / "bm25"))
+    return BM25Index.load(str(tmp_path / "bm25"))
+
+
+def test_routes_by_entity_then_keyword(index):
+    router = QueryRouter(index.categories, index.titles)
+    assert router.route("Who owned the Elder Wand?") == ["thing"]
+    assert router.route("Tell me about dobby") == ["character"]
+    assert router.route("Which beast breathes blue fire?") == ["creature"]
+    # no category, or too many, searches everything
+    assert router.route("What happened next?") is None
+    assert router.route("Which wizard cast a spell at a beast holding a broom?") is None
+    assert router.report() == "QueryRouter: routed=3, unrouted=2, low_score=0"
+
+
+def test_low_scores_fall_back_to_the_global_search(index):
+    router = QueryRouter.from_index(index)
+    # the keyword routes to creature, but the only chunk mentioning Draco is elsewhere
+    assert router.route("Which beast did Draco disarm") is None
+    assert router.route("Which beast can breathe fire") == ["creature"]
+    assert router.report() == "QueryRouter: routed=1, unrouted=0, low_score=1"
+
+
+def test_update_keeps_the_counts(index):
+    router = QueryRouter()
+    assert router.route("Who owned the Elder Wand?") is None
+    router.use_index(index)
+    assert router.route("Who owned the Elder Wand?") == ["thing"]
+    assert router.report() == "QueryRouter: routed=1, unrouted=1, low_score=0"